@@ -0,0 +1,202 @@
+"""
+Write-behind activity log.
+
+Handlers call `activity_bus.emit(...)` instead of adding an Activity row and
+committing a second time. A background thread collects events and writes
+them with one multi-row INSERT per flush (every ACTIVITY_FLUSH_MS, or as
+soon as ACTIVITY_FLUSH_SIZE events are waiting), then publishes them to the
+real-time hub with their ids. Whatever is queued is flushed on shutdown.
+
+A batch that fails to write (e.g. the DB is restarting) goes back to the
+front of the queue and is retried on the next flush. A row is dropped only
+after ACTIVITY_FLUSH_MAX_ATTEMPTS failed writes, or when more than
+ACTIVITY_MAX_PENDING rows are waiting; drops are counted in
+`activity_rows_dropped_total`.
+
+Set ACTIVITY_BUS_SYNC=1 (or `activity_bus.sync = True`) to write on every
+emit, e.g. in tests that read activity right after a request.
+"""
+
+import logging
+import threading
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any
+
+from sqlalchemy import insert
+from sqlalchemy.orm import selectinload
+
+from . import metrics, models
+from .config import settings
+from .database import SessionLocal
+from .realtime import publish_activity
+
+logger = logging.getLogger(__name__)
+
+ROWS_DROPPED = metrics.counter(
+    "activity_rows_dropped_total",
+    "Activity rows dropped after failed writes (reason=attempts|overflow).",
+)
+
+
+@dataclass
+class ActivityEvent:
+    project_id: int
+    user_id: int
+    type: str
+    payload: dict[str, Any] | None = None
+    # Stamped when it happened, not when the batch is written
+    created_at: datetime = field(default_factory=datetime.utcnow)
+    # Failed writes so far
+    attempts: int = 0
+
+    def row(self) -> dict[str, Any]:
+        return {
+            "project_id": self.project_id,
+            "user_id": self.user_id,
+            "type": self.type,
+            "payload": self.payload,
+            "created_at": self.created_at,
+        }
+
+
+class ActivityBus:
+    def __init__(
+        self,
+        flush_seconds: float,
+        flush_size: int,
+        sync: bool = False,
+        max_attempts: int = 5,
+        max_pending: int = 10000,
+    ) -> None:
+        self.flush_seconds = flush_seconds
+        self.flush_size = flush_size
+        self.sync = sync
+        self.max_attempts = max_attempts
+        self.max_pending = max_pending
+        self._pending: list[ActivityEvent] = []
+        self._lock = threading.Lock()
+        # Only one flush at a time so rows keep emit order
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def emit(
+        self,
+        project_id: int,
+        user_id: int,
+        type: str,
+        payload: dict[str, Any] | None = None,
+    ) -> None:
+        event = ActivityEvent(project_id, user_id, type, payload)
+        with self._lock:
+            self._pending.append(event)
+            self._trim()
+            size = len(self._pending)
+
+        if self.sync or not self.running:
+            self.flush()
+        elif size >= self.flush_size:
+            self._wakeup.set()
+
+    def _trim(self) -> None:
+        # Caller holds _lock
+        overflow = len(self._pending) - self.max_pending
+        if overflow > 0:
+            del self._pending[:overflow]
+            ROWS_DROPPED.inc(overflow, reason="overflow")
+            logger.error("Activity queue full, dropped the %d oldest rows", overflow)
+
+    def _requeue(self, batch: list[ActivityEvent]) -> None:
+        retry = []
+        for event in batch:
+            event.attempts += 1
+            if event.attempts < self.max_attempts:
+                retry.append(event)
+        dropped = len(batch) - len(retry)
+        if dropped:
+            ROWS_DROPPED.inc(dropped, reason="attempts")
+            logger.error(
+                "Dropped %d activity rows after %d failed writes", dropped, self.max_attempts
+            )
+        with self._lock:
+            # In front of what was emitted meanwhile, to keep emit order
+            self._pending[:0] = retry
+            self._trim()
+
+    def flush(self) -> int:
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, []
+            if not batch:
+                return 0
+
+            db = SessionLocal()
+            try:
+                try:
+                    ids = db.scalars(
+                        insert(models.Activity).returning(
+                            models.Activity.id, sort_by_parameter_order=True
+                        ),
+                        [event.row() for event in batch],
+                    ).all()
+                    db.commit()
+                except Exception:
+                    db.rollback()
+                    logger.exception("Failed to write %d activity rows, will retry", len(batch))
+                    self._requeue(batch)
+                    return 0
+
+                # Written; a failure from here on must not write them again
+                try:
+                    # Read back with their users so the messages can be rendered
+                    written = (
+                        db.query(models.Activity)
+                        .options(selectinload(models.Activity.user))
+                        .filter(models.Activity.id.in_(ids))
+                        .order_by(models.Activity.id.asc())
+                        .all()
+                    )
+                    for activity in written:
+                        publish_activity(activity)
+                except Exception:
+                    logger.exception("Failed to publish %d activity rows", len(ids))
+            finally:
+                db.close()
+
+        return len(batch)
+
+    def _run(self) -> None:
+        while not self._stopping.is_set():
+            self._wakeup.wait(self.flush_seconds)
+            self._wakeup.clear()
+            self.flush()
+
+    def start(self) -> None:
+        if self.running:
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="activity-bus", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopping.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+            self._thread = None
+        self.flush()
+
+
+activity_bus = ActivityBus(
+    flush_seconds=settings.ACTIVITY_FLUSH_MS / 1000,
+    flush_size=settings.ACTIVITY_FLUSH_SIZE,
+    sync=settings.ACTIVITY_BUS_SYNC,
+    max_attempts=settings.ACTIVITY_FLUSH_MAX_ATTEMPTS,
+    max_pending=settings.ACTIVITY_MAX_PENDING,
+)
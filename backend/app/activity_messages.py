@@ -0,0 +1,40 @@
+"""
+Display text for activity entries.
+
+Activity rows store a `type` plus a small structured `payload`; the
+sentence shown in the UI is rendered from them when the row is read, so
+wording changes apply to old entries too and the table stays compact.
+"""
+
+from typing import Any, Callable
+
+STATUS_LABELS = {
+    "needs_feedback": "Needs feedback",
+    "in_progress": "In progress",
+    "changes_requested": "Changes requested",
+    "final": "Final",
+}
+
+_TEMPLATES: dict[str, Callable[[str, dict[str, Any]], str]] = {
+    "asset_uploaded": lambda actor, p: f"{actor} uploaded an asset.",
+    "comment_added": lambda actor, p: f"{actor} commented on an asset.",
+    "comment_reacted": lambda actor, p: f"{actor} reacted {p.get('emoji', '')} to a comment.",
+    "asset_status_changed": lambda actor, p: (
+        f"{actor} set an asset status to "
+        f"'{STATUS_LABELS.get(p.get('status'), p.get('status'))}'."
+    ),
+}
+
+
+def actor_name(user: Any) -> str:
+    if user is None:
+        return "Someone"
+    return user.display_name or user.email
+
+
+def render_message(type: str, payload: dict[str, Any] | None, user: Any) -> str:
+    template = _TEMPLATES.get(type)
+    actor = actor_name(user)
+    if template is None:
+        return f"{actor} did {type.replace('_', ' ')}."
+    return template(actor, payload or {})
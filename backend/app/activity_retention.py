@@ -0,0 +1,375 @@
+"""
+Activity retention and roll-up.
+
+Raw activity rows older than ACTIVITY_RETENTION_DAYS are counted into
+`activity_daily_summaries` (one row per project, day and type) and then
+removed. Every day is summarised and deleted in its own transaction, so a
+large backlog never turns into one long-running lock.
+
+On Postgres with ACTIVITY_PARTITIONING=1 the `activities` table is range
+partitioned by month on `created_at`. Newest-first reads only touch the
+latest partitions, and a month that is entirely past the window is
+summarised and dropped as a whole instead of deleted row by row. Upcoming
+monthly partitions are created hourly by every worker, even with
+retention turned off; rows that reached the default partition anyway are
+moved into their month's partition when it is created.
+
+Runs inside each worker every ACTIVITY_RETENTION_INTERVAL_HOURS (guarded by
+an advisory lock on Postgres), or by hand / from cron:
+
+    python -m app.activity_retention [retention_days]
+"""
+
+import asyncio
+import logging
+import sys
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta
+
+from sqlalchemy import delete, func, select, text
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Connection, Engine
+
+from . import models
+from .config import settings
+from .database import engine
+
+logger = logging.getLogger(__name__)
+
+PARTITION_PREFIX = "activities_p"
+# Partitions are created this many months ahead so inserts never fall
+# through to the default partition
+MONTHS_AHEAD = 2
+# How often workers check for missing partitions (independent of roll-ups)
+PARTITION_CHECK_SECONDS = 3600
+# pg advisory lock key shared by the partition conversion and roll-up runs
+_LOCK_KEY = 48_151_623
+
+_activities = models.Activity.__table__
+_summaries = models.ActivityDailySummary.__table__
+
+
+@dataclass
+class RetentionResult:
+    days_rolled_up: int = 0
+    rows_removed: int = 0
+    partitions_dropped: int = 0
+
+
+def _midnight(day: date) -> datetime:
+    return datetime.combine(day, time.min)
+
+
+def _next_month(month: date) -> date:
+    return (month.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def _partition_name(month: date) -> str:
+    return f"{PARTITION_PREFIX}{month:%Y_%m}"
+
+
+# ---------- partitioning (Postgres) ----------
+
+
+def is_partitioned(conn: Connection) -> bool:
+    if conn.dialect.name != "postgresql":
+        return False
+    row = conn.execute(
+        text(
+            "SELECT 1 FROM pg_partitioned_table pt "
+            "JOIN pg_class c ON c.oid = pt.partrelid "
+            "WHERE c.relname = 'activities' AND pg_table_is_visible(c.oid)"
+        )
+    ).first()
+    return row is not None
+
+
+def _monthly_partitions(conn: Connection) -> list[date]:
+    names = conn.execute(
+        text(
+            "SELECT c.relname FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid "
+            "JOIN pg_class p ON p.oid = i.inhparent "
+            "WHERE p.relname = 'activities'"
+        )
+    ).scalars()
+    months = []
+    for name in names:
+        if not name.startswith(PARTITION_PREFIX):
+            continue  # the default partition
+        year, month = name[len(PARTITION_PREFIX):].split("_")
+        months.append(date(int(year), int(month), 1))
+    return sorted(months)
+
+
+def _create_partition(conn: Connection, month: date) -> None:
+    name = _partition_name(month)
+    if conn.execute(text("SELECT to_regclass(:name)"), {"name": name}).scalar() is not None:
+        return
+    bounds = f"FOR VALUES FROM ('{month.isoformat()}') TO ('{_next_month(month).isoformat()}')"
+    has_default = conn.execute(text("SELECT to_regclass('activities_default')")).scalar()
+    stray = has_default and conn.execute(
+        text(
+            "SELECT 1 FROM activities_default "
+            "WHERE created_at >= :start AND created_at < :end LIMIT 1"
+        ),
+        {"start": month, "end": _next_month(month)},
+    ).first()
+    if not stray:
+        conn.execute(text(f"CREATE TABLE {name} PARTITION OF activities {bounds}"))
+        return
+
+    # Rows that fell through to the default partition (no partition existed
+    # yet) would make CREATE ... PARTITION OF fail: build the partition
+    # detached, move them in, then attach it
+    conn.execute(
+        text(f"CREATE TABLE {name} (LIKE activities INCLUDING DEFAULTS INCLUDING CONSTRAINTS)")
+    )
+    moved = conn.execute(
+        text(
+            f"WITH moved AS (DELETE FROM activities_default "
+            f"WHERE created_at >= :start AND created_at < :end RETURNING *) "
+            f"INSERT INTO {name} SELECT * FROM moved"
+        ),
+        {"start": month, "end": _next_month(month)},
+    ).rowcount
+    conn.execute(text(f"ALTER TABLE activities ATTACH PARTITION {name} {bounds}"))
+    logger.warning("Moved %d activities from the default partition into %s", moved, name)
+
+
+def ensure_partitions(
+    conn: Connection, start: date | None = None, now: datetime | None = None
+) -> None:
+    """
+    Create the monthly partitions from `start` (default: this month)
+    through MONTHS_AHEAD months from `now`.
+    """
+    today = (now or datetime.utcnow()).date()
+    month = (start or today).replace(day=1)
+    last = today.replace(day=1)
+    for _ in range(MONTHS_AHEAD):
+        last = _next_month(last)
+
+    while month <= last:
+        _create_partition(conn, month)
+        month = _next_month(month)
+
+
+def maintain_partitions(engine: Engine, now: datetime | None = None) -> None:
+    """
+    Keep MONTHS_AHEAD months of partitions ahead of time; a no-op unless
+    `activities` is partitioned. Blocking.
+    """
+    if engine.dialect.name != "postgresql":
+        return
+    with engine.begin() as conn:
+        # A roll-up or conversion in progress creates them itself
+        if not conn.execute(
+            text("SELECT pg_try_advisory_xact_lock(:key)"), {"key": _LOCK_KEY}
+        ).scalar():
+            return
+        if is_partitioned(conn):
+            ensure_partitions(conn, now=now)
+
+
+def partition_activities(engine: Engine) -> bool:
+    """
+    Convert a plain `activities` table into a monthly range-partitioned one,
+    keeping ids and the id sequence. Idempotent; returns True if it
+    converted. Runs at startup when ACTIVITY_PARTITIONING is on.
+    """
+    if engine.dialect.name != "postgresql":
+        return False
+
+    with engine.begin() as conn:
+        # Several workers may boot at once; only one converts
+        conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": _LOCK_KEY})
+        if is_partitioned(conn):
+            ensure_partitions(conn)
+            return False
+
+        sequence = conn.execute(text("SELECT pg_get_serial_sequence('activities', 'id')")).scalar()
+        first = conn.execute(text("SELECT min(created_at) FROM activities")).scalar()
+
+        conn.execute(text("ALTER TABLE activities RENAME TO activities_unpartitioned"))
+        conn.execute(text(f"ALTER SEQUENCE {sequence} OWNED BY NONE"))
+        # The partition key has to be part of the primary key
+        conn.execute(
+            text(
+                f"""
+                CREATE TABLE activities (
+                    id integer NOT NULL DEFAULT nextval('{sequence}'),
+                    project_id integer NOT NULL REFERENCES projects (id),
+                    user_id integer NOT NULL REFERENCES users (id),
+                    type varchar NOT NULL,
+                    payload json,
+                    message text NOT NULL DEFAULT '',
+                    created_at timestamp NOT NULL DEFAULT (now() AT TIME ZONE 'utc'),
+                    CONSTRAINT activities_partitioned_pkey PRIMARY KEY (id, created_at)
+                ) PARTITION BY RANGE (created_at)
+                """
+            )
+        )
+        conn.execute(text("CREATE TABLE activities_default PARTITION OF activities DEFAULT"))
+        ensure_partitions(conn, first.date() if first else None)
+
+        conn.execute(
+            text(
+                "INSERT INTO activities "
+                "(id, project_id, user_id, type, payload, message, created_at) "
+                "SELECT id, project_id, user_id, type, payload, message, "
+                "COALESCE(created_at, now() AT TIME ZONE 'utc') "
+                "FROM activities_unpartitioned"
+            )
+        )
+        # Also drops the old indexes; run_migrations recreates them on the parent
+        conn.execute(text("DROP TABLE activities_unpartitioned"))
+        conn.execute(text(f"ALTER SEQUENCE {sequence} OWNED BY activities.id"))
+
+    logger.info("Converted activities to a partitioned table")
+    return True
+
+
+# ---------- roll-up ----------
+
+
+def _summarize_day(conn: Connection, day: date) -> int:
+    """
+    Add the raw rows of `day` to the daily summaries; returns how many.
+    """
+    start = _midnight(day)
+    counts = conn.execute(
+        select(_activities.c.project_id, _activities.c.type, func.count())
+        .where(
+            _activities.c.created_at >= start,
+            _activities.c.created_at < start + timedelta(days=1),
+        )
+        .group_by(_activities.c.project_id, _activities.c.type)
+    ).all()
+    if not counts:
+        return 0
+
+    dialect_insert = postgresql.insert if conn.dialect.name == "postgresql" else sqlite.insert
+    stmt = dialect_insert(_summaries)
+    # Counts add up if a day is summarised in more than one pass
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["project_id", "day", "type"],
+        set_={"count": _summaries.c.count + stmt.excluded.count},
+    )
+    conn.execute(
+        stmt,
+        [
+            {"project_id": project_id, "day": day, "type": type_, "count": count}
+            for project_id, type_, count in counts
+        ],
+    )
+    return sum(count for _, _, count in counts)
+
+
+def _drop_expired_partitions(
+    conn: Connection, months: list[date], cutoff: datetime, result: RetentionResult
+) -> None:
+    for month in months:
+        end = _next_month(month)
+        if _midnight(end) > cutoff:
+            break
+        with conn.begin():
+            day = month
+            while day < end:
+                rows = _summarize_day(conn, day)
+                if rows:
+                    result.days_rolled_up += 1
+                    result.rows_removed += rows
+                day += timedelta(days=1)
+            conn.execute(text(f"DROP TABLE {_partition_name(month)}"))
+        result.partitions_dropped += 1
+
+
+def _delete_expired_rows(conn: Connection, cutoff: datetime, result: RetentionResult) -> None:
+    while True:
+        with conn.begin():
+            oldest = conn.execute(
+                select(func.min(_activities.c.created_at)).where(
+                    _activities.c.created_at < cutoff
+                )
+            ).scalar()
+            if oldest is None:
+                return
+            # Jump straight to the next day that has rows
+            day = oldest.date()
+            result.rows_removed += _summarize_day(conn, day)
+            result.days_rolled_up += 1
+            start = _midnight(day)
+            conn.execute(
+                delete(_activities).where(
+                    _activities.c.created_at >= start,
+                    _activities.c.created_at < start + timedelta(days=1),
+                )
+            )
+
+
+def rollup(engine: Engine, retention_days: int, now: datetime | None = None) -> RetentionResult:
+    """
+    Summarise and remove raw activity older than `retention_days` whole
+    days. Safe to run concurrently: on Postgres a second run just skips.
+    """
+    result = RetentionResult()
+    if retention_days <= 0:
+        return result
+    cutoff = _midnight((now or datetime.utcnow()).date() - timedelta(days=retention_days))
+    is_postgres = engine.dialect.name == "postgresql"
+
+    with engine.connect() as conn:
+        if is_postgres:
+            with conn.begin():
+                locked = conn.execute(
+                    text("SELECT pg_try_advisory_lock(:key)"), {"key": _LOCK_KEY}
+                ).scalar()
+            if not locked:
+                return result
+        try:
+            # Read the partition list here: every step below runs in its
+            # own transaction, which conn.begin() refuses inside an
+            # autobegun one
+            with conn.begin():
+                partitioned = is_partitioned(conn)
+                if partitioned:
+                    ensure_partitions(conn)
+                months = _monthly_partitions(conn) if partitioned else []
+            if months:
+                _drop_expired_partitions(conn, months, cutoff, result)
+            # Rows in partial months, the default partition or a plain table
+            _delete_expired_rows(conn, cutoff, result)
+        finally:
+            if is_postgres:
+                with conn.begin():
+                    conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": _LOCK_KEY})
+
+    return result
+
+
+async def run_partition_loop() -> None:
+    while True:
+        await asyncio.sleep(PARTITION_CHECK_SECONDS)
+        try:
+            await asyncio.to_thread(maintain_partitions, engine)
+        except Exception:
+            logger.exception("Activity partition maintenance failed")
+
+
+async def run_retention_loop() -> None:
+    interval = settings.ACTIVITY_RETENTION_INTERVAL_HOURS * 3600
+    while True:
+        try:
+            result = await asyncio.to_thread(rollup, engine, settings.ACTIVITY_RETENTION_DAYS)
+            if result.rows_removed:
+                logger.info("Activity retention: %s", result)
+        except Exception:
+            logger.exception("Activity retention run failed")
+        await asyncio.sleep(interval)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    days = int(sys.argv[1]) if len(sys.argv) > 1 else settings.ACTIVITY_RETENTION_DAYS
+    print(rollup(engine, days))
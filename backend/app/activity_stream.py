@@ -0,0 +1,156 @@
+"""
+Server-Sent Events fan-out for activity entries.
+
+Every `activity_created` event that reaches this worker (through the
+backplane) is appended to a bounded ring buffer and pushed to the open SSE
+subscriptions that care about its project. A client reconnecting with
+`Last-Event-ID` is replayed from the buffer when it still covers that id,
+otherwise from the database, page by page until it has caught up, before
+any live item is sent.
+"""
+
+import asyncio
+import json
+from collections import deque
+from typing import Any, AsyncIterator, Awaitable, Callable
+
+from sqlalchemy.orm import Session, selectinload
+
+from . import models, schemas
+from .config import settings
+
+KEEPALIVE_SECONDS = 15
+# Rows per page of a database replay
+REPLAY_LIMIT = 500
+
+
+class Subscription:
+    def __init__(self, project_ids: set[int], maxsize: int = 1000) -> None:
+        self.project_ids = project_ids
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self.overflowed = False
+
+    def offer(self, item: dict[str, Any]) -> None:
+        if item["project_id"] not in self.project_ids:
+            return
+        try:
+            self.queue.put_nowait(item)
+        except asyncio.QueueFull:
+            # Too far behind: end the stream, the client resumes by Last-Event-ID
+            self.overflowed = True
+
+
+class ActivityStream:
+    def __init__(self, maxlen: int) -> None:
+        self._buffer: deque[dict[str, Any]] = deque(maxlen=maxlen)
+        self._subscriptions: set[Subscription] = set()
+
+    def feed(self, event: dict[str, Any]) -> None:
+        """
+        Hub listener; runs on the event loop for every delivered event.
+        """
+        if event.get("type") != "activity_created":
+            return
+        item = event["data"]
+        self._buffer.append(item)
+        for sub in list(self._subscriptions):
+            sub.offer(item)
+
+    def subscribe(self, project_ids: set[int]) -> Subscription:
+        sub = Subscription(project_ids)
+        self._subscriptions.add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscription) -> None:
+        self._subscriptions.discard(sub)
+
+    def replay_from_buffer(
+        self,
+        project_ids: set[int],
+        last_id: int,
+    ) -> list[dict[str, Any]] | None:
+        """
+        Items after `last_id`, or None if the buffer no longer reaches back
+        that far (caller falls back to the DB).
+        """
+        if not self._buffer or self._buffer[0]["id"] > last_id + 1:
+            return None
+        items = [
+            item
+            for item in self._buffer
+            if item["id"] > last_id and item["project_id"] in project_ids
+        ]
+        return sorted(items, key=lambda item: item["id"])
+
+
+stream = ActivityStream(settings.ACTIVITY_STREAM_BUFFER)
+
+
+def replay_from_db(db: Session, project_ids: set[int], last_id: int) -> list[dict[str, Any]]:
+    """
+    One page (up to REPLAY_LIMIT items) after `last_id`; a full page means
+    there may be more.
+    """
+    rows = (
+        db.query(models.Activity)
+        .options(selectinload(models.Activity.user))
+        .filter(
+            models.Activity.project_id.in_(project_ids),
+            models.Activity.id > last_id,
+        )
+        .order_by(models.Activity.id.asc())
+        .limit(REPLAY_LIMIT)
+        .all()
+    )
+    return [
+        schemas.ActivityOut.model_validate(row, from_attributes=True).model_dump(mode="json")
+        for row in rows
+    ]
+
+
+def format_sse(item: dict[str, Any]) -> str:
+    return f"id: {item['id']}\nevent: activity\ndata: {json.dumps(item)}\n\n"
+
+
+async def event_source(
+    request: Any,
+    sub: Subscription,
+    backlog: list[dict[str, Any]],
+    next_page: Callable[[int], Awaitable[list[dict[str, Any]]]] | None = None,
+) -> AsyncIterator[str]:
+    """
+    Body of a StreamingResponse: replay, then live items, with keep-alives.
+
+    When the backlog is the first page of a database replay, `next_page`
+    fetches the page after a given id; pages are sent until a short one, so
+    live items (whose ids may be far ahead) never skip over a gap.
+    """
+    replayed: set[int] = set()
+    try:
+        # Tell EventSource how long to wait before reconnecting
+        yield "retry: 3000\n\n"
+        page = backlog
+        while True:
+            for item in page:
+                replayed.add(item["id"])
+                yield format_sse(item)
+            if next_page is None or len(page) < REPLAY_LIMIT:
+                break
+            if await request.is_disconnected():
+                return
+            page = await next_page(page[-1]["id"])
+
+        while not sub.overflowed:
+            if await request.is_disconnected():
+                break
+            try:
+                item = await asyncio.wait_for(sub.queue.get(), timeout=KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+            # Subscribed before the replay ran, so skip what it already sent
+            if item["id"] in replayed:
+                continue
+            yield format_sse(item)
+    finally:
+        stream.unsubscribe(sub)
@@ -0,0 +1,177 @@
+"""
+Project batch reviews: analyze every asset of a project with a given status.
+
+`create` answers what it can from the suggestion cache right away and
+queues an app.ai_jobs job, tagged with the batch, for the rest; the job
+workers run at most AI_BATCH_PARALLELISM of one batch at a time. Progress
+and results are read back from the items' jobs, so any API process can
+report on (and stream) any batch.
+"""
+
+import asyncio
+import json
+import os
+from typing import Any, AsyncIterator
+
+from sqlalchemy.orm import Session, selectinload
+from starlette.concurrency import run_in_threadpool
+
+from . import ai_cache, ai_jobs, ai_suggestions, models, schemas
+from .database import SessionLocal
+from .realtime import to_payload
+
+CACHED = "cached"
+ITEM_STATUSES = (CACHED, ai_jobs.QUEUED, ai_jobs.RUNNING, ai_jobs.SUCCEEDED, ai_jobs.FAILED)
+FINISHED = (CACHED, ai_jobs.SUCCEEDED, ai_jobs.FAILED)
+
+POLL_SECONDS = 1.0
+KEEPALIVE_SECONDS = 15
+
+
+def create(
+    db: Session,
+    project_id: int,
+    user_id: int,
+    asset_status: str,
+    refresh: bool = False,
+) -> models.AIBatch:
+    assets = (
+        db.query(models.Asset)
+        .filter(
+            models.Asset.project_id == project_id,
+            models.Asset.status == asset_status,
+        )
+        .order_by(models.Asset.id.asc())
+        .all()
+    )
+    batch = models.AIBatch(
+        project_id=project_id,
+        requested_by=user_id,
+        asset_status=asset_status,
+        refresh=refresh,
+    )
+    db.add(batch)
+
+    to_queue: list[tuple[models.AIBatchItem, models.Asset]] = []
+    for asset in assets:
+        item = models.AIBatchItem(asset_id=asset.id)
+        batch.items.append(item)
+
+        path = ai_suggestions.asset_path(asset)
+        if not os.path.exists(path):
+            item.error = "Asset file not found on server"
+            continue
+        if asset.content_hash is None:
+            asset.content_hash = ai_cache.file_sha256(path)
+        if not refresh:
+            cached = ai_cache.lookup(db, ai_suggestions.cache_key_for(asset.content_hash))
+            if cached is not None:
+                item.result = cached
+                continue
+        to_queue.append((item, asset))
+    db.commit()
+
+    for item, asset in to_queue:
+        # An asset that already has an active job (e.g. from its upload) keeps it
+        item.job_id = ai_jobs.enqueue(
+            db, asset, refresh=refresh, batch_id=batch.id, requested_by=user_id
+        ).id
+    db.commit()
+    db.refresh(batch)
+    return batch
+
+
+def item_out(item: models.AIBatchItem) -> dict[str, Any]:
+    if item.result is not None:
+        return {"asset_id": item.asset_id, "status": CACHED, "suggestions": item.result, "error": None}
+    if item.job is None:
+        # File was missing, or the job was deleted with its asset
+        return {
+            "asset_id": item.asset_id,
+            "status": ai_jobs.FAILED,
+            "suggestions": None,
+            "error": item.error or "Job no longer exists",
+        }
+    return {
+        "asset_id": item.asset_id,
+        "status": item.job.status,
+        "suggestions": item.job.result if item.job.status == ai_jobs.SUCCEEDED else None,
+        "error": item.job.error if item.job.status == ai_jobs.FAILED else None,
+    }
+
+
+def progress(batch: models.AIBatch, items: list[dict[str, Any]]) -> dict[str, Any]:
+    counts = dict.fromkeys(ITEM_STATUSES, 0)
+    for item in items:
+        counts[item["status"]] += 1
+    return {
+        "id": batch.id,
+        "project_id": batch.project_id,
+        "asset_status": batch.asset_status,
+        "refresh": batch.refresh,
+        "created_at": batch.created_at,
+        "total": len(items),
+        "counts": counts,
+        "done": counts[ai_jobs.QUEUED] == 0 and counts[ai_jobs.RUNNING] == 0,
+    }
+
+
+def load(db: Session, batch_id: int) -> models.AIBatch | None:
+    return (
+        db.query(models.AIBatch)
+        .options(selectinload(models.AIBatch.items).selectinload(models.AIBatchItem.job))
+        .filter(models.AIBatch.id == batch_id)
+        .first()
+    )
+
+
+def snapshot(batch_id: int) -> tuple[dict[str, Any], list[dict[str, Any]]]:
+    """
+    (progress, items) on a short-lived session, so a stream does not hold
+    a DB connection between polls.
+    """
+    db = SessionLocal()
+    try:
+        batch = load(db, batch_id)
+        items = [item_out(item) for item in batch.items]
+        return progress(batch, items), items
+    finally:
+        db.close()
+
+
+def _format(event: str, data: dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def event_source(request: Any, batch_id: int) -> AsyncIterator[str]:
+    """
+    Body of a StreamingResponse: a `result` event per finished asset (in
+    completion order), `progress` whenever the counts change, then `done`.
+    A reconnect starts over, so clients should close the stream on `done`
+    and de-duplicate results by asset_id.
+    """
+    sent: set[int] = set()
+    last_counts = None
+    quiet = 0.0
+    yield "retry: 3000\n\n"
+    while True:
+        state, items = await run_in_threadpool(snapshot, batch_id)
+        for item in items:
+            if item["status"] in FINISHED and item["asset_id"] not in sent:
+                sent.add(item["asset_id"])
+                yield _format("result", to_payload(schemas.AIBatchItemOut, item))
+        if state["counts"] != last_counts:
+            last_counts = state["counts"]
+            quiet = 0.0
+            yield _format("progress", to_payload(schemas.AIBatchOut, state))
+        if state["done"]:
+            yield _format("done", to_payload(schemas.AIBatchOut, state))
+            return
+
+        if await request.is_disconnected():
+            return
+        await asyncio.sleep(POLL_SECONDS)
+        quiet += POLL_SECONDS
+        if quiet >= KEEPALIVE_SECONDS:
+            quiet = 0.0
+            yield ": keep-alive\n\n"
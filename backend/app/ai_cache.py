@@ -0,0 +1,111 @@
+"""
+Cache for AI suggestions.
+
+Entries are keyed by (file content hash, model, prompt version), so an
+unchanged file is only ever sent to the model once per prompt revision;
+bumping the prompt version or switching models misses naturally. The
+`ai_suggestions` table is the source of truth, with a small per-worker
+LRU in front of it so repeat views skip the DB as well.
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import NamedTuple
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from . import metrics, models
+from .config import settings
+
+CACHE_REQUESTS = metrics.counter(
+    "ai_suggestion_cache_requests_total",
+    "AI suggestion lookups by result (memory, db, miss, refresh).",
+)
+
+
+class CacheKey(NamedTuple):
+    content_hash: str
+    model: str
+    prompt_version: str
+
+
+class LRUCache:
+    def __init__(self, maxsize: int) -> None:
+        self.maxsize = maxsize
+        self._items: OrderedDict[CacheKey, list[str]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: CacheKey) -> list[str] | None:
+        with self._lock:
+            value = self._items.get(key)
+            if value is not None:
+                self._items.move_to_end(key)
+            return value
+
+    def put(self, key: CacheKey, value: list[str]) -> None:
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+
+_memory = LRUCache(settings.AI_CACHE_SIZE)
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def lookup(db: Session, key: CacheKey) -> list[str] | None:
+    suggestions = _memory.get(key)
+    if suggestions is not None:
+        CACHE_REQUESTS.inc(result="memory")
+        return suggestions
+
+    row = (
+        db.query(models.AISuggestion)
+        .filter(
+            models.AISuggestion.content_hash == key.content_hash,
+            models.AISuggestion.model == key.model,
+            models.AISuggestion.prompt_version == key.prompt_version,
+        )
+        .first()
+    )
+    if row is None:
+        CACHE_REQUESTS.inc(result="miss")
+        return None
+
+    CACHE_REQUESTS.inc(result="db")
+    _memory.put(key, row.suggestions)
+    return row.suggestions
+
+
+def store(db: Session, key: CacheKey, suggestions: list[str]) -> None:
+    """
+    Save (or replace, on a forced refresh) the suggestions for `key`.
+    """
+    _memory.put(key, suggestions)
+    filters = (
+        models.AISuggestion.content_hash == key.content_hash,
+        models.AISuggestion.model == key.model,
+        models.AISuggestion.prompt_version == key.prompt_version,
+    )
+    updated = (
+        db.query(models.AISuggestion)
+        .filter(*filters)
+        .update({"suggestions": suggestions}, synchronize_session=False)
+    )
+    if not updated:
+        db.add(models.AISuggestion(**key._asdict(), suggestions=suggestions))
+    try:
+        db.commit()
+    except IntegrityError:
+        # Another worker stored the same key first; theirs is as good
+        db.rollback()
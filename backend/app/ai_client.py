@@ -0,0 +1,125 @@
+"""
+Shared async OpenAI access for AI features.
+
+All calls go through `chat()`, which
+- caps concurrent requests per worker at AI_MAX_CONCURRENCY (callers wait
+  up to AI_QUEUE_TIMEOUT_SECONDS for a slot, then get AIBusyError),
+- bounds every attempt with AI_TIMEOUT_SECONDS,
+- retries rate limits, 5xx and timeouts up to AI_MAX_RETRIES times with
+  full-jitter exponential backoff (honouring Retry-After), releasing its
+  slot while it sleeps,
+- records every attempt (bytes, tokens, latency, outcome) and charges the
+  caller's token budgets through app.ai_usage.
+
+Nothing here blocks the event loop, so slow model calls no longer hold
+threadpool threads that other endpoints need.
+"""
+
+import asyncio
+import json
+import logging
+import random
+import time
+from typing import Any
+
+import openai
+from openai import AsyncOpenAI
+
+from . import ai_usage
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+BACKOFF_BASE_SECONDS = 0.5
+BACKOFF_MAX_SECONDS = 20.0
+
+_RETRYABLE = (
+    openai.RateLimitError,
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.InternalServerError,
+)
+
+
+class AIBusyError(Exception):
+    """No concurrency slot became free within AI_QUEUE_TIMEOUT_SECONDS."""
+
+
+_client: AsyncOpenAI | None = None
+_semaphore: asyncio.Semaphore | None = None
+
+
+def get_client() -> AsyncOpenAI:
+    global _client
+    if _client is None:
+        _client = AsyncOpenAI(
+            api_key=settings.OPENAI_API_KEY,
+            base_url=settings.OPENAI_BASE_URL or None,
+            timeout=settings.AI_TIMEOUT_SECONDS,
+            # Retries are done here so the slot is released while backing off
+            max_retries=0,
+        )
+    return _client
+
+
+def _get_semaphore() -> asyncio.Semaphore:
+    global _semaphore
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(settings.AI_MAX_CONCURRENCY)
+    return _semaphore
+
+
+def _backoff(attempt: int, error: Exception) -> float:
+    response = getattr(error, "response", None)
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    if retry_after:
+        try:
+            return min(float(retry_after), BACKOFF_MAX_SECONDS)
+        except ValueError:
+            pass
+    # Full jitter: spreads out callers that were throttled together
+    return random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2**attempt))
+
+
+async def chat(context: ai_usage.CallContext | None = None, **kwargs: Any) -> str:
+    """
+    `chat.completions.create(**kwargs)` with the limits above; returns the
+    text of the first choice. Non-retryable OpenAI errors propagate.
+    Token usage is charged to `context` (budgets are checked by callers,
+    see ai_usage.budgets.check).
+    """
+    semaphore = _get_semaphore()
+    model = kwargs.get("model", "")
+    request_bytes = len(json.dumps(kwargs.get("messages", [])))
+    attempt = 0
+    while True:
+        try:
+            await asyncio.wait_for(semaphore.acquire(), settings.AI_QUEUE_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            raise AIBusyError()
+        started = time.perf_counter()
+        try:
+            response = await get_client().chat.completions.create(**kwargs)
+        except Exception as e:
+            ai_usage.observe_call(model, context, request_bytes, time.perf_counter() - started, error=e)
+            if not isinstance(e, _RETRYABLE) or attempt >= settings.AI_MAX_RETRIES:
+                raise
+            error = e
+        else:
+            usage = response.usage
+            ai_usage.observe_call(
+                model,
+                context,
+                request_bytes,
+                time.perf_counter() - started,
+                prompt_tokens=usage.prompt_tokens if usage else 0,
+                completion_tokens=usage.completion_tokens if usage else 0,
+            )
+            return response.choices[0].message.content or ""
+        finally:
+            semaphore.release()
+
+        delay = _backoff(attempt, error)
+        logger.warning("OpenAI call failed (%r), retrying in %.2fs", error, delay)
+        attempt += 1
+        await asyncio.sleep(delay)
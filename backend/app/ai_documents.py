@@ -0,0 +1,417 @@
+"""
+Text extraction for document assets before AI submission.
+
+PDF, DOCX and XLSX files used to be sent as an "image" data URL of the raw
+file, which is large and not something a vision model can read. Instead
+they are reduced to compact, structured text plus a few layout hints
+(headings, lists, tables, sheet sizes, page count) and sent as a text
+message.
+
+OOXML is streamed with zipfile + iterparse and parsing stops once
+AI_DOC_MAX_CHARS (or AI_DOC_MAX_ROWS per sheet) is reached, so large
+files cost about as much as small ones. PDFs use their text layer via
+pypdf, page by page. The result is cached on disk per content hash and
+settings. Legacy .doc/.xls are not handled (extract_document returns None).
+"""
+
+import json
+import os
+import re
+import threading
+import time
+import zipfile
+from dataclasses import asdict, dataclass, field
+from typing import Any, Iterator
+from xml.etree.ElementTree import ParseError, iterparse
+
+from pypdf import PdfReader
+from pypdf.errors import PdfReadError
+
+from . import metrics
+from .config import settings
+
+DOCUMENT_EXTENSIONS = {".pdf", ".docx", ".xlsx"}
+# Bump when the extracted format changes so cached extractions are redone
+EXTRACTOR_VERSION = "1"
+
+DOC_BYTES = metrics.counter(
+    "ai_document_bytes_total",
+    "Bytes of documents submitted to the model: file size vs. extracted text sent (stage=original|sent).",
+)
+EXTRACT_SECONDS = metrics.histogram(
+    "ai_document_extract_seconds",
+    "Time to produce the text sent to the model for a document (cache=hit|miss).",
+    [0.005, 0.025, 0.1, 0.25, 0.5, 1, 2.5, 5],
+)
+
+_W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_S = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+_R = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+_PKG_REL = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+_EP = "{http://schemas.openxmlformats.org/officeDocument/2006/extended-properties}"
+
+_HEADING = re.compile(r"^heading\s*(\d)$", re.IGNORECASE)
+
+
+@dataclass
+class ExtractedDocument:
+    kind: str
+    text: str
+    hints: dict[str, Any] = field(default_factory=dict)
+    truncated: bool = False
+    original_bytes: int = 0
+
+    def as_prompt(self) -> str:
+        hints = ", ".join(f"{name}: {value}" for name, value in self.hints.items())
+        parts = [f"Document type: {self.kind.upper()}", f"Layout: {hints}"]
+        if self.truncated:
+            parts.append("(Content truncated; only the beginning is shown.)")
+        parts.append("Content:\n" + (self.text or "(no extractable text)"))
+        return "\n".join(parts)
+
+
+class _Budget:
+    """Collects output lines until the character budget runs out."""
+
+    def __init__(self, max_chars: int) -> None:
+        self.lines: list[str] = []
+        self.left = max_chars
+        self.truncated = False
+
+    def add(self, line: str) -> bool:
+        if self.left <= 0:
+            self.truncated = True
+            return False
+        if len(line) > self.left:
+            line = line[: self.left] + "…"
+            self.truncated = True
+        self.lines.append(line)
+        self.left -= len(line) + 1
+        return not self.truncated
+
+    @property
+    def full(self) -> bool:
+        return self.truncated
+
+    def text(self) -> str:
+        return "\n".join(self.lines)
+
+
+def _compact(text: str) -> str:
+    return " ".join(text.split())
+
+
+# ---------- DOCX ----------
+
+
+def _docx_pages(zf: zipfile.ZipFile) -> int | None:
+    # Page count as last saved by Word, if present
+    try:
+        with zf.open("docProps/app.xml") as f:
+            for _, elem in iterparse(f):
+                if elem.tag == f"{_EP}Pages" and elem.text and elem.text.isdigit():
+                    return int(elem.text)
+    except KeyError:
+        pass
+    return None
+
+
+def _extract_docx(path: str, max_chars: int) -> ExtractedDocument:
+    budget = _Budget(max_chars)
+    counts = {"paragraphs": 0, "headings": 0, "list items": 0, "tables": 0, "images": 0}
+    words = 0
+
+    with zipfile.ZipFile(path) as zf:
+        pages = _docx_pages(zf)
+        with zf.open("word/document.xml") as f:
+            runs: list[str] = []
+            style = ""
+            is_list = False
+            table_depth = 0
+            row: list[str] = []
+            cell: list[str] = []
+
+            for event, elem in iterparse(f, events=("start", "end")):
+                tag = elem.tag
+                if event == "start":
+                    if tag == f"{_W}tbl":
+                        table_depth += 1
+                        if table_depth == 1:
+                            counts["tables"] += 1
+                    elif tag == f"{_W}drawing" or tag == f"{_W}pict":
+                        counts["images"] += 1
+                    continue
+
+                if tag == f"{_W}t" and elem.text:
+                    runs.append(elem.text)
+                elif tag == f"{_W}tab":
+                    runs.append("\t")
+                elif tag == f"{_W}pStyle":
+                    style = elem.get(f"{_W}val", "")
+                elif tag == f"{_W}numPr":
+                    is_list = True
+                elif tag == f"{_W}p":
+                    text = _compact("".join(runs))
+                    runs, paragraph_style, paragraph_list = [], style, is_list
+                    style, is_list = "", False
+                    elem.clear()
+                    if not text:
+                        continue
+                    words += len(text.split())
+                    if table_depth:
+                        cell.append(text)
+                        continue
+
+                    heading = _HEADING.match(paragraph_style)
+                    if paragraph_style.lower() == "title":
+                        counts["headings"] += 1
+                        line = f"# {text}"
+                    elif heading:
+                        counts["headings"] += 1
+                        line = f"{'#' * min(int(heading.group(1)) + 1, 6)} {text}"
+                    elif paragraph_list:
+                        counts["list items"] += 1
+                        line = f"- {text}"
+                    else:
+                        counts["paragraphs"] += 1
+                        line = text
+                    if not budget.add(line):
+                        break
+                elif tag == f"{_W}tc" and table_depth == 1:
+                    # Nested tables are flattened into the outer cell
+                    row.append(" ".join(cell))
+                    cell = []
+                elif tag == f"{_W}tr" and table_depth == 1:
+                    if any(row):
+                        if not budget.add("| " + " | ".join(row) + " |"):
+                            break
+                    row = []
+                    elem.clear()
+                elif tag == f"{_W}tbl":
+                    table_depth -= 1
+                    elem.clear()
+
+    hints: dict[str, Any] = {"words": words}
+    if pages:
+        hints["pages"] = pages
+    hints.update((name, count) for name, count in counts.items() if count)
+    return ExtractedDocument("docx", budget.text(), hints, budget.truncated)
+
+
+# ---------- XLSX ----------
+
+
+def column_index(ref: str) -> int:
+    index = 0
+    for ch in ref:
+        if not ch.isalpha():
+            break
+        index = index * 26 + (ord(ch.upper()) - 64)
+    return index - 1
+
+
+def xlsx_sheets(zf: zipfile.ZipFile) -> list[tuple[str, str]]:
+    """(name, zip member) for each sheet, in workbook order."""
+    targets: dict[str, str] = {}
+    with zf.open("xl/_rels/workbook.xml.rels") as f:
+        for _, elem in iterparse(f):
+            if elem.tag == f"{_PKG_REL}Relationship":
+                target = elem.get("Target", "").lstrip("/")
+                if not target.startswith("xl/"):
+                    target = "xl/" + target
+                targets[elem.get("Id", "")] = target
+
+    sheets = []
+    with zf.open("xl/workbook.xml") as f:
+        for _, elem in iterparse(f):
+            if elem.tag == f"{_S}sheet":
+                target = targets.get(elem.get(f"{_R}id", ""))
+                if target:
+                    sheets.append((elem.get("name", ""), target))
+    return sheets
+
+
+def _xlsx_shared_strings(zf: zipfile.ZipFile) -> list[str]:
+    strings: list[str] = []
+    try:
+        f = zf.open("xl/sharedStrings.xml")
+    except KeyError:
+        return strings
+    with f:
+        parts: list[str] = []
+        for _, elem in iterparse(f):
+            if elem.tag == f"{_S}t" and elem.text:
+                parts.append(elem.text)
+            elif elem.tag == f"{_S}si":
+                strings.append(_compact("".join(parts)))
+                parts = []
+                elem.clear()
+    return strings
+
+
+def _xlsx_rows(f, shared: list[str]) -> Iterator[tuple[str | None, list[str], int]]:
+    """
+    Yields ("dimension", [], 0) for the sheet's declared range, then
+    (None, cells, formulas) per non-empty row.
+    """
+    for _, elem in iterparse(f):
+        if elem.tag == f"{_S}dimension":
+            yield elem.get("ref", ""), [], 0
+        elif elem.tag == f"{_S}row":
+            cells: list[str] = []
+            formulas = 0
+            for c in elem.iter(f"{_S}c"):
+                kind = c.get("t")
+                if c.find(f"{_S}f") is not None:
+                    formulas += 1
+                if kind == "inlineStr":
+                    value = "".join(t.text or "" for t in c.iter(f"{_S}t"))
+                else:
+                    v = c.find(f"{_S}v")
+                    value = v.text if v is not None and v.text else ""
+                    if kind == "s" and value.isdigit() and int(value) < len(shared):
+                        value = shared[int(value)]
+                    elif kind == "b":
+                        value = "TRUE" if value == "1" else "FALSE"
+                column = column_index(c.get("r", "")) if c.get("r") else len(cells)
+                if column >= len(cells):
+                    cells.extend([""] * (column - len(cells) + 1))
+                cells[column] = _compact(value)
+            elem.clear()
+            if any(cells):
+                yield None, cells, formulas
+
+
+def _extract_xlsx(path: str, max_chars: int, max_rows: int) -> ExtractedDocument:
+    budget = _Budget(max_chars)
+    sheet_hints: list[str] = []
+    formulas = 0
+
+    with zipfile.ZipFile(path) as zf:
+        sheets = xlsx_sheets(zf)
+        shared = _xlsx_shared_strings(zf)
+        for name, member in sheets:
+            if budget.full:
+                sheet_hints.append(f"{name} (not shown)")
+                continue
+            budget.add(f"## Sheet: {name}")
+            dimension = ""
+            shown = 0
+            with zf.open(member) as f:
+                for ref, cells, row_formulas in _xlsx_rows(f, shared):
+                    if ref is not None:
+                        dimension = ref
+                        continue
+                    formulas += row_formulas
+                    if not budget.add("| " + " | ".join(cells) + " |"):
+                        break
+                    shown += 1
+                    if shown >= max_rows:
+                        # The rest of the sheet is summarised by its dimension
+                        budget.add("| … |")
+                        break
+            sheet_hints.append(f"{name} ({dimension or f'{shown} rows'})")
+
+    hints: dict[str, Any] = {"sheets": "; ".join(sheet_hints)}
+    if formulas:
+        hints["formulas in shown rows"] = formulas
+    return ExtractedDocument("xlsx", budget.text(), hints, budget.truncated)
+
+
+# ---------- PDF ----------
+
+
+def _extract_pdf(path: str, max_chars: int) -> ExtractedDocument:
+    budget = _Budget(max_chars)
+    reader = PdfReader(path)
+    page_count = len(reader.pages)
+    without_text = 0
+    orientations: set[str] = set()
+
+    for number, page in enumerate(reader.pages, start=1):
+        if budget.full:
+            break
+        box = page.mediabox
+        orientations.add("landscape" if box.width > box.height else "portrait")
+        text = page.extract_text() or ""
+        lines = [_compact(line) for line in text.splitlines()]
+        lines = [line for line in lines if line]
+        if not lines:
+            without_text += 1
+            continue
+        budget.add(f"## Page {number}")
+        for line in lines:
+            if not budget.add(line):
+                break
+
+    hints: dict[str, Any] = {"pages": page_count}
+    if orientations:
+        hints["orientation"] = "/".join(sorted(orientations))
+    if reader.metadata is not None and reader.metadata.title:
+        hints["title"] = reader.metadata.title
+    if without_text:
+        # Scanned pages have no text layer; the model should know it is not seeing them
+        hints["pages without text (scanned?)"] = without_text
+    return ExtractedDocument("pdf", budget.text(), hints, budget.truncated)
+
+
+# ---------- entry point ----------
+
+
+def is_document(path: str) -> bool:
+    return os.path.splitext(path.lower())[1] in DOCUMENT_EXTENSIONS
+
+
+def _cache_path(content_hash: str) -> str:
+    # Settings are part of the name so changing them re-extracts
+    variant = f"v{EXTRACTOR_VERSION}c{settings.AI_DOC_MAX_CHARS}r{settings.AI_DOC_MAX_ROWS}"
+    return os.path.join(settings.AI_DOC_CACHE_DIR, f"{content_hash}-{variant}.json")
+
+
+def _extract(path: str) -> ExtractedDocument | None:
+    ext = os.path.splitext(path.lower())[1]
+    max_chars = settings.AI_DOC_MAX_CHARS
+    try:
+        if ext == ".docx":
+            return _extract_docx(path, max_chars)
+        if ext == ".xlsx":
+            return _extract_xlsx(path, max_chars, settings.AI_DOC_MAX_ROWS)
+        if ext == ".pdf":
+            return _extract_pdf(path, max_chars)
+    except (zipfile.BadZipFile, KeyError, ParseError, PdfReadError):
+        # Corrupt file, or not what its extension says
+        return None
+    return None
+
+
+def extract_document(path: str, content_hash: str) -> ExtractedDocument | None:
+    """
+    Compact text and layout hints for the document at `path`, or None if
+    it is not a document we can read. Blocking; call from a thread.
+    """
+    if not is_document(path):
+        return None
+    started = time.perf_counter()
+    original_bytes = os.path.getsize(path)
+    cache_path = _cache_path(content_hash)
+
+    cache = "hit"
+    try:
+        with open(cache_path, encoding="utf-8") as f:
+            doc = ExtractedDocument(**json.load(f))
+    except FileNotFoundError:
+        cache = "miss"
+        doc = _extract(path)
+        if doc is None:
+            return None
+        doc.original_bytes = original_bytes
+        os.makedirs(settings.AI_DOC_CACHE_DIR, exist_ok=True)
+        tmp_path = f"{cache_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(asdict(doc), f, ensure_ascii=False)
+        os.replace(tmp_path, cache_path)
+
+    DOC_BYTES.inc(original_bytes, stage="original")
+    DOC_BYTES.inc(len(doc.as_prompt().encode("utf-8")), stage="sent")
+    EXTRACT_SECONDS.observe(time.perf_counter() - started, cache=cache)
+    return doc
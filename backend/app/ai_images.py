@@ -0,0 +1,142 @@
+"""
+Image preprocessing before AI submission.
+
+Vision models downsample large images anyway (roughly: fit in 2048x2048,
+then shortest side 768), so sending a 12 MB PNG only costs upload time and
+tokens. Images are scaled to that useful resolution, EXIF-rotated,
+flattened and re-encoded (JPEG or WebP, no metadata). The result is cached
+on disk per content hash and settings, so repeat analyses skip the work.
+Files Pillow cannot read are sent unchanged (documents go through
+app.ai_documents instead).
+"""
+
+import base64
+import io
+import os
+import threading
+import time
+from dataclasses import dataclass
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from . import metrics
+from .config import settings
+
+IMAGE_BYTES = metrics.counter(
+    "ai_image_bytes_total",
+    "Bytes of images submitted to the model, before and after preprocessing (stage=original|sent).",
+)
+PREP_SECONDS = metrics.histogram(
+    "ai_image_prep_seconds",
+    "Time to produce the image sent to the model (cache=hit|miss|passthrough).",
+    [0.005, 0.025, 0.1, 0.25, 0.5, 1, 2.5, 5],
+)
+
+_MIME_BY_EXT = {
+    ".jpg": "image/jpeg",
+    ".jpeg": "image/jpeg",
+    ".webp": "image/webp",
+    ".png": "image/png",
+}
+_FORMATS = {"jpeg": ("JPEG", "image/jpeg", "jpg"), "webp": ("WEBP", "image/webp", "webp")}
+
+
+@dataclass
+class PreparedImage:
+    data: bytes
+    mime: str
+    original_bytes: int
+
+    @property
+    def data_url(self) -> str:
+        return f"data:{self.mime};base64,{base64.b64encode(self.data).decode('ascii')}"
+
+
+def _target_size(width: int, height: int) -> tuple[int, int]:
+    long_side, short_side = max(width, height), min(width, height)
+    scale = min(
+        1.0,
+        settings.AI_IMAGE_MAX_LONG_SIDE / long_side,
+        settings.AI_IMAGE_MAX_SHORT_SIDE / short_side,
+    )
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def _cache_path(content_hash: str) -> str:
+    _, _, ext = _FORMATS[settings.AI_IMAGE_FORMAT]
+    # Settings are part of the name so changing them re-processes
+    variant = (
+        f"{settings.AI_IMAGE_MAX_LONG_SIDE}x{settings.AI_IMAGE_MAX_SHORT_SIDE}"
+        f"q{settings.AI_IMAGE_QUALITY}"
+    )
+    return os.path.join(settings.AI_IMAGE_CACHE_DIR, f"{content_hash}-{variant}.{ext}")
+
+
+def _process(path: str) -> bytes | None:
+    """
+    Downscaled, re-encoded copy of the image, or None if Pillow cannot
+    read the file.
+    """
+    pil_format, _, _ = _FORMATS[settings.AI_IMAGE_FORMAT]
+    try:
+        with Image.open(path) as img:
+            if img.format == "JPEG":
+                # Let libjpeg decode at a reduced scale (>= the target size)
+                img.draft("RGB", _target_size(*img.size))
+            img = ImageOps.exif_transpose(img)
+            if img.mode in ("RGBA", "LA", "P"):
+                # Flatten transparency onto white, as viewers usually show it
+                img = img.convert("RGBA")
+                background = Image.new("RGB", img.size, (255, 255, 255))
+                background.paste(img, mask=img.getchannel("A"))
+                img = background
+            elif img.mode != "RGB":
+                img = img.convert("RGB")
+
+            size = _target_size(*img.size)
+            if size != img.size:
+                img = img.resize(size, Image.Resampling.LANCZOS)
+
+            out = io.BytesIO()
+            # No exif/icc passed through: metadata is stripped
+            img.save(out, pil_format, quality=settings.AI_IMAGE_QUALITY, optimize=True)
+            return out.getvalue()
+    except (UnidentifiedImageError, OSError):
+        return None
+
+
+def prepare_image(path: str, content_hash: str) -> PreparedImage:
+    """
+    The bytes to send to the model for the file at `path`. Blocking; call
+    from a thread.
+    """
+    started = time.perf_counter()
+    original_bytes = os.path.getsize(path)
+    _, mime, _ = _FORMATS[settings.AI_IMAGE_FORMAT]
+    cache_path = _cache_path(content_hash)
+
+    cache = "hit"
+    try:
+        with open(cache_path, "rb") as f:
+            data = f.read()
+    except FileNotFoundError:
+        cache = "miss"
+        data = _process(path)
+        if data is not None and len(data) < original_bytes:
+            os.makedirs(settings.AI_IMAGE_CACHE_DIR, exist_ok=True)
+            tmp_path = f"{cache_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, cache_path)
+        else:
+            # Not an image, or already smaller than anything we would produce
+            cache = "passthrough"
+            with open(path, "rb") as f:
+                data = f.read()
+            ext = os.path.splitext(path.lower())[1]
+            mime = _MIME_BY_EXT.get(ext, "image/png")
+
+    IMAGE_BYTES.inc(original_bytes, stage="original")
+    IMAGE_BYTES.inc(len(data), stage="sent")
+    PREP_SECONDS.observe(time.perf_counter() - started, cache=cache)
+    return PreparedImage(data=data, mime=mime, original_bytes=original_bytes)
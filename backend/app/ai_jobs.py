@@ -0,0 +1,370 @@
+"""
+Background AI analysis jobs.
+
+Jobs live in the `ai_jobs` table, so they survive restarts and any worker
+process can pick them up. Every process runs AI_JOB_WORKERS asyncio
+workers that claim queued jobs with a conditional UPDATE
+(queued -> running), generate suggestions through app.ai_suggestions and
+store the result. Failures are retried with exponential backoff up to
+AI_JOB_MAX_ATTEMPTS. A running job's worker refreshes its `heartbeat_at`
+while the job is in progress (however long the model call and the wait
+for another process's identical call take); jobs whose heartbeat is older
+than AI_JOB_TIMEOUT_SECONDS (their worker died) go back to the queue.
+
+Uploads enqueue a job, so suggestions are usually ready by the time
+someone opens the asset. Jobs queued by a project batch review
+(app.ai_batches) carry its id, and at most AI_BATCH_PARALLELISM of one
+batch run at a time so a large batch cannot occupy every worker. To run the queue offline, start
+`python -m benchmarks.fake_openai` and set OPENAI_BASE_URL to it.
+"""
+
+import asyncio
+import logging
+import os
+import socket
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+import openai
+from sqlalchemy import func, or_, select
+from sqlalchemy.orm import Session, aliased
+from starlette.concurrency import run_in_threadpool
+
+from . import ai_cache, ai_suggestions, ai_usage, models, schemas
+from .config import settings
+from .database import SessionLocal
+from .realtime import publish, to_payload
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+ACTIVE = (QUEUED, RUNNING)
+
+RETRY_BASE_SECONDS = 5
+# Errors another attempt will not fix
+_PERMANENT = (
+    openai.AuthenticationError,
+    openai.PermissionDeniedError,
+    openai.BadRequestError,
+    openai.NotFoundError,
+    FileNotFoundError,
+    ai_usage.AIBudgetExceededError,
+)
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+
+@dataclass
+class ClaimedJob:
+    id: int
+    asset_id: int
+    project_id: int
+    image_path: str
+    content_hash: str
+    refresh: bool
+    attempts: int
+    requested_by: int | None
+
+
+_loop: asyncio.AbstractEventLoop | None = None
+_wakeup: asyncio.Event | None = None
+_tasks: list[asyncio.Task] = []
+
+
+def _wake() -> None:
+    if _loop is not None and _wakeup is not None:
+        _loop.call_soon_threadsafe(_wakeup.set)
+
+
+def enqueue(
+    db: Session,
+    asset: models.Asset,
+    refresh: bool = False,
+    batch_id: int | None = None,
+    requested_by: int | None = None,
+) -> models.AIJob:
+    """
+    Queue suggestions for `asset`, or return the job already queued/running
+    for it. A refresh upgrades a queued job to one; a running job that may
+    answer from the cache gets a refresh queued after it.
+    """
+    existing = (
+        db.query(models.AIJob)
+        .filter(
+            models.AIJob.asset_id == asset.id,
+            models.AIJob.status.in_(ACTIVE),
+        )
+        .order_by(models.AIJob.id.desc())
+        .first()
+    )
+    if existing is not None and (existing.refresh or not refresh):
+        return existing
+    if existing is not None and existing.status == QUEUED:
+        # Only while still queued: a worker may claim it meanwhile
+        upgraded = (
+            db.query(models.AIJob)
+            .filter(models.AIJob.id == existing.id, models.AIJob.status == QUEUED)
+            .update({"refresh": True}, synchronize_session=False)
+        )
+        db.commit()
+        if upgraded:
+            db.refresh(existing)
+            return existing
+
+    job = models.AIJob(
+        asset_id=asset.id,
+        refresh=refresh,
+        batch_id=batch_id,
+        requested_by=requested_by,
+    )
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    _wake()
+    return job
+
+
+# ---------- worker side (each helper uses its own short-lived session) ----------
+
+
+def _requeue_stale(db: Session, now: datetime) -> None:
+    # Jobs claimed before heartbeats existed only have started_at
+    last_seen = func.coalesce(models.AIJob.heartbeat_at, models.AIJob.started_at)
+    db.query(models.AIJob).filter(
+        models.AIJob.status == RUNNING,
+        last_seen < now - timedelta(seconds=settings.AI_JOB_TIMEOUT_SECONDS),
+    ).update({"status": QUEUED, "locked_by": None}, synchronize_session=False)
+    db.commit()
+
+
+def _heartbeat(job_id: int) -> bool:
+    """Refresh heartbeat_at; False if the job is no longer ours."""
+    db = SessionLocal()
+    try:
+        updated = (
+            db.query(models.AIJob)
+            .filter(
+                models.AIJob.id == job_id,
+                models.AIJob.status == RUNNING,
+                models.AIJob.locked_by == WORKER_ID,
+            )
+            .update({"heartbeat_at": datetime.utcnow()}, synchronize_session=False)
+        )
+        db.commit()
+        return bool(updated)
+    finally:
+        db.close()
+
+
+async def _keep_alive(job_id: int) -> None:
+    interval = settings.AI_JOB_TIMEOUT_SECONDS / 4
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            if not await run_in_threadpool(_heartbeat, job_id):
+                logger.warning("AI job %s was taken over by another worker", job_id)
+                return
+        except Exception:
+            # A missed beat or two is fine; the next one may get through
+            logger.exception("Failed to refresh the heartbeat of AI job %s", job_id)
+
+
+def _claim() -> ClaimedJob | None:
+    db = SessionLocal()
+    try:
+        now = datetime.utcnow()
+        _requeue_stale(db, now)
+
+        saturated_batches = (
+            select(models.AIJob.batch_id)
+            .where(models.AIJob.status == RUNNING, models.AIJob.batch_id.isnot(None))
+            .group_by(models.AIJob.batch_id)
+            .having(func.count() >= settings.AI_BATCH_PARALLELISM)
+        )
+        candidates = (
+            db.query(models.AIJob.id, models.AIJob.batch_id)
+            .filter(
+                models.AIJob.status == QUEUED,
+                models.AIJob.run_after <= now,
+                or_(
+                    models.AIJob.batch_id.is_(None),
+                    models.AIJob.batch_id.not_in(saturated_batches),
+                ),
+            )
+            .order_by(models.AIJob.id.asc())
+            .limit(10)
+            .all()
+        )
+        for job_id, batch_id in candidates:
+            conditions = [models.AIJob.id == job_id, models.AIJob.status == QUEUED]
+            if batch_id is not None:
+                # Re-checked in the UPDATE, so concurrent claims cannot overshoot the
+                # cap on SQLite; on Postgres (READ COMMITTED) it is a soft limit
+                running = aliased(models.AIJob)
+                conditions.append(
+                    select(func.count())
+                    .select_from(running)
+                    .where(running.batch_id == batch_id, running.status == RUNNING)
+                    .scalar_subquery()
+                    < settings.AI_BATCH_PARALLELISM
+                )
+            # Whoever flips the status first owns the job
+            claimed = (
+                db.query(models.AIJob)
+                .filter(*conditions)
+                .update(
+                    {
+                        "status": RUNNING,
+                        "started_at": now,
+                        "heartbeat_at": now,
+                        "attempts": models.AIJob.attempts + 1,
+                        "locked_by": WORKER_ID,
+                    },
+                    synchronize_session=False,
+                )
+            )
+            db.commit()
+            if not claimed:
+                continue
+
+            job = db.get(models.AIJob, job_id)
+            asset = job.asset
+            image_path = ai_suggestions.asset_path(asset)
+            if asset.content_hash is None and os.path.exists(image_path):
+                asset.content_hash = ai_cache.file_sha256(image_path)
+                db.commit()
+            return ClaimedJob(
+                id=job.id,
+                asset_id=asset.id,
+                project_id=asset.project_id,
+                image_path=image_path,
+                content_hash=asset.content_hash or "",
+                refresh=job.refresh,
+                attempts=job.attempts,
+                requested_by=job.requested_by,
+            )
+        return None
+    finally:
+        db.close()
+
+
+def _finish(job_id: int, **values) -> models.AIJob:
+    db = SessionLocal()
+    try:
+        job = db.get(models.AIJob, job_id)
+        for name, value in values.items():
+            setattr(job, name, value)
+        job.locked_by = None
+        db.commit()
+        db.refresh(job)
+        db.expunge(job)
+        return job
+    finally:
+        db.close()
+
+
+async def _run(claimed: ClaimedJob) -> None:
+    heartbeat = asyncio.create_task(_keep_alive(claimed.id))
+    try:
+        if not os.path.exists(claimed.image_path):
+            raise FileNotFoundError(claimed.image_path)
+        suggestions = None if claimed.refresh else await run_in_threadpool(
+            ai_suggestions.cached, claimed.content_hash
+        )
+        if suggestions is None:
+            suggestions = await ai_suggestions.generate(
+                claimed.image_path,
+                claimed.content_hash,
+                refresh=claimed.refresh,
+                context=ai_usage.CallContext(claimed.project_id, claimed.requested_by),
+            )
+    except Exception as e:
+        retry = not isinstance(e, _PERMANENT) and claimed.attempts < settings.AI_JOB_MAX_ATTEMPTS
+        logger.warning("AI job %s attempt %s failed: %r", claimed.id, claimed.attempts, e)
+        if retry:
+            delay = RETRY_BASE_SECONDS * 2 ** (claimed.attempts - 1)
+            job = await run_in_threadpool(
+                _finish,
+                claimed.id,
+                status=QUEUED,
+                error=repr(e),
+                run_after=datetime.utcnow() + timedelta(seconds=delay),
+            )
+        else:
+            job = await run_in_threadpool(
+                _finish,
+                claimed.id,
+                status=FAILED,
+                error=repr(e),
+                finished_at=datetime.utcnow(),
+            )
+    else:
+        job = await run_in_threadpool(
+            _finish,
+            claimed.id,
+            status=SUCCEEDED,
+            result=suggestions,
+            error=None,
+            finished_at=datetime.utcnow(),
+        )
+    finally:
+        heartbeat.cancel()
+
+    if job.status != QUEUED:
+        publish(
+            "ai_job_updated",
+            to_payload(schemas.AIJobOut, job),
+            project_id=claimed.project_id,
+            asset_id=claimed.asset_id,
+        )
+
+
+async def _worker() -> None:
+    while True:
+        try:
+            claimed = await run_in_threadpool(_claim)
+        except Exception:
+            logger.exception("Failed to claim an AI job")
+            claimed = None
+
+        if claimed is None:
+            try:
+                await asyncio.wait_for(_wakeup.wait(), settings.AI_JOB_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            _wakeup.clear()
+            continue
+
+        await _run(claimed)
+
+
+def _release_own_jobs() -> None:
+    db = SessionLocal()
+    try:
+        db.query(models.AIJob).filter(
+            models.AIJob.status == RUNNING,
+            models.AIJob.locked_by == WORKER_ID,
+        ).update({"status": QUEUED, "locked_by": None}, synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+
+async def start() -> None:
+    global _loop, _wakeup
+    _loop = asyncio.get_running_loop()
+    _wakeup = asyncio.Event()
+    for _ in range(settings.AI_JOB_WORKERS):
+        _tasks.append(asyncio.create_task(_worker()))
+
+
+async def stop() -> None:
+    for task in _tasks:
+        task.cancel()
+    await asyncio.gather(*_tasks, return_exceptions=True)
+    _tasks.clear()
+    # Interrupted jobs go straight back to the queue instead of timing out
+    await run_in_threadpool(_release_own_jobs)
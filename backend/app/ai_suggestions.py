@@ -0,0 +1,180 @@
+"""
+Generating AI suggestions for an asset file.
+
+Shared by the background job workers (app.ai_jobs) and anything else that
+needs suggestions for a file: prepares the image (or extracts the text of
+a document), calls the model through app.ai_client and stores the parsed
+result in the suggestion cache.
+
+Identical requests are coalesced: concurrent calls for the same content
+hash and prompt in one process share a single model call, and across
+processes a lock makes later callers wait and pick up the cached result.
+"""
+
+import os
+from typing import List
+
+from starlette.concurrency import run_in_threadpool
+
+from . import ai_cache, ai_client, ai_documents, ai_images, ai_usage, models
+from .config import settings
+from .database import SessionLocal
+from .singleflight import COALESCED, SingleFlight, cross_process_lock
+
+UPLOAD_DIR = "uploads"
+
+AI_MODEL = "gpt-4o-mini"
+# Bump whenever PROMPT or DOCUMENT_PROMPT changes so cached suggestions are regenerated
+PROMPT_VERSION = "2"
+PROMPT = (
+    "You are a design review assistant helping a team give feedback on a document. "
+    "Analyze the attached image and return 3–7 short, concrete suggestions on how to "
+    "improve it for UI/UX, visual clarity, or presentation. "
+    "Be specific (e.g., 'increase padding around buttons', 'align text with grid', "
+    "'brighten background slightly'), and assume a generic web/app context. If the file is not an image and is a word document or pdf or excel sheet,"
+    " provide suggestions for improving the document's layout, formatting, or content clarity."
+)
+DOCUMENT_PROMPT = (
+    "You are a design review assistant helping a team give feedback on a document. "
+    "Below is the text extracted from it, with layout hints (headings are marked with #, "
+    "list items with -, table rows with |). Return 3–7 short, concrete suggestions on how "
+    "to improve its structure, formatting, or content clarity. Be specific (e.g., 'split "
+    "the long intro into two paragraphs', 'add a header row to the pricing table')."
+)
+
+
+def asset_path(asset: models.Asset) -> str:
+    return os.path.join(UPLOAD_DIR, asset.file_path)
+
+
+def cache_key_for(content_hash: str) -> ai_cache.CacheKey:
+    return ai_cache.CacheKey(content_hash, AI_MODEL, PROMPT_VERSION)
+
+
+def parse_suggestions(text: str) -> List[str]:
+    # Turn the model output into a clean list of suggestions
+    lines = [line.strip() for line in text.split("\n") if line.strip()]
+    suggestions: List[str] = []
+    for line in lines:
+        # Strip leading bullets / numbering
+        cleaned = line.lstrip("-•").strip()
+        # Remove leading "1.", "2)" etc.
+        if cleaned[:2].isdigit():
+            cleaned = cleaned[2:].lstrip("). ").strip()
+        suggestions.append(cleaned)
+
+    if not suggestions:
+        # Fallback if parsing fails
+        if text.strip():
+            suggestions = [text.strip()]
+        else:
+            suggestions = [
+                "Increase brightness and contrast for better visibility.",
+                "Crop slightly to center the main subject.",
+                "Reduce background distractions to keep focus on the subject.",
+            ]
+    return suggestions
+
+
+_flights = SingleFlight("ai_suggestions")
+
+
+def cached(content_hash: str) -> List[str] | None:
+    db = SessionLocal()
+    try:
+        return ai_cache.lookup(db, cache_key_for(content_hash))
+    finally:
+        db.close()
+
+
+def _store(key: ai_cache.CacheKey, suggestions: List[str]) -> None:
+    db = SessionLocal()
+    try:
+        ai_cache.store(db, key, suggestions)
+    finally:
+        db.close()
+
+
+async def generate(
+    image_path: str,
+    content_hash: str,
+    refresh: bool = False,
+    context: ai_usage.CallContext | None = None,
+) -> List[str]:
+    """
+    Ask the model for suggestions on the file and cache them. OpenAI,
+    AIBusyError and AIBudgetExceededError exceptions propagate to the
+    caller. Unless `refresh` is set, a result another process produced
+    meanwhile is returned instead. Tokens are charged to `context` (a
+    coalesced call only to the caller that made it).
+    """
+    key = cache_key_for(content_hash)
+    return await _flights.do(
+        (key, refresh),
+        lambda: _generate_once(image_path, key, refresh, context),
+    )
+
+
+async def _generate_once(
+    image_path: str,
+    key: ai_cache.CacheKey,
+    refresh: bool,
+    context: ai_usage.CallContext | None,
+) -> List[str]:
+    # Long enough to cover the other holder's call, retries included
+    lock_timeout = settings.AI_TIMEOUT_SECONDS * (settings.AI_MAX_RETRIES + 1)
+    async with cross_process_lock(f"ai-suggestions:{'/'.join(key)}", lock_timeout) as waited:
+        if waited and not refresh:
+            suggestions = await run_in_threadpool(cached, key.content_hash)
+            if suggestions is not None:
+                COALESCED.inc(name="ai_suggestions", role="coalesced_remote")
+                return suggestions
+        return await _call_model(image_path, key, context)
+
+
+async def _user_content(image_path: str, content_hash: str) -> list[dict]:
+    # Documents go as extracted text; a vision model cannot read raw PDF/Office bytes
+    document = await run_in_threadpool(ai_documents.extract_document, image_path, content_hash)
+    if document is not None:
+        return [
+            {"type": "text", "text": DOCUMENT_PROMPT},
+            {"type": "text", "text": document.as_prompt()},
+        ]
+
+    image = await run_in_threadpool(ai_images.prepare_image, image_path, content_hash)
+    return [
+        {"type": "text", "text": PROMPT},
+        {
+            "type": "image_url",
+            "image_url": {"url": image.data_url},
+        },
+    ]
+
+
+async def _call_model(
+    image_path: str,
+    key: ai_cache.CacheKey,
+    context: ai_usage.CallContext | None,
+) -> List[str]:
+    if context is not None:
+        await run_in_threadpool(ai_usage.budgets.check, context)
+    content = await _user_content(image_path, key.content_hash)
+
+    text = await ai_client.chat(
+        context=context,
+        model=AI_MODEL,
+        messages=[
+            {
+                "role": "system",
+                "content": "You provide concise, actionable design feedback.",
+            },
+            {"role": "user", "content": content},
+        ],
+        temperature=0.4,
+    )
+
+    suggestions = parse_suggestions(text)
+    # Only cache what the model actually said, not the canned fallback
+    if text.strip():
+        await run_in_threadpool(_store, key, suggestions)
+    return suggestions
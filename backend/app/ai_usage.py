@@ -0,0 +1,290 @@
+"""
+AI call instrumentation and token budgets.
+
+Every model call made through app.ai_client is recorded here: request
+bytes, prompt/completion tokens, estimated cost, latency and outcome
+(error class) become metrics at GET /health/metrics plus one log line.
+Calls made on behalf of a project/user (a `CallContext`) are also charged
+against daily token budgets:
+
+- AI_PROJECT_DAILY_TOKENS per project and AI_USER_DAILY_TOKENS per user
+  (0 = unlimited), per UTC day,
+- checked with in-memory counters, so the hot path never waits on the DB;
+  a call is allowed while usage is below the limit (one call can overrun),
+- persisted to `ai_token_usage` every AI_USAGE_FLUSH_SECONDS (and at
+  shutdown). A flush also re-reads the totals, so usage from other
+  processes is picked up within one interval.
+"""
+
+import asyncio
+import logging
+import threading
+from dataclasses import dataclass
+from datetime import date, datetime
+from typing import NamedTuple
+
+from sqlalchemy.exc import IntegrityError
+
+from . import metrics, models
+from .config import settings
+from .database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+REQUESTS = metrics.counter(
+    "ai_requests_total",
+    "Model call attempts by model and outcome (ok or the error class).",
+)
+REQUEST_BYTES = metrics.histogram(
+    "ai_request_bytes",
+    "Size of the messages sent per model call attempt.",
+    [1_000, 10_000, 100_000, 500_000, 1_000_000, 5_000_000, 20_000_000],
+)
+TOKENS = metrics.counter(
+    "ai_tokens_total",
+    "Tokens reported by the model, by model and kind (prompt|completion).",
+)
+COST = metrics.counter(
+    "ai_cost_usd_total",
+    "Estimated spend from token usage and AI_*_PRICE_PER_MTOK, by model.",
+)
+LATENCY = metrics.histogram(
+    "ai_model_latency_seconds",
+    "Model call attempt latency (excluding queueing and backoff), by model and outcome.",
+    [0.25, 0.5, 1, 2, 5, 10, 20, 40, 60],
+)
+BUDGET_REJECTIONS = metrics.counter(
+    "ai_budget_rejections_total",
+    "Model calls refused because a token budget was used up, by scope (project|user).",
+)
+
+
+@dataclass(frozen=True)
+class CallContext:
+    """Who a model call is made for; None ids are not charged."""
+
+    project_id: int | None = None
+    user_id: int | None = None
+
+
+class AIBudgetExceededError(Exception):
+    """The project's or user's daily token budget is used up."""
+
+    def __init__(self, scope: str, limit: int) -> None:
+        super().__init__(f"Daily AI token budget of this {scope} ({limit} tokens) is used up.")
+        self.scope = scope
+        self.limit = limit
+
+
+class _Key(NamedTuple):
+    scope: str
+    scope_id: int
+    day: date
+
+
+def _limit(scope: str) -> int:
+    return settings.AI_PROJECT_DAILY_TOKENS if scope == "project" else settings.AI_USER_DAILY_TOKENS
+
+
+def _scopes(context: CallContext) -> list[tuple[str, int]]:
+    scopes = []
+    if context.project_id is not None:
+        scopes.append(("project", context.project_id))
+    if context.user_id is not None:
+        scopes.append(("user", context.user_id))
+    return scopes
+
+
+def today() -> date:
+    return datetime.utcnow().date()
+
+
+class TokenBudgets:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        # Totals as last read from the DB, and usage not yet written there
+        self._persisted: dict[_Key, int] = {}
+        self._pending: dict[_Key, list[int]] = {}  # [prompt, completion, requests]
+
+    def _load(self, keys: list[_Key]) -> None:
+        groups: dict[tuple[str, date], list[int]] = {}
+        for key in keys:
+            groups.setdefault((key.scope, key.day), []).append(key.scope_id)
+        totals = dict.fromkeys(keys, 0)
+        db = SessionLocal()
+        try:
+            for (scope, day), scope_ids in groups.items():
+                rows = db.query(
+                    models.AITokenUsage.scope_id,
+                    models.AITokenUsage.prompt_tokens + models.AITokenUsage.completion_tokens,
+                ).filter(
+                    models.AITokenUsage.scope == scope,
+                    models.AITokenUsage.day == day,
+                    models.AITokenUsage.scope_id.in_(scope_ids),
+                )
+                for scope_id, tokens in rows:
+                    totals[_Key(scope, scope_id, day)] = tokens
+        finally:
+            db.close()
+        with self._lock:
+            self._persisted.update(totals)
+
+    def used(self, scope: str, scope_id: int) -> int:
+        """Tokens used today. Blocking on first use of a key (DB read)."""
+        key = _Key(scope, scope_id, today())
+        with self._lock:
+            known = key in self._persisted
+        if not known:
+            self._load([key])
+        with self._lock:
+            pending = self._pending.get(key)
+            return self._persisted[key] + (pending[0] + pending[1] if pending else 0)
+
+    def check(self, context: CallContext) -> None:
+        """
+        Raise AIBudgetExceededError if a budget of the context is used up.
+        Blocking on first use of a key; call from a thread.
+        """
+        for scope, scope_id in _scopes(context):
+            limit = _limit(scope)
+            if limit > 0 and self.used(scope, scope_id) >= limit:
+                BUDGET_REJECTIONS.inc(scope=scope)
+                raise AIBudgetExceededError(scope, limit)
+
+    def record(self, context: CallContext, prompt_tokens: int, completion_tokens: int) -> None:
+        """Memory only; safe to call from the event loop."""
+        day = today()
+        with self._lock:
+            for scope, scope_id in _scopes(context):
+                pending = self._pending.setdefault(_Key(scope, scope_id, day), [0, 0, 0])
+                pending[0] += prompt_tokens
+                pending[1] += completion_tokens
+                pending[2] += 1
+
+    def flush(self) -> None:
+        """
+        Write pending usage to the DB, then re-read today's totals of every
+        cached key, so usage recorded by other workers counts here too.
+        Blocking.
+        """
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            day = today()
+            # Yesterday's totals are no longer needed for checks
+            for key in [k for k in self._persisted if k.day < day]:
+                del self._persisted[key]
+
+        if pending:
+            db = SessionLocal()
+            # Each key commits on its own
+            written: set[_Key] = set()
+            try:
+                for key, (prompt, completion, requests) in pending.items():
+                    self._add(db, key, prompt, completion, requests)
+                    written.add(key)
+            except Exception:
+                # Put back what did not make it so the next flush retries
+                with self._lock:
+                    for key, values in pending.items():
+                        if key in written:
+                            continue
+                        merged = self._pending.setdefault(key, [0, 0, 0])
+                        for i, value in enumerate(values):
+                            merged[i] += value
+                raise
+            finally:
+                db.close()
+
+        with self._lock:
+            keys = set(self._persisted)
+        keys.update(key for key in pending if key.day >= day)
+        if keys:
+            self._load(list(keys))
+
+    @staticmethod
+    def _add(db, key: _Key, prompt: int, completion: int, requests: int) -> None:
+        filters = (
+            models.AITokenUsage.scope == key.scope,
+            models.AITokenUsage.scope_id == key.scope_id,
+            models.AITokenUsage.day == key.day,
+        )
+        values = {
+            "prompt_tokens": models.AITokenUsage.prompt_tokens + prompt,
+            "completion_tokens": models.AITokenUsage.completion_tokens + completion,
+            "requests": models.AITokenUsage.requests + requests,
+        }
+        updated = db.query(models.AITokenUsage).filter(*filters).update(
+            values, synchronize_session=False
+        )
+        if not updated:
+            db.add(
+                models.AITokenUsage(
+                    **key._asdict(),
+                    prompt_tokens=prompt,
+                    completion_tokens=completion,
+                    requests=requests,
+                )
+            )
+        try:
+            db.commit()
+        except IntegrityError:
+            # Another process inserted the row first; add to theirs
+            db.rollback()
+            db.query(models.AITokenUsage).filter(*filters).update(
+                values, synchronize_session=False
+            )
+            db.commit()
+
+
+budgets = TokenBudgets()
+
+
+def observe_call(
+    model: str,
+    context: CallContext | None,
+    request_bytes: int,
+    latency: float,
+    error: BaseException | None = None,
+    prompt_tokens: int = 0,
+    completion_tokens: int = 0,
+) -> None:
+    """Metrics + log line for one model call attempt; charges budgets on success."""
+    outcome = "ok" if error is None else type(error).__name__
+    REQUESTS.inc(model=model, outcome=outcome)
+    REQUEST_BYTES.observe(request_bytes)
+    LATENCY.observe(latency, model=model, outcome=outcome)
+    if error is None:
+        TOKENS.inc(prompt_tokens, model=model, kind="prompt")
+        TOKENS.inc(completion_tokens, model=model, kind="completion")
+        COST.inc(
+            (
+                prompt_tokens * settings.AI_PROMPT_PRICE_PER_MTOK
+                + completion_tokens * settings.AI_COMPLETION_PRICE_PER_MTOK
+            )
+            / 1_000_000,
+            model=model,
+        )
+        if context is not None:
+            budgets.record(context, prompt_tokens, completion_tokens)
+
+    logger.info(
+        "AI call model=%s project=%s user=%s bytes=%d prompt_tokens=%d "
+        "completion_tokens=%d latency_ms=%.0f outcome=%s",
+        model,
+        context.project_id if context else None,
+        context.user_id if context else None,
+        request_bytes,
+        prompt_tokens,
+        completion_tokens,
+        latency * 1000,
+        outcome,
+    )
+
+
+async def run_flush_loop() -> None:
+    while True:
+        await asyncio.sleep(settings.AI_USAGE_FLUSH_SECONDS)
+        try:
+            await asyncio.to_thread(budgets.flush)
+        except Exception:
+            logger.exception("Failed to persist AI token usage")
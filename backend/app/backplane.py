@@ -0,0 +1,443 @@
+"""
+Pub/sub backplane for real-time events.
+
+Every worker publishes an event exactly once to the backplane and every
+worker (including the one that published it) receives it back and hands it
+to its local WebSocket hub. Pick the implementation with REALTIME_BACKPLANE:
+
+- "memory":   in-process only; single worker and tests (default)
+- "unix":     tiny line-based broker over a Unix socket; single node, many
+              workers. Start it with `python -m app.backplane broker`.
+- "postgres": LISTEN/NOTIFY on the main database; multi-node.
+"""
+
+import asyncio
+import base64
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import zlib
+from collections import deque
+from typing import Any, Callable
+
+from sqlalchemy.engine import make_url
+
+from . import metrics
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+Deliver = Callable[[dict[str, Any]], None]
+
+BACKPLANE_DROPPED = metrics.counter(
+    "realtime_backplane_dropped_total",
+    "Events never sent to the backplane (reason=overflow|error|stopped).",
+)
+
+
+class Backplane:
+    """
+    Base class. `publish` may be called from any thread; `deliver` is
+    always invoked on the event loop passed to `start`.
+    """
+
+    async def start(self, deliver: Deliver) -> None:
+        raise NotImplementedError
+
+    async def stop(self) -> None:
+        pass
+
+    def publish(self, message: dict[str, Any]) -> None:
+        raise NotImplementedError
+
+
+class MemoryBackplane(Backplane):
+    def __init__(self) -> None:
+        self._deliver: Deliver | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+    async def start(self, deliver: Deliver) -> None:
+        self._deliver = deliver
+        self._loop = asyncio.get_running_loop()
+
+    async def stop(self) -> None:
+        self._deliver = None
+
+    def publish(self, message: dict[str, Any]) -> None:
+        if self._deliver is None:
+            return
+        _call_on_loop(self._loop, self._deliver, message)
+
+
+class UnixSocketBackplane(Backplane):
+    """
+    Client side of the Unix-socket broker. Messages are newline-delimited JSON.
+    """
+
+    RECONNECT_DELAY = 0.5
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._deliver: Deliver | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._writer: asyncio.StreamWriter | None = None
+        self._connected = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    async def start(self, deliver: Deliver) -> None:
+        self._deliver = deliver
+        self._loop = asyncio.get_running_loop()
+        self._task = asyncio.create_task(self._run())
+        try:
+            await asyncio.wait_for(self._connected.wait(), timeout=5)
+        except asyncio.TimeoutError:
+            logger.warning("Backplane broker at %s not reachable yet", self.path)
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+        if self._writer:
+            self._writer.close()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                reader, writer = await asyncio.open_unix_connection(self.path)
+            except OSError:
+                await asyncio.sleep(self.RECONNECT_DELAY)
+                continue
+
+            self._writer = writer
+            self._connected.set()
+            try:
+                while line := await reader.readline():
+                    try:
+                        message = json.loads(line)
+                    except ValueError:
+                        continue
+                    self._deliver(message)
+            except (OSError, asyncio.IncompleteReadError):
+                pass
+            finally:
+                self._writer = None
+                self._connected.clear()
+            await asyncio.sleep(self.RECONNECT_DELAY)
+
+    def _write(self, line: bytes) -> None:
+        if self._writer is None:
+            logger.warning("Backplane broker disconnected, dropping event")
+            return
+        self._writer.write(line)
+
+    def publish(self, message: dict[str, Any]) -> None:
+        line = json.dumps(message, separators=(",", ":")).encode() + b"\n"
+        _call_on_loop(self._loop, self._write, line)
+
+
+class PostgresBackplane(Backplane):
+    """
+    LISTEN/NOTIFY on dedicated autocommit connections. NOTIFY payloads are
+    capped at 8000 bytes, so bigger events are zlib-compressed first.
+
+    `publish` never touches the database: it appends to a bounded outbox
+    (REALTIME_PUBLISH_QUEUE, oldest dropped first) that one sender thread
+    drains, several NOTIFYs per round trip. Callers on the event loop are
+    not held up by a slow or unreachable database.
+
+    Both connections survive database restarts: a lost LISTEN connection is
+    re-opened with backoff (events published meanwhile by other workers are
+    missed, and the gap is logged), a lost NOTIFY connection is re-opened by
+    the sender, which keeps the outbox meanwhile. TCP keepalives make a
+    silently dropped connection show up as an error instead of a listener
+    that never hears anything.
+    """
+
+    CHANNEL = "flowsync_events"
+    MAX_PAYLOAD = 7900
+    NOTIFY_BATCH = 100
+    RECONNECT_DELAY = 0.5
+    MAX_RECONNECT_DELAY = 30.0
+
+    def __init__(self, dsn: str) -> None:
+        self.dsn = dsn
+        self._deliver: Deliver | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._listen_conn = None
+        self._listen_fd = -1
+        self._listen_task: asyncio.Task | None = None
+        # Only the sender thread uses the NOTIFY connection
+        self._notify_conn = None
+        self._outbox: deque[str] = deque()
+        self._outbox_cond = threading.Condition()
+        self._sender: threading.Thread | None = None
+        self._stopped = False
+
+    def _connect(self):
+        import psycopg2
+        from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+
+        conn = psycopg2.connect(
+            self.dsn,
+            connect_timeout=5,
+            keepalives=1,
+            keepalives_idle=30,
+            keepalives_interval=10,
+            keepalives_count=3,
+        )
+        conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+        return conn
+
+    @staticmethod
+    def _connection_errors() -> tuple[type[Exception], ...]:
+        import psycopg2
+
+        return (psycopg2.OperationalError, psycopg2.InterfaceError)
+
+    def _open_listen_conn(self):
+        conn = self._connect()
+        try:
+            with conn.cursor() as cur:
+                cur.execute(f"LISTEN {self.CHANNEL}")
+        except BaseException:
+            conn.close()
+            raise
+        return conn
+
+    def _adopt_listen_conn(self, conn) -> None:
+        # Remember the fd: fileno() fails once the connection is dead
+        self._listen_conn = conn
+        self._listen_fd = conn.fileno()
+        self._loop.add_reader(self._listen_fd, self._on_readable)
+
+    def _close_listen_conn(self) -> None:
+        conn, self._listen_conn = self._listen_conn, None
+        if conn is not None:
+            self._loop.remove_reader(self._listen_fd)
+            conn.close()
+
+    async def start(self, deliver: Deliver) -> None:
+        self._deliver = deliver
+        self._loop = asyncio.get_running_loop()
+        self._stopped = False
+        self._adopt_listen_conn(await asyncio.to_thread(self._open_listen_conn))
+        self._sender = threading.Thread(
+            target=self._send_loop, name="backplane-notify", daemon=True
+        )
+        self._sender.start()
+
+    async def stop(self) -> None:
+        with self._outbox_cond:
+            self._stopped = True
+            self._outbox_cond.notify_all()
+        if self._listen_task is not None:
+            self._listen_task.cancel()
+        self._close_listen_conn()
+        if self._sender is not None:
+            # Gives queued events a moment to go out
+            await asyncio.to_thread(self._sender.join, 5)
+            self._sender = None
+
+    async def _relisten(self) -> None:
+        lost_at = time.monotonic()
+        delay = self.RECONNECT_DELAY
+        while not self._stopped:
+            await asyncio.sleep(delay)
+            try:
+                conn = await asyncio.to_thread(self._open_listen_conn)
+            except self._connection_errors() as e:
+                logger.debug("Backplane LISTEN reconnect failed: %r", e)
+                delay = min(delay * 2, self.MAX_RECONNECT_DELAY)
+                continue
+            if self._stopped:
+                conn.close()
+                return
+            self._adopt_listen_conn(conn)
+            logger.warning(
+                "Backplane LISTEN reconnected; events from other workers in the "
+                "last %.1fs were missed",
+                time.monotonic() - lost_at,
+            )
+            return
+
+    def _on_readable(self) -> None:
+        conn = self._listen_conn
+        if conn is None:
+            return
+        try:
+            conn.poll()
+        except self._connection_errors() as e:
+            self._close_listen_conn()
+            logger.warning("Backplane LISTEN connection lost (%r); reconnecting", e)
+            if not self._stopped and (self._listen_task is None or self._listen_task.done()):
+                self._listen_task = self._loop.create_task(self._relisten())
+            return
+        while conn.notifies:
+            notify = conn.notifies.pop(0)
+            try:
+                self._deliver(self._decode(notify.payload))
+            except ValueError:
+                logger.warning("Ignoring malformed backplane payload")
+
+    @staticmethod
+    def _encode(message: dict[str, Any]) -> str:
+        raw = json.dumps(message, separators=(",", ":"))
+        if len(raw.encode()) <= PostgresBackplane.MAX_PAYLOAD:
+            return raw
+        packed = base64.b64encode(zlib.compress(raw.encode())).decode()
+        return "z:" + packed
+
+    @staticmethod
+    def _decode(payload: str) -> dict[str, Any]:
+        if payload.startswith("z:"):
+            payload = zlib.decompress(base64.b64decode(payload[2:])).decode()
+        return json.loads(payload)
+
+    def _notify(self, payloads: list[str]) -> None:
+        # Sender thread only
+        if self._notify_conn is None:
+            self._notify_conn = self._connect()
+            logger.info("Backplane NOTIFY connection opened")
+        params: list[str] = []
+        for payload in payloads:
+            params += [self.CHANNEL, payload]
+        try:
+            with self._notify_conn.cursor() as cur:
+                cur.execute("; ".join(["SELECT pg_notify(%s, %s)"] * len(payloads)), params)
+        except self._connection_errors():
+            self._notify_conn.close()
+            self._notify_conn = None
+            raise
+
+    def _send_loop(self) -> None:
+        failures = 0
+        try:
+            while True:
+                with self._outbox_cond:
+                    while not self._outbox and not self._stopped:
+                        self._outbox_cond.wait()
+                    if not self._outbox:
+                        return
+                    batch = [
+                        self._outbox.popleft()
+                        for _ in range(min(len(self._outbox), self.NOTIFY_BATCH))
+                    ]
+                try:
+                    self._notify(batch)
+                except self._connection_errors() as e:
+                    failures += 1
+                    if self._stopped:
+                        BACKPLANE_DROPPED.inc(len(batch), reason="stopped")
+                        return
+                    # Keep the events; retry at once (the connection may just
+                    # have gone stale), then back off
+                    delay = 0.0 if failures == 1 else min(
+                        self.RECONNECT_DELAY * 2 ** (failures - 2), self.MAX_RECONNECT_DELAY
+                    )
+                    logger.warning("Backplane NOTIFY failed (%r), retrying in %.1fs", e, delay)
+                    with self._outbox_cond:
+                        self._outbox.extendleft(reversed(batch))
+                        self._trim()
+                        if delay:
+                            self._outbox_cond.wait(delay)
+                    continue
+                except Exception:
+                    BACKPLANE_DROPPED.inc(len(batch), reason="error")
+                    logger.exception("Backplane NOTIFY failed; %d events dropped", len(batch))
+                if failures:
+                    logger.warning("Backplane NOTIFY connection re-opened")
+                    failures = 0
+        finally:
+            if self._notify_conn is not None:
+                self._notify_conn.close()
+                self._notify_conn = None
+
+    def _trim(self) -> None:
+        # Caller holds _outbox_cond
+        overflow = len(self._outbox) - settings.REALTIME_PUBLISH_QUEUE
+        if overflow > 0:
+            for _ in range(overflow):
+                self._outbox.popleft()
+            BACKPLANE_DROPPED.inc(overflow, reason="overflow")
+            logger.warning("Backplane outbox full, %d oldest events dropped", overflow)
+
+    def publish(self, message: dict[str, Any]) -> None:
+        if self._stopped or self._loop is None:
+            return
+        payload = self._encode(message)
+        if len(payload) > self.MAX_PAYLOAD:
+            logger.warning("Event too large for NOTIFY (%d bytes), dropped", len(payload))
+            return
+        with self._outbox_cond:
+            self._outbox.append(payload)
+            self._trim()
+            self._outbox_cond.notify()
+
+
+def _call_on_loop(loop: asyncio.AbstractEventLoop | None, fn: Callable, *args: Any) -> None:
+    if loop is None or loop.is_closed():
+        return
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    if running is loop:
+        fn(*args)
+    else:
+        loop.call_soon_threadsafe(fn, *args)
+
+
+def create_backplane(kind: str | None = None) -> Backplane:
+    kind = (kind or settings.REALTIME_BACKPLANE).lower()
+    if kind == "memory":
+        return MemoryBackplane()
+    if kind == "unix":
+        return UnixSocketBackplane(settings.REALTIME_UNIX_SOCKET)
+    if kind == "postgres":
+        # psycopg2 wants a plain libpq URL, not "postgresql+psycopg2://"
+        url = make_url(settings.DATABASE_URL).set(drivername="postgresql")
+        return PostgresBackplane(url.render_as_string(hide_password=False))
+    raise ValueError(f"Unknown REALTIME_BACKPLANE: {kind!r}")
+
+
+# ---------- Unix-socket broker ----------
+
+
+async def run_broker(path: str) -> None:
+    """
+    Relay every line received from any worker to all connected workers.
+    """
+    clients: set[asyncio.StreamWriter] = set()
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        clients.add(writer)
+        try:
+            while line := await reader.readline():
+                for client in list(clients):
+                    try:
+                        client.write(line)
+                    except (OSError, RuntimeError):
+                        clients.discard(client)
+        except (OSError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            clients.discard(writer)
+            writer.close()
+
+    if os.path.exists(path):
+        os.remove(path)
+    server = await asyncio.start_unix_server(handle, path=path)
+    logger.info("Backplane broker listening on %s", path)
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "broker":
+        print("usage: python -m app.backplane broker [socket_path]")
+        sys.exit(2)
+    logging.basicConfig(level=logging.INFO)
+    socket_path = sys.argv[2] if len(sys.argv) > 2 else settings.REALTIME_UNIX_SOCKET
+    asyncio.run(run_broker(socket_path))
@@ -0,0 +1,184 @@
+"""
+Spatial index for comment regions (pins and rectangles on image assets).
+
+Regions live in `comment_regions` (normalized 0..1 coordinates, a point has
+width = height = 0). Viewport queries ("every pin inside this rectangle of
+this asset") must not scan all pins of a board, so:
+
+- SQLite: an R*Tree virtual table `comment_regions_rtree` over
+  (asset_id, x, y) boxes, kept in sync with `comment_regions` by triggers,
+  so bulk deletes and ORM cascades need no extra code. The asset is a
+  degenerate third dimension, which keeps one tree for all assets; it is
+  also stored exactly in an auxiliary column, since tree coordinates are
+  32-bit floats.
+- Postgres (no PostGIS needed): a GiST expression index on the built-in
+  `box` type, queried with the overlap operator `&&`. The asset is folded
+  into the y axis (asset k occupies y in [2k, 2k + 1], so bands of
+  different assets never touch), which keeps one small tree lookup per
+  viewport instead of filtering every overlapping box of every asset.
+- Anything else, or SQLite without the R*Tree module: the btree on
+  (asset_id, x).
+
+R*Tree coordinates are rounded outwards, and folded GiST coordinates lose
+precision for large asset ids, so hits of both are re-checked against the
+exact columns.
+"""
+
+import logging
+
+from sqlalchemy import Column, Float, Integer, MetaData, Table, and_, func, literal_column, select, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Query
+
+from . import models
+
+logger = logging.getLogger(__name__)
+
+RTREE_TABLE = "comment_regions_rtree"
+
+_rtree = Table(
+    RTREE_TABLE,
+    MetaData(),
+    Column("id", Integer, primary_key=True),
+    Column("min_asset", Float),
+    Column("max_asset", Float),
+    Column("min_x", Float),
+    Column("max_x", Float),
+    Column("min_y", Float),
+    Column("max_y", Float),
+    Column("asset_id", Integer),
+)
+
+# Set by ensure_spatial_index at startup: "rtree", "gist" or "btree"
+_strategy = "btree"
+
+_RTREE_TRIGGERS = {
+    "comment_regions_rtree_ai": (
+        "AFTER INSERT ON comment_regions BEGIN "
+        f"INSERT INTO {RTREE_TABLE} VALUES ("
+        "new.id, new.asset_id, new.asset_id, "
+        "new.x, new.x + new.width, new.y, new.y + new.height, new.asset_id); END"
+    ),
+    "comment_regions_rtree_au": (
+        "AFTER UPDATE ON comment_regions BEGIN "
+        f"UPDATE {RTREE_TABLE} SET "
+        "min_asset = new.asset_id, max_asset = new.asset_id, "
+        "min_x = new.x, max_x = new.x + new.width, "
+        "min_y = new.y, max_y = new.y + new.height, asset_id = new.asset_id "
+        "WHERE id = old.id; END"
+    ),
+    "comment_regions_rtree_ad": (
+        f"AFTER DELETE ON comment_regions BEGIN DELETE FROM {RTREE_TABLE} WHERE id = old.id; END"
+    ),
+}
+
+# Height of one asset's band on the folded y axis; regions span at most 1
+ASSET_STRIDE = 2
+# Folded viewports are widened by this much to make up for float rounding
+GIST_SLACK = 1e-6
+
+_GIST_INDEX = (
+    "CREATE INDEX IF NOT EXISTS ix_comment_regions_asset_box ON comment_regions "
+    f"USING gist (box(point(x, asset_id * {ASSET_STRIDE} + y), "
+    f"point(x + width, asset_id * {ASSET_STRIDE} + y + height)))"
+)
+# Superseded by the index above (no asset in the key)
+_OLD_GIST_INDEX = "DROP INDEX IF EXISTS ix_comment_regions_box"
+
+
+def _ensure_rtree(engine: Engine) -> bool:
+    with engine.begin() as conn:
+        exists = conn.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+            {"name": RTREE_TABLE},
+        ).first()
+        if exists is None:
+            try:
+                conn.execute(
+                    text(
+                        f"CREATE VIRTUAL TABLE {RTREE_TABLE} USING rtree("
+                        "id, min_asset, max_asset, min_x, max_x, min_y, max_y, +asset_id)"
+                    )
+                )
+            except Exception:
+                # SQLite built without SQLITE_ENABLE_RTREE
+                logger.warning("SQLite has no R*Tree module; comment regions use a btree index")
+                return False
+            # Regions written before the tree existed
+            conn.execute(
+                text(
+                    f"INSERT INTO {RTREE_TABLE} "
+                    "SELECT id, asset_id, asset_id, x, x + width, y, y + height, asset_id "
+                    "FROM comment_regions"
+                )
+            )
+        for name, body in _RTREE_TRIGGERS.items():
+            conn.execute(text(f"CREATE TRIGGER IF NOT EXISTS {name} {body}"))
+    return True
+
+
+def ensure_spatial_index(engine: Engine) -> str:
+    """
+    Create the spatial index for the database in use (idempotent) and
+    remember which one viewport queries should use. Runs at startup.
+    """
+    global _strategy
+    if engine.dialect.name == "sqlite":
+        _strategy = "rtree" if _ensure_rtree(engine) else "btree"
+    elif engine.dialect.name == "postgresql":
+        with engine.begin() as conn:
+            conn.execute(text(_GIST_INDEX))
+            conn.execute(text(_OLD_GIST_INDEX))
+        _strategy = "gist"
+    else:
+        _strategy = "btree"
+    return _strategy
+
+
+def in_viewport(
+    query: Query,
+    asset_id: int,
+    x0: float,
+    y0: float,
+    x1: float,
+    y1: float,
+) -> Query:
+    """
+    Restrict a query over Comment to comments whose region of asset
+    `asset_id` touches the rectangle (x0, y0)-(x1, y1), edges included.
+    """
+    region = models.CommentRegion
+    in_view = and_(
+        region.x <= x1,
+        region.x + region.width >= x0,
+        region.y <= y1,
+        region.y + region.height >= y0,
+    )
+    exact = and_(region.asset_id == asset_id, in_view)
+    if _strategy == "rtree":
+        hits = select(_rtree.c.id).where(
+            _rtree.c.min_asset <= asset_id,
+            _rtree.c.max_asset >= asset_id,
+            _rtree.c.min_x <= x1,
+            _rtree.c.max_x >= x0,
+            _rtree.c.min_y <= y1,
+            _rtree.c.max_y >= y0,
+            _rtree.c.asset_id == asset_id,
+        )
+        # No asset_id test out here: SQLite would then walk the btree
+        # instead of looking up the tree's hits by rowid
+        exact = and_(region.id.in_(hits), in_view)
+    elif _strategy == "gist":
+        # Same expression as the index, or the planner will not use it
+        band = region.asset_id * literal_column(str(ASSET_STRIDE))
+        box = func.box(
+            func.point(region.x, band + region.y),
+            func.point(region.x + region.width, band + region.y + region.height),
+        )
+        offset = asset_id * ASSET_STRIDE
+        viewport = func.box(
+            func.point(x0 - GIST_SLACK, offset + y0 - GIST_SLACK),
+            func.point(x1 + GIST_SLACK, offset + y1 + GIST_SLACK),
+        )
+        exact = and_(box.op("&&")(viewport), exact)
+    return query.join(region, region.comment_id == models.Comment.id).filter(exact)
@@ -8,6 +8,9 @@ class Settings:
     PROJECT_NAME: str = "FlowSync API"
 
     DATABASE_URL: str = os.getenv("DATABASE_URL", "sqlite:///./flowsync.db")
+    # Postgres: connections reserved for cross-process advisory locks (held
+    # for as long as the locked work runs, so kept out of the main pool)
+    LOCK_POOL_SIZE: int = int(os.getenv("LOCK_POOL_SIZE", "4"))
 
     JWT_SECRET: str = os.getenv("JWT_SECRET", "dev-secret")
     JWT_ALGORITHM: str = os.getenv("JWT_ALGORITHM", "HS256")
@@ -18,10 +21,119 @@ class Settings:
     GOOGLE_REDIRECT_URI: str = os.getenv("GOOGLE_REDIRECT_URI", "")
     FRONTEND_URL: str = os.getenv("FRONTEND_URL", "http://localhost:5173")
 
+    # ---------- Real-time ----------
+    # "memory" (single worker), "unix" (local broker) or "postgres" (LISTEN/NOTIFY)
+    REALTIME_BACKPLANE: str = os.getenv("REALTIME_BACKPLANE", "memory")
+    REALTIME_UNIX_SOCKET: str = os.getenv(
+        "REALTIME_UNIX_SOCKET", "/tmp/flowsync-events.sock"
+    )
+    # Postgres backplane: events waiting to be sent (oldest dropped beyond this)
+    REALTIME_PUBLISH_QUEUE: int = int(os.getenv("REALTIME_PUBLISH_QUEUE", "10000"))
+
+    # Per-socket delivery: micro-batch window, send queue bound, send stall limit
+    REALTIME_BATCH_MS: int = int(os.getenv("REALTIME_BATCH_MS", "50"))
+    REALTIME_MAX_QUEUE: int = int(os.getenv("REALTIME_MAX_QUEUE", "256"))
+    REALTIME_SEND_TIMEOUT_SECONDS: float = float(
+        os.getenv("REALTIME_SEND_TIMEOUT_SECONDS", "5")
+    )
+
+    # Viewers drop out of presence after this long without a heartbeat
+    PRESENCE_TTL_SECONDS: float = float(os.getenv("PRESENCE_TTL_SECONDS", "30"))
+    PRESENCE_TICK_SECONDS: float = float(os.getenv("PRESENCE_TICK_SECONDS", "1"))
+
+    # Activity rows are written behind, in batches
+    ACTIVITY_FLUSH_MS: int = int(os.getenv("ACTIVITY_FLUSH_MS", "250"))
+    ACTIVITY_FLUSH_SIZE: int = int(os.getenv("ACTIVITY_FLUSH_SIZE", "200"))
+    ACTIVITY_BUS_SYNC: bool = os.getenv("ACTIVITY_BUS_SYNC", "").lower() in ("1", "true", "yes")
+    # A row whose write failed this many times is dropped (counted in metrics)
+    ACTIVITY_FLUSH_MAX_ATTEMPTS: int = int(os.getenv("ACTIVITY_FLUSH_MAX_ATTEMPTS", "5"))
+    # Cap on rows waiting while the DB is unavailable; the oldest go first
+    ACTIVITY_MAX_PENDING: int = int(os.getenv("ACTIVITY_MAX_PENDING", "10000"))
+
+    # Raw activity older than this is rolled up into daily summaries (0 = keep all)
+    ACTIVITY_RETENTION_DAYS: int = int(os.getenv("ACTIVITY_RETENTION_DAYS", "90"))
+    # How often each worker runs the roll-up (0 = only via `python -m app.activity_retention`)
+    ACTIVITY_RETENTION_INTERVAL_HOURS: float = float(
+        os.getenv("ACTIVITY_RETENTION_INTERVAL_HOURS", "6")
+    )
+    # Postgres only: store activities in monthly range partitions on created_at
+    ACTIVITY_PARTITIONING: bool = os.getenv("ACTIVITY_PARTITIONING", "").lower() in ("1", "true", "yes")
+
+    # Recent activity kept in memory per worker for SSE Last-Event-ID resume
+    ACTIVITY_STREAM_BUFFER: int = int(os.getenv("ACTIVITY_STREAM_BUFFER", "2000"))
+
     # ---------- OpenAI ----------
     OPENAI_API_KEY: str = os.getenv("OPENAI_API_KEY", "")
     # vision-capable, cheap-ish model; you can override via env
     OPENAI_MODEL: str = os.getenv("OPENAI_MODEL", "gpt-4.1-mini")
+    # Point at a compatible server (e.g. benchmarks/fake_openai.py) instead of api.openai.com
+    OPENAI_BASE_URL: str = os.getenv("OPENAI_BASE_URL", "")
+    # Concurrent OpenAI calls per worker; extra requests wait for a slot
+    AI_MAX_CONCURRENCY: int = int(os.getenv("AI_MAX_CONCURRENCY", "4"))
+    AI_QUEUE_TIMEOUT_SECONDS: float = float(os.getenv("AI_QUEUE_TIMEOUT_SECONDS", "30"))
+    AI_TIMEOUT_SECONDS: float = float(os.getenv("AI_TIMEOUT_SECONDS", "60"))
+    # Retries on 429 / 5xx / timeouts, with jittered exponential backoff
+    AI_MAX_RETRIES: int = int(os.getenv("AI_MAX_RETRIES", "3"))
+    # Daily token budgets per project / per user (0 = unlimited), persisted every N seconds
+    AI_PROJECT_DAILY_TOKENS: int = int(os.getenv("AI_PROJECT_DAILY_TOKENS", "2000000"))
+    AI_USER_DAILY_TOKENS: int = int(os.getenv("AI_USER_DAILY_TOKENS", "500000"))
+    AI_USAGE_FLUSH_SECONDS: float = float(os.getenv("AI_USAGE_FLUSH_SECONDS", "10"))
+    # USD per million tokens, for the estimated cost metric (gpt-4o-mini list prices)
+    AI_PROMPT_PRICE_PER_MTOK: float = float(os.getenv("AI_PROMPT_PRICE_PER_MTOK", "0.15"))
+    AI_COMPLETION_PRICE_PER_MTOK: float = float(os.getenv("AI_COMPLETION_PRICE_PER_MTOK", "0.60"))
+    # Images are downscaled / re-encoded before being sent to the model
+    AI_IMAGE_MAX_LONG_SIDE: int = int(os.getenv("AI_IMAGE_MAX_LONG_SIDE", "2048"))
+    AI_IMAGE_MAX_SHORT_SIDE: int = int(os.getenv("AI_IMAGE_MAX_SHORT_SIDE", "768"))
+    AI_IMAGE_FORMAT: str = os.getenv("AI_IMAGE_FORMAT", "jpeg")  # jpeg | webp
+    AI_IMAGE_QUALITY: int = int(os.getenv("AI_IMAGE_QUALITY", "85"))
+    AI_IMAGE_CACHE_DIR: str = os.getenv("AI_IMAGE_CACHE_DIR", "cache/ai-images")
+    # PDF / DOCX / XLSX are sent as extracted text, capped and cached here
+    AI_DOC_MAX_CHARS: int = int(os.getenv("AI_DOC_MAX_CHARS", "12000"))
+    AI_DOC_MAX_ROWS: int = int(os.getenv("AI_DOC_MAX_ROWS", "50"))
+    AI_DOC_CACHE_DIR: str = os.getenv("AI_DOC_CACHE_DIR", "cache/ai-documents")
+    # XLSX previews: default / largest row window, cache dir
+    XLSX_PREVIEW_ROWS: int = int(os.getenv("XLSX_PREVIEW_ROWS", "100"))
+    XLSX_PREVIEW_MAX_ROWS: int = int(os.getenv("XLSX_PREVIEW_MAX_ROWS", "1000"))
+    XLSX_PREVIEW_CACHE_DIR: str = os.getenv("XLSX_PREVIEW_CACHE_DIR", "cache/xlsx-previews")
+    # Process pool for CPU-bound image work (design checks, visual diffs);
+    # DESIGN_CHECK_WORKERS is the older name of the setting
+    IMAGE_POOL_WORKERS: int = int(
+        os.getenv("IMAGE_POOL_WORKERS", os.getenv("DESIGN_CHECK_WORKERS", "2"))
+    )
+    # Separate pool for long background builds (tile pyramids)
+    IMAGE_BACKGROUND_WORKERS: int = int(os.getenv("IMAGE_BACKGROUND_WORKERS", "1"))
+    # Local design checks (contrast, clutter, whitespace, palette) for images
+    DESIGN_CHECK_TIMEOUT_SECONDS: float = float(os.getenv("DESIGN_CHECK_TIMEOUT_SECONDS", "10"))
+    DESIGN_CHECKS_CACHE_DIR: str = os.getenv("DESIGN_CHECKS_CACHE_DIR", "cache/design-checks")
+    # Visual diff between asset versions: comparison size, timeout, cache dir
+    VISUAL_DIFF_MAX_SIZE: int = int(os.getenv("VISUAL_DIFF_MAX_SIZE", "1920"))
+    VISUAL_DIFF_TIMEOUT_SECONDS: float = float(os.getenv("VISUAL_DIFF_TIMEOUT_SECONDS", "20"))
+    VISUAL_DIFF_CACHE_DIR: str = os.getenv("VISUAL_DIFF_CACHE_DIR", "cache/visual-diffs")
+    # Deep-zoom tile pyramids: built on upload for images whose long side is
+    # at least TILES_MIN_SIZE px (others on first request)
+    TILES_CACHE_DIR: str = os.getenv("TILES_CACHE_DIR", "cache/tiles")
+    TILE_SIZE: int = int(os.getenv("TILE_SIZE", "254"))
+    TILES_MIN_SIZE: int = int(os.getenv("TILES_MIN_SIZE", "4096"))
+    TILES_MAX_PIXELS: int = int(os.getenv("TILES_MAX_PIXELS", "250000000"))
+    TILES_BUILD_TIMEOUT_SECONDS: float = float(os.getenv("TILES_BUILD_TIMEOUT_SECONDS", "600"))
+    # Background AI jobs: workers per process, retries, and how long a running
+    # job may go without a heartbeat before it counts as abandoned (the
+    # worker refreshes it every quarter of that, however long the job runs)
+    AI_JOB_WORKERS: int = int(os.getenv("AI_JOB_WORKERS", "2"))
+    AI_JOB_MAX_ATTEMPTS: int = int(os.getenv("AI_JOB_MAX_ATTEMPTS", "3"))
+    AI_JOB_POLL_SECONDS: float = float(os.getenv("AI_JOB_POLL_SECONDS", "2"))
+    AI_JOB_TIMEOUT_SECONDS: float = float(os.getenv("AI_JOB_TIMEOUT_SECONDS", "300"))
+    # Jobs of one project batch review that may run at once (per deployment)
+    AI_BATCH_PARALLELISM: int = int(os.getenv("AI_BATCH_PARALLELISM", "2"))
+    # Queue an analysis for every upload so suggestions are ready when opened
+    AI_PRECOMPUTE_ON_UPLOAD: bool = os.getenv("AI_PRECOMPUTE_ON_UPLOAD", "1").lower() in ("1", "true", "yes")
+    # Near-duplicate images: largest pHash distance (of 64 bits) the similar
+    # assets endpoint allows, and the distance that triggers an upload warning
+    SIMILAR_ASSETS_MAX_DISTANCE: int = int(os.getenv("SIMILAR_ASSETS_MAX_DISTANCE", "16"))
+    SIMILAR_ASSETS_WARN_ON_UPLOAD: bool = os.getenv("SIMILAR_ASSETS_WARN_ON_UPLOAD", "1").lower() in ("1", "true", "yes")
+    SIMILAR_ASSETS_WARN_DISTANCE: int = int(os.getenv("SIMILAR_ASSETS_WARN_DISTANCE", "6"))
+    # AI suggestions kept in memory per worker (the DB keeps all of them)
+    AI_CACHE_SIZE: int = int(os.getenv("AI_CACHE_SIZE", "512"))
 
 
 settings = Settings()
@@ -1,8 +1,9 @@
 from typing import Generator
 from datetime import datetime, timedelta
 
-from fastapi import Depends, HTTPException, status, Header
+from fastapi import Depends, HTTPException, status, Header, Query
 from jose import jwt, JWTError
+from sqlalchemy import and_, or_
 from sqlalchemy.orm import Session
 
 from .config import settings
@@ -74,3 +75,78 @@ def get_current_user_from_header(
 
     token = authorization.split(" ", 1)[1].strip()
     return get_current_user(token=token, db=db)
+
+
+def get_token_from_header_or_query(
+    authorization: str = Header(None),
+    token: str | None = Query(None),
+) -> str:
+    """
+    Streams (EventSource) cannot send headers, so they may pass `?token=`.
+    """
+    if authorization and authorization.startswith("Bearer "):
+        return authorization.split(" ", 1)[1].strip()
+    if token:
+        return token
+    raise HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Missing or invalid Authorization header",
+    )
+
+
+def get_current_user_id_from_header(
+    token: str = Depends(get_token_from_header_or_query),
+) -> int:
+    """
+    JWT-only auth: returns the user id without loading the user row.
+    For hot read paths that are served from memory.
+    """
+    try:
+        payload = jwt.decode(
+            token,
+            settings.JWT_SECRET,
+            algorithms=[settings.JWT_ALGORITHM],
+        )
+        return int(payload["sub"])
+    except (JWTError, KeyError, TypeError, ValueError):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+        )
+
+
+def get_asset_for_user_or_404(
+    db: Session,
+    user_id: int,
+    asset_id: int,
+) -> models.Asset:
+    """
+    Asset is visible if the user is the project owner or a participant.
+    """
+    asset = (
+        db.query(models.Asset)
+        .join(models.Project, models.Asset.project_id == models.Project.id)
+        .outerjoin(
+            models.ProjectParticipant,
+            and_(
+                models.ProjectParticipant.project_id == models.Project.id,
+                models.ProjectParticipant.user_id == user_id,
+            ),
+        )
+        .filter(
+            models.Asset.id == asset_id,
+            or_(
+                models.Project.owner_id == user_id,
+                models.ProjectParticipant.id.isnot(None),
+            ),
+        )
+        .first()
+    )
+
+    if not asset:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Asset not found",
+        )
+
+    return asset
@@ -0,0 +1,272 @@
+"""
+Local design checks for image assets.
+
+Cheap, deterministic heuristics computed with Pillow + NumPy on a
+downscaled copy of the image, so every asset gets instant feedback
+without a model call:
+
+- contrast: WCAG contrast ratio per grid cell (between its background and
+  its most distinct foreground), as a heatmap; cells with content below
+  4.5:1 are flagged,
+- clutter: share of edge pixels (gradient magnitude over a threshold),
+- whitespace: share of empty cells and how far the visual weight sits
+  from the centre,
+- palette: dominant colours and their share of the image.
+
+Analysis runs in app.image_pool (numeric work holds the GIL) and the
+result is cached on disk per content hash and CHECKS_VERSION.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any
+
+import numpy as np
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from . import image_pool, metrics
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+# Bump when the analysis or its output changes so cached reports are redone
+CHECKS_VERSION = "1"
+
+ANALYSIS_SIZE = 1280
+GRID_CELLS = 12  # along the long side
+EDGE_THRESHOLD = 0.08  # gradient of gamma-encoded luma, 0..1
+CONTENT_EDGE_DENSITY = 0.02  # cells with fewer edge pixels count as empty
+WCAG_AA = 4.5
+PALETTE_COLORS = 6
+IMAGE_EXTENSIONS = {".png", ".jpg", ".jpeg", ".webp"}
+
+CHECK_SECONDS = metrics.histogram(
+    "design_check_seconds",
+    "Time to produce local design checks for an asset (cache=hit|miss).",
+    [0.005, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5],
+)
+
+
+def load_rgb(path: str, max_size: int = ANALYSIS_SIZE) -> Image.Image | None:
+    """
+    The image upright, flattened onto white and fitted into `max_size`
+    square, or None if it cannot be read as an image.
+    """
+    try:
+        with Image.open(path) as img:
+            if img.format == "JPEG":
+                img.draft("RGB", (max_size, max_size))
+            img = ImageOps.exif_transpose(img)
+            if img.mode in ("RGBA", "LA", "P"):
+                img = img.convert("RGBA")
+                background = Image.new("RGB", img.size, (255, 255, 255))
+                background.paste(img, mask=img.getchannel("A"))
+                img = background
+            elif img.mode != "RGB":
+                img = img.convert("RGB")
+            img.thumbnail((max_size, max_size))
+            return img
+    except (UnidentifiedImageError, OSError):
+        return None
+
+
+def _blocks(values: np.ndarray, cell: int) -> np.ndarray:
+    # (H, W) -> (rows, cols, cell*cell) without copying pixel by pixel
+    rows, cols = values.shape[0] // cell, values.shape[1] // cell
+    values = values[: rows * cell, : cols * cell]
+    return values.reshape(rows, cell, cols, cell).swapaxes(1, 2).reshape(rows, cols, -1)
+
+
+def _position(col: float, row: float, cols: int, rows: int) -> str:
+    vertical = ("top", "middle", "bottom")[min(2, int(3 * row / rows))]
+    horizontal = ("left", "centre", "right")[min(2, int(3 * col / cols))]
+    return "centre" if vertical == "middle" and horizontal == "centre" else f"{vertical} {horizontal}"
+
+
+def _palette(img: Image.Image) -> list[dict[str, Any]]:
+    small = img.copy()
+    small.thumbnail((128, 128))
+    quantized = small.quantize(PALETTE_COLORS, method=Image.Quantize.MEDIANCUT)
+    palette = quantized.getpalette() or []
+    counts = sorted(quantized.getcolors() or [], reverse=True)
+    total = sum(count for count, _ in counts) or 1
+    return [
+        {
+            "hex": "#{:02x}{:02x}{:02x}".format(*palette[index * 3 : index * 3 + 3]),
+            "share": round(count / total, 3),
+        }
+        for count, index in counts
+    ]
+
+
+def _suggestions(report: dict[str, Any]) -> list[str]:
+    suggestions = []
+    contrast = report["contrast"]
+    if contrast["low_contrast_share"] >= 0.1:
+        suggestions.append(
+            f"Low contrast in {contrast['low_contrast_share']:.0%} of the content areas "
+            f"(lowest {contrast['min_ratio']}:1, in the {contrast['worst_area']}); "
+            f"aim for at least {WCAG_AA}:1 for text."
+        )
+    clutter = report["clutter"]
+    if clutter["score"] >= 60:
+        suggestions.append(
+            f"The layout looks busy (clutter {clutter['score']}/100); group related "
+            "elements and remove decoration that does not carry information."
+        )
+    whitespace = report["whitespace"]
+    if whitespace["share"] < 0.15:
+        suggestions.append(
+            f"Only {whitespace['share']:.0%} of the canvas is empty; add spacing "
+            "around key elements so they can breathe."
+        )
+    if whitespace["balance"] < 0.6:
+        suggestions.append(
+            f"Visual weight is concentrated towards the {whitespace['heavy_side']}; "
+            "rebalance content or use the empty side deliberately."
+        )
+    major = [color for color in report["palette"] if color["share"] >= 0.05]
+    if len(major) >= PALETTE_COLORS and major[0]["share"] < 0.35:
+        suggestions.append(
+            "Many colours compete for attention; settle on one dominant and one "
+            "accent colour."
+        )
+    return suggestions
+
+
+def analyze(path: str) -> dict[str, Any] | None:
+    """
+    Design checks for the image at `path`, or None if it is not an image.
+    CPU-bound; meant to run in the process pool.
+    """
+    started = time.perf_counter()
+    img = load_rgb(path)
+    if img is None:
+        return None
+
+    rgb = np.asarray(img, dtype=np.float32) / 255.0
+    # WCAG relative luminance, from linearised sRGB
+    linear = np.where(rgb <= 0.04045, rgb / 12.92, ((rgb + 0.055) / 1.055) ** 2.4)
+    luminance = linear @ np.array([0.2126, 0.7152, 0.0722], dtype=np.float32)
+    # Edges on gamma-encoded luma, closer to perceived lightness steps
+    luma = rgb @ np.array([0.299, 0.587, 0.114], dtype=np.float32)
+    gx = np.zeros_like(luma)
+    gy = np.zeros_like(luma)
+    gx[:, 1:] = np.abs(np.diff(luma, axis=1))
+    gy[1:, :] = np.abs(np.diff(luma, axis=0))
+    edges = np.hypot(gx, gy) > EDGE_THRESHOLD
+
+    cell = max(8, max(luma.shape) // GRID_CELLS)
+    lum_blocks = _blocks(luminance, cell)
+    edge_density = _blocks(edges, cell).mean(axis=-1)
+    rows, cols = edge_density.shape
+
+    # Background = the cell's median; foreground = whichever extreme is further
+    # from it (1st/99th percentile, so thin text strokes still count)
+    dark, background, light = np.percentile(lum_blocks, [1, 50, 99], axis=-1)
+    foreground = np.where(background - dark > light - background, dark, light)
+    ratios = (np.maximum(foreground, background) + 0.05) / (np.minimum(foreground, background) + 0.05)
+    content = edge_density >= CONTENT_EDGE_DENSITY
+    low = content & (ratios < WCAG_AA)
+
+    if low.any():
+        worst = np.unravel_index(np.argmin(np.where(low, ratios, np.inf)), ratios.shape)
+        worst_area = _position(worst[1] + 0.5, worst[0] + 0.5, cols, rows)
+    else:
+        worst_area = None
+
+    weight = edge_density.sum()
+    if weight > 0:
+        ys, xs = np.mgrid[0:rows, 0:cols]
+        cx = float((edge_density * (xs + 0.5)).sum() / weight / cols)
+        cy = float((edge_density * (ys + 0.5)).sum() / weight / rows)
+    else:
+        cx = cy = 0.5
+    offset = max(abs(cx - 0.5), abs(cy - 0.5))
+    if abs(cx - 0.5) >= abs(cy - 0.5):
+        heavy_side = "left" if cx < 0.5 else "right"
+    else:
+        heavy_side = "top" if cy < 0.5 else "bottom"
+
+    density = float(edges.mean())
+    report = {
+        "version": CHECKS_VERSION,
+        "analyzed_size": [img.width, img.height],
+        "contrast": {
+            "grid": [rows, cols],
+            # null where the cell is empty (nothing to read there)
+            "heatmap": [
+                [round(float(ratio), 1) if has_content else None for ratio, has_content in zip(*row)]
+                for row in zip(ratios, content)
+            ],
+            "low_contrast_share": round(float(low.sum() / max(1, content.sum())), 3),
+            "min_ratio": round(float(ratios[content].min()), 1) if content.any() else None,
+            "worst_area": worst_area,
+        },
+        "clutter": {
+            "score": round(min(1.0, density / 0.2) * 100),
+            "edge_density": round(density, 4),
+        },
+        "whitespace": {
+            "share": round(float(1 - content.mean()), 3),
+            "balance": round(1 - 2 * offset, 3),
+            "center_of_weight": [round(cx, 3), round(cy, 3)],
+            "heavy_side": heavy_side,
+        },
+        "palette": _palette(img),
+    }
+    report["suggestions"] = _suggestions(report)
+    report["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    return report
+
+
+# ---------- cache (API process) ----------
+
+
+def _cache_path(content_hash: str) -> str:
+    return os.path.join(settings.DESIGN_CHECKS_CACHE_DIR, f"{content_hash}-v{CHECKS_VERSION}.json")
+
+
+def checks_for(path: str, content_hash: str) -> dict[str, Any] | None:
+    """
+    Cached design checks for the asset file, or None for non-images (and
+    if the analysis fails or times out). Blocking; call from a thread.
+    """
+    if os.path.splitext(path.lower())[1] not in IMAGE_EXTENSIONS:
+        return None
+    started = time.perf_counter()
+    cache_path = _cache_path(content_hash)
+    try:
+        with open(cache_path, encoding="utf-8") as f:
+            report = json.load(f)
+        CHECK_SECONDS.observe(time.perf_counter() - started, cache="hit")
+        return report
+    except FileNotFoundError:
+        pass
+
+    try:
+        report = image_pool.run(analyze, path, timeout=settings.DESIGN_CHECK_TIMEOUT_SECONDS)
+    except FutureTimeoutError:
+        logger.warning("Design checks for %s timed out", path)
+        return None
+    except BrokenProcessPool:
+        logger.exception("Image pool broke while analysing %s", path)
+        return None
+    except Exception:
+        logger.exception("Design checks for %s failed", path)
+        return None
+    if report is None:
+        return None
+
+    os.makedirs(settings.DESIGN_CHECKS_CACHE_DIR, exist_ok=True)
+    tmp_path = f"{cache_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(report, f)
+    os.replace(tmp_path, cache_path)
+    CHECK_SECONDS.observe(time.perf_counter() - started, cache="miss")
+    return report
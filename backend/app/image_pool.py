@@ -0,0 +1,92 @@
+"""
+Process pools for CPU-bound image work.
+
+NumPy/Pillow work holds the GIL long enough to stall the event loop and
+the threadpool, so it runs in spawned worker processes instead:
+
+- `run`: interactive work a request waits for (design checks, visual
+  diffs), IMAGE_POOL_WORKERS processes,
+- `submit_background`: long fire-and-forget builds (tile pyramids), in a
+  separate pool of IMAGE_BACKGROUND_WORKERS so they never queue in front
+  of interactive work.
+
+Functions submitted here must be importable top-level functions with
+picklable arguments.
+"""
+
+import multiprocessing
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable
+
+from .config import settings
+
+INTERACTIVE = "interactive"
+BACKGROUND = "background"
+
+_pools: dict[str, ProcessPoolExecutor] = {}
+_pool_lock = threading.Lock()
+
+
+def _get_pool(name: str) -> ProcessPoolExecutor:
+    with _pool_lock:
+        pool = _pools.get(name)
+        if pool is None:
+            workers = (
+                settings.IMAGE_POOL_WORKERS if name == INTERACTIVE else settings.IMAGE_BACKGROUND_WORKERS
+            )
+            # spawn, not fork: the API process has threads (DB pool, backplane)
+            pool = _pools[name] = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return pool
+
+
+def _discard(name: str, pool: ProcessPoolExecutor) -> None:
+    # A worker died (e.g. OOM on a huge image); start a fresh pool next time
+    with _pool_lock:
+        if _pools.get(name) is pool:
+            del _pools[name]
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def run(fn: Callable[..., Any], *args: Any, timeout: float) -> Any:
+    """
+    `fn(*args)` in the interactive pool. Blocking; call from a thread.
+    Raises concurrent.futures.TimeoutError after `timeout` seconds, and
+    BrokenProcessPool if a worker died.
+    """
+    pool = _get_pool(INTERACTIVE)
+    try:
+        return pool.submit(fn, *args).result(timeout)
+    except BrokenProcessPool:
+        _discard(INTERACTIVE, pool)
+        raise
+
+
+def submit_background(fn: Callable[..., Any], *args: Any) -> Future:
+    """`fn(*args)` in the background pool; the future reports the outcome."""
+    pool = _get_pool(BACKGROUND)
+    try:
+        future = pool.submit(fn, *args)
+    except BrokenProcessPool:
+        _discard(BACKGROUND, pool)
+        pool = _get_pool(BACKGROUND)
+        future = pool.submit(fn, *args)
+
+    def check(done: Future) -> None:
+        if not done.cancelled() and isinstance(done.exception(), BrokenProcessPool):
+            _discard(BACKGROUND, pool)
+
+    future.add_done_callback(check)
+    return future
+
+
+def shutdown() -> None:
+    with _pool_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.shutdown(wait=False, cancel_futures=True)
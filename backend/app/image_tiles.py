@@ -0,0 +1,295 @@
+"""
+Deep-zoom tile pyramids (DZI) for large image assets.
+
+A pyramid is built once per file content, in the background image pool:
+the full-size image is cut into TILE_SIZE WebP tiles (with a 1 px overlap,
+as DZI viewers such as OpenSeadragon expect), then halved and cut again
+down to a 1x1 level. The layout on disk is the standard one,
+
+    {TILES_CACHE_DIR}/{content_hash}-v{TILES_VERSION}/image.dzi
+    {TILES_CACHE_DIR}/{content_hash}-v{TILES_VERSION}/image_files/{level}/{col}_{row}.webp
+
+so a viewer pointed at the .dzi fetches only the tiles of the viewport at
+the current zoom. A pyramid never changes once written, which lets tiles be
+served with immutable caching.
+
+Uploads of images larger than TILES_MIN_SIZE schedule a build right away;
+other images are built on first request. A build is written to a temp dir
+and renamed into place; a lock file keeps other processes from building
+the same pyramid at the same time. A build that fails (unreadable image,
+over TILES_MAX_PIXELS, an error in the worker) leaves a `.failed` marker
+next to where the pyramid would be, so the image is not rebuilt on every
+request; a crashed worker (broken pool) does not count as a failure.
+"""
+
+import json
+import logging
+import math
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from . import image_pool, metrics
+from .config import settings
+from .design_checks import IMAGE_EXTENSIONS
+
+logger = logging.getLogger(__name__)
+
+# Bump when tiling changes; old pyramids are simply no longer used
+TILES_VERSION = "1"
+OVERLAP = 1
+FORMAT = "webp"
+WEBP_QUALITY = 80
+
+BUILD_SECONDS = metrics.histogram(
+    "tile_pyramid_build_seconds",
+    "Time to build the tile pyramid of an image asset.",
+    [0.5, 1, 2.5, 5, 10, 30, 60, 120, 300],
+)
+BUILDS = metrics.counter(
+    "tile_pyramid_builds_total",
+    "Tile pyramid builds by outcome (ok|not_image|error).",
+)
+
+_DZI = (
+    '<?xml version="1.0" encoding="UTF-8"?>\n'
+    '<Image xmlns="http://schemas.microsoft.com/deepzoom/2008" Format="{format}" '
+    'Overlap="{overlap}" TileSize="{tile_size}"><Size Width="{width}" Height="{height}"/></Image>\n'
+)
+
+
+def pyramid_key(content_hash: str) -> str:
+    return f"{content_hash}-v{TILES_VERSION}"
+
+
+def pyramid_dir(content_hash: str) -> str:
+    return os.path.join(settings.TILES_CACHE_DIR, pyramid_key(content_hash))
+
+
+def is_image(path: str) -> bool:
+    return os.path.splitext(path.lower())[1] in IMAGE_EXTENSIONS
+
+
+def build(path: str, out_dir: str) -> dict[str, Any] | None:
+    """
+    Write the pyramid of the image at `path` into `out_dir` (which must not
+    exist) and return its description, or None if it is not an image.
+    CPU-bound; meant to run in the background image pool.
+    """
+    # Large artboards are the point; the pool's workers only handle images
+    # the API accepted, so allow more pixels than Pillow's bomb guard does
+    Image.MAX_IMAGE_PIXELS = max(Image.MAX_IMAGE_PIXELS or 0, settings.TILES_MAX_PIXELS)
+    try:
+        with Image.open(path) as img:
+            img = ImageOps.exif_transpose(img)
+            has_alpha = img.mode in ("RGBA", "LA", "P", "PA")
+            img = img.convert("RGBA" if has_alpha else "RGB")
+    except (UnidentifiedImageError, OSError, Image.DecompressionBombError):
+        return None
+
+    width, height = img.size
+    tile_size = settings.TILE_SIZE
+    max_level = math.ceil(math.log2(max(width, height))) if max(width, height) > 1 else 0
+    tmp_dir = f"{out_dir}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    files_dir = os.path.join(tmp_dir, "image_files")
+
+    try:
+        tiles = _cut_levels(img, files_dir, max_level, tile_size)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+    description = {
+        "width": width,
+        "height": height,
+        "tile_size": tile_size,
+        "overlap": OVERLAP,
+        "format": FORMAT,
+        "max_level": max_level,
+        "tiles": tiles,
+    }
+    with open(os.path.join(tmp_dir, "image.dzi"), "w", encoding="utf-8") as f:
+        f.write(_DZI.format(**description))
+    with open(os.path.join(tmp_dir, "info.json"), "w", encoding="utf-8") as f:
+        json.dump(description, f)
+    try:
+        os.rename(tmp_dir, out_dir)
+    except OSError:
+        # Built meanwhile by a process that took over a stale lock
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    return description
+
+
+def _cut_levels(img: Image.Image, files_dir: str, max_level: int, tile_size: int) -> int:
+    tiles = 0
+    level_img = img
+    for level in range(max_level, -1, -1):
+        if level < max_level:
+            # Halve (rounding up, as DZI level sizes do)
+            level_img = level_img.reduce(2)
+        level_dir = os.path.join(files_dir, str(level))
+        os.makedirs(level_dir)
+        level_width, level_height = level_img.size
+        for row in range(math.ceil(level_height / tile_size)):
+            for col in range(math.ceil(level_width / tile_size)):
+                x0, y0 = col * tile_size, row * tile_size
+                box = (
+                    max(0, x0 - OVERLAP),
+                    max(0, y0 - OVERLAP),
+                    min(level_width, x0 + tile_size + OVERLAP),
+                    min(level_height, y0 + tile_size + OVERLAP),
+                )
+                level_img.crop(box).save(
+                    os.path.join(level_dir, f"{col}_{row}.{FORMAT}"),
+                    "WEBP",
+                    quality=WEBP_QUALITY,
+                    method=0,
+                )
+                tiles += 1
+    return tiles
+
+
+# ---------- scheduling + lookup (API process) ----------
+
+_building: dict[str, Future] = {}
+_building_lock = threading.Lock()
+
+
+def _lock_path(content_hash: str) -> str:
+    return f"{pyramid_dir(content_hash)}.lock"
+
+
+def _take_lock(content_hash: str) -> bool:
+    # One build per pyramid across processes; a lock older than the build
+    # timeout belongs to a build that died and is taken over
+    path = _lock_path(content_hash)
+    try:
+        age = time.time() - os.path.getmtime(path)
+        if age < settings.TILES_BUILD_TIMEOUT_SECONDS:
+            return False
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+    try:
+        os.close(os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        return True
+    except FileExistsError:
+        return False
+
+
+def _failed_path(content_hash: str) -> str:
+    return f"{pyramid_dir(content_hash)}.failed"
+
+
+def _record_failure(content_hash: str, reason: str) -> None:
+    path = _failed_path(content_hash)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"reason": reason}, f)
+        os.replace(tmp_path, path)
+    except OSError:
+        logger.exception("Could not record the failed tile build of %s", content_hash)
+
+
+def failure(content_hash: str) -> str | None:
+    """Why the pyramid could not be built, or None if no build failed."""
+    try:
+        with open(_failed_path(content_hash), encoding="utf-8") as f:
+            return json.load(f).get("reason") or "failed"
+    except FileNotFoundError:
+        return None
+    except ValueError:
+        return "failed"
+
+
+def _release_lock(content_hash: str) -> None:
+    try:
+        os.remove(_lock_path(content_hash))
+    except FileNotFoundError:
+        pass
+
+
+def info(content_hash: str) -> dict[str, Any] | None:
+    """Description of the built pyramid, or None if there is none (yet)."""
+    try:
+        with open(os.path.join(pyramid_dir(content_hash), "info.json"), encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def is_building(content_hash: str) -> bool:
+    with _building_lock:
+        if content_hash in _building:
+            return True
+    return os.path.exists(_lock_path(content_hash))
+
+
+def schedule(path: str, content_hash: str) -> bool:
+    """
+    Start building the pyramid in the background unless it exists, is
+    being built or failed before. Returns whether a build is now pending.
+    Does not block on the build.
+    """
+    if not is_image(path) or info(content_hash) is not None or failure(content_hash) is not None:
+        return False
+    os.makedirs(settings.TILES_CACHE_DIR, exist_ok=True)
+    with _building_lock:
+        if content_hash in _building:
+            return True
+        if not _take_lock(content_hash):
+            return True
+        started = time.perf_counter()
+        future = image_pool.submit_background(build, path, pyramid_dir(content_hash))
+        _building[content_hash] = future
+
+    def finished(done: Future) -> None:
+        with _building_lock:
+            _building.pop(content_hash, None)
+        _release_lock(content_hash)
+        if done.cancelled():
+            return
+        error = done.exception()
+        if error is not None:
+            BUILDS.inc(outcome="error")
+            logger.error("Tile pyramid build for %s failed: %r", path, error)
+            # A dead worker says nothing about this image; the next request retries
+            if not isinstance(error, BrokenProcessPool):
+                _record_failure(content_hash, f"build failed: {type(error).__name__}")
+        elif done.result() is None:
+            BUILDS.inc(outcome="not_image")
+            _record_failure(content_hash, "unreadable image or more than TILES_MAX_PIXELS pixels")
+        else:
+            BUILDS.inc(outcome="ok")
+            BUILD_SECONDS.observe(time.perf_counter() - started)
+
+    future.add_done_callback(finished)
+    return True
+
+
+def schedule_if_large(path: str, content_hash: str) -> bool:
+    """
+    `schedule` for images whose long side reaches TILES_MIN_SIZE (reads
+    only the image header). Blocking; call from a thread.
+    """
+    if not is_image(path):
+        return False
+    try:
+        with Image.open(path) as img:
+            size = img.size
+    except Image.DecompressionBombError:
+        # Over Pillow's default pixel limit: certainly large
+        return schedule(path, content_hash)
+    except (UnidentifiedImageError, OSError):
+        return False
+    if max(size) < settings.TILES_MIN_SIZE:
+        return False
+    return schedule(path, content_hash)
@@ -1,14 +1,80 @@
+import asyncio
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 
 from .database import Base, engine
 from .config import settings
-from .routers import ai, health, auth, projects, assets, comments, invites, activity
+from .migrations import run_migrations
+from . import (
+    activity_retention,
+    ai_jobs,
+    ai_usage,
+    image_pool,
+    presence,
+    realtime,
+    similar_assets,
+)
+from .activity_bus import activity_bus
+from .activity_stream import stream as activity_stream
+from .notifications import notifications
+from .routers import (
+    ai,
+    diffs,
+    health,
+    previews,
+    similar,
+    tiles,
+    auth,
+    projects,
+    assets,
+    comments,
+    invites,
+    activity,
+    ws,
+    presence as presence_router,
+)
 
 Base.metadata.create_all(bind=engine)
+run_migrations(engine)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    realtime.hub.add_listener(activity_stream.feed)
+    realtime.hub.add_listener(notifications.feed)
+    realtime.hub.add_listener(similar_assets.index.feed)
+    realtime.hub.add_listener(presence.feed)
+    await realtime.start()
+    activity_bus.start()
+    await ai_jobs.start()
+    presence_task = asyncio.create_task(presence.run_expiry_loop())
+    usage_task = asyncio.create_task(ai_usage.run_flush_loop())
+    retention_task = None
+    if settings.ACTIVITY_RETENTION_DAYS > 0 and settings.ACTIVITY_RETENTION_INTERVAL_HOURS > 0:
+        retention_task = asyncio.create_task(activity_retention.run_retention_loop())
+    partition_task = None
+    if settings.ACTIVITY_PARTITIONING and engine.dialect.name == "postgresql":
+        partition_task = asyncio.create_task(activity_retention.run_partition_loop())
+    yield
+    presence_task.cancel()
+    if retention_task is not None:
+        retention_task.cancel()
+    if partition_task is not None:
+        partition_task.cancel()
+    await ai_jobs.stop()
+    usage_task.cancel()
+    # Persist token usage of the calls made since the last flush
+    await asyncio.to_thread(ai_usage.budgets.flush)
+    image_pool.shutdown()
+    # Write out queued activity before the backplane goes away
+    await asyncio.to_thread(activity_bus.stop)
+    await realtime.stop()
+
 
-app = FastAPI(title=settings.PROJECT_NAME)
+app = FastAPI(title=settings.PROJECT_NAME, lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -27,9 +93,22 @@ app.include_router(auth.router)
 app.include_router(projects.router)
 app.include_router(assets.router)
 app.include_router(comments.router)
+app.include_router(comments.project_router)
 app.include_router(invites.router)
 app.include_router(ai.router)
+app.include_router(ai.jobs_router)
+app.include_router(ai.project_router)
+app.include_router(ai.batches_router)
+app.include_router(diffs.router)
+app.include_router(previews.router)
+app.include_router(similar.router)
+app.include_router(tiles.router)
+app.include_router(tiles.tiles_router)
 app.include_router(activity.router)
+app.include_router(activity.user_router)
+app.include_router(ws.router)
+app.include_router(presence_router.router)
+app.include_router(presence_router.project_router)
 
 @app.get("/")
 def root():
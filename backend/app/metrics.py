@@ -0,0 +1,143 @@
+"""
+Minimal in-process metrics (counters / gauges / histograms) rendered in
+the Prometheus text format at GET /health/metrics. Values are per worker.
+"""
+
+import threading
+from typing import Iterable
+
+LabelKey = tuple[tuple[str, str], ...]
+
+
+def _label_key(labels: dict[str, object]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str) -> None:
+        self.name = name
+        self.help_text = help_text
+        self._values: dict[LabelKey, float] = {}
+        self._lock = threading.Lock()
+
+    def value(self, **labels: object) -> float:
+        with self._lock:
+            return self._values.get(_label_key(labels), 0.0)
+
+    def samples(self) -> list[tuple[LabelKey, float]]:
+        with self._lock:
+            return list(self._values.items())
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels: object) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels: object) -> None:
+        with self._lock:
+            self._values[_label_key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels: object) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1, **labels: object) -> None:
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, buckets: Iterable[float]) -> None:
+        super().__init__(name, help_text)
+        self.buckets = sorted(buckets)
+        # label key -> ([count per bucket], sum, count)
+        self._observations: dict[LabelKey, tuple[list[int], float, int]] = {}
+
+    def observe(self, value: float, **labels: object) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            counts, total, n = self._observations.get(key) or ([0] * len(self.buckets), 0.0, 0)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._observations[key] = (counts, total + value, n + 1)
+
+    def samples(self) -> list[tuple[LabelKey, float]]:
+        # Flattened into Prometheus' _bucket / _sum / _count series
+        out: list[tuple[LabelKey, float]] = []
+        with self._lock:
+            for key, (counts, total, n) in self._observations.items():
+                for bound, count in zip(self.buckets, counts):
+                    out.append(((("__suffix", "_bucket"), *key, ("le", _format_value(bound))), count))
+                out.append(((("__suffix", "_bucket"), *key, ("le", "+Inf")), n))
+                out.append(((("__suffix", "_sum"), *key), total))
+                out.append(((("__suffix", "_count"), *key), n))
+        return out
+
+
+_registry: dict[str, _Metric] = {}
+_registry_lock = threading.Lock()
+
+
+def _register(metric: _Metric) -> _Metric:
+    with _registry_lock:
+        existing = _registry.get(metric.name)
+        if existing is not None:
+            return existing
+        _registry[metric.name] = metric
+        return metric
+
+
+def counter(name: str, help_text: str) -> Counter:
+    return _register(Counter(name, help_text))  # type: ignore[return-value]
+
+
+def gauge(name: str, help_text: str) -> Gauge:
+    return _register(Gauge(name, help_text))  # type: ignore[return-value]
+
+
+def histogram(name: str, help_text: str, buckets: Iterable[float]) -> Histogram:
+    return _register(Histogram(name, help_text, buckets))  # type: ignore[return-value]
+
+
+def _format_labels(key: LabelKey) -> str:
+    if not key:
+        return ""
+    inner = ",".join(f'{k}="{v}"' for k, v in key)
+    return "{" + inner + "}"
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(value)
+
+
+def render(metrics: Iterable[_Metric] | None = None) -> str:
+    with _registry_lock:
+        items = list(metrics) if metrics is not None else list(_registry.values())
+    lines: list[str] = []
+    for metric in sorted(items, key=lambda m: m.name):
+        lines.append(f"# HELP {metric.name} {metric.help_text}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        samples = metric.samples()
+        if isinstance(metric, Histogram):
+            samples = samples or [((("__suffix", "_sum"),), 0.0), ((("__suffix", "_count"),), 0.0)]
+        else:
+            samples = sorted(samples) or [((), 0.0)]
+        for key, value in samples:
+            suffix = ""
+            if key and key[0][0] == "__suffix":
+                suffix, key = key[0][1], key[1:]
+            lines.append(f"{metric.name}{suffix}{_format_labels(key)} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
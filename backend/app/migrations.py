@@ -0,0 +1,106 @@
+"""
+Tiny in-place schema migrations.
+
+`Base.metadata.create_all` only creates missing tables, it never touches
+existing ones. Anything that adds a column to an existing table (or needs
+a one-off data backfill) goes here and runs once at startup.
+"""
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+
+from . import models
+from .activity_retention import partition_activities
+from .comment_regions import ensure_spatial_index
+from .config import settings
+
+
+def _add_column_if_missing(engine: Engine, table: str, column: str, ddl: str) -> bool:
+    columns = {c["name"] for c in inspect(engine).get_columns(table)}
+    if column in columns:
+        return False
+    with engine.begin() as conn:
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+    return True
+
+
+def _create_index_if_missing(engine: Engine, table: str, name: str, columns: str) -> None:
+    with engine.begin() as conn:
+        conn.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})"))
+
+
+def _backfill_comment_paths(engine: Engine) -> None:
+    """
+    Compute `comments.path` for rows written before threads were materialized.
+    Walks the tree one level at a time: roots first, then their children, ...
+    """
+    with engine.begin() as conn:
+        conn.execute(
+            text(
+                "UPDATE comments SET path = CAST(id AS VARCHAR) || '/' "
+                "WHERE path IS NULL AND parent_id IS NULL"
+            )
+        )
+        while True:
+            updated = conn.execute(
+                text(
+                    "UPDATE comments SET path = ("
+                    "  SELECT p.path FROM comments p WHERE p.id = comments.parent_id"
+                    ") || CAST(id AS VARCHAR) || '/' "
+                    "WHERE path IS NULL AND parent_id IN ("
+                    "  SELECT id FROM comments WHERE path IS NOT NULL"
+                    ")"
+                )
+            ).rowcount
+            if not updated:
+                break
+
+        # Replies whose parent row is gone: promote them to roots so they
+        # stay reachable instead of dangling.
+        conn.execute(
+            text(
+                "UPDATE comments SET parent_id = NULL, path = CAST(id AS VARCHAR) || '/' "
+                "WHERE path IS NULL"
+            )
+        )
+
+
+def run_migrations(engine: Engine) -> None:
+    _add_column_if_missing(engine, models.Comment.__tablename__, "path", "VARCHAR")
+    _create_index_if_missing(engine, "comments", "ix_comments_path", "path")
+    if engine.dialect.name == "postgresql":
+        # Prefix LIKE only uses a btree index with pattern ops outside the C locale.
+        _create_index_if_missing(
+            engine, "comments", "ix_comments_path_pattern", "path varchar_pattern_ops"
+        )
+    _backfill_comment_paths(engine)
+    ensure_spatial_index(engine)
+
+    _add_column_if_missing(engine, models.Asset.__tablename__, "content_hash", "VARCHAR(64)")
+    _create_index_if_missing(engine, "assets", "ix_assets_content_hash", "content_hash")
+    _add_column_if_missing(engine, models.Asset.__tablename__, "phash", "VARCHAR(16)")
+
+    _add_column_if_missing(
+        engine,
+        models.AIJob.__tablename__,
+        "batch_id",
+        "INTEGER REFERENCES ai_batches(id) ON DELETE SET NULL",
+    )
+    _create_index_if_missing(engine, "ai_jobs", "ix_ai_jobs_batch_id", "batch_id")
+    _add_column_if_missing(
+        engine, models.AIJob.__tablename__, "requested_by", "INTEGER REFERENCES users(id)"
+    )
+    _add_column_if_missing(engine, models.AIJob.__tablename__, "heartbeat_at", "TIMESTAMP")
+
+    _add_column_if_missing(engine, models.Activity.__tablename__, "payload", "JSON")
+    if settings.ACTIVITY_PARTITIONING:
+        partition_activities(engine)
+    _create_index_if_missing(
+        engine, "activities", "ix_activities_project_id_id", "project_id, id"
+    )
+    _create_index_if_missing(
+        engine,
+        "activities",
+        "ix_activities_project_id_created_at_id",
+        "project_id, created_at, id",
+    )
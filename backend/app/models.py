@@ -8,10 +8,15 @@ from sqlalchemy import (
     DateTime,
     ForeignKey,
     Boolean,
+    Date,
+    Float,
+    Index,
+    JSON,
     UniqueConstraint,
 )
 from sqlalchemy.orm import relationship
 
+from .activity_messages import render_message
 from .database import Base
 
 
@@ -85,6 +90,14 @@ class Project(Base):
         back_populates="project",
         cascade="all, delete-orphan",
     )
+    activity_summaries = relationship(
+        "ActivityDailySummary",
+        cascade="all, delete-orphan",
+    )
+    ai_batches = relationship(
+        "AIBatch",
+        cascade="all, delete-orphan",
+    )
     deadline = Column(String , nullable = True)
 
 class ProjectParticipant(Base):
@@ -117,10 +130,16 @@ class Asset(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
 
     status = Column(String, default="needs_feedback", nullable=False)
+    # sha256 of the file bytes; keys caches of derived data (AI suggestions, ...)
+    content_hash = Column(String(64), index=True, nullable=True)
+    # Perceptual hash (16 hex digits) of images, for near-duplicate search
+    phash = Column(String(16), nullable=True)
 
     project = relationship("Project", back_populates="assets")
     comments = relationship("Comment", back_populates="asset")
     uploader = relationship("User")  # who uploaded this asset
+    ai_jobs = relationship("AIJob", back_populates="asset", cascade="all, delete-orphan")
+    ai_batch_items = relationship("AIBatchItem", cascade="all, delete-orphan")
 
 
 class Comment(Base):
@@ -135,6 +154,9 @@ class Comment(Base):
     asset = relationship("Asset", back_populates="comments")
     user = relationship("User")  # used so we can show author in API
     parent_id = Column(Integer, ForeignKey("comments.id"), nullable=True)
+    # Materialized thread path: "<root_id>/<child_id>/.../<id>/".
+    # A whole subtree is every row whose path starts with this comment's path.
+    path = Column(String, index=True, nullable=True)
     # NEW: emoji reactions on this comment
     reactions = relationship(
         "CommentReaction",
@@ -142,6 +164,36 @@ class Comment(Base):
         cascade="all, delete-orphan",
     )
     parent = relationship("Comment", remote_side=[id], backref="children")
+    # Where on the image the comment is pinned; None for whole-asset comments
+    region = relationship(
+        "CommentRegion",
+        back_populates="comment",
+        uselist=False,
+        cascade="all, delete-orphan",
+    )
+
+
+class CommentRegion(Base):
+    """
+    Point (width = height = 0) or rectangle a comment is pinned to, in
+    coordinates normalized to 0..1 of the image. `asset_id` is repeated from
+    the comment so viewport queries stay on this table and its spatial
+    index (see comment_regions.py).
+    """
+
+    __tablename__ = "comment_regions"
+
+    id = Column(Integer, primary_key=True, index=True)
+    comment_id = Column(Integer, ForeignKey("comments.id"), nullable=False, unique=True)
+    asset_id = Column(Integer, ForeignKey("assets.id"), nullable=False)
+    x = Column(Float, nullable=False)
+    y = Column(Float, nullable=False)
+    width = Column(Float, nullable=False, default=0.0)
+    height = Column(Float, nullable=False, default=0.0)
+
+    comment = relationship("Comment", back_populates="region")
+
+    __table_args__ = (Index("ix_comment_regions_asset_id_x", "asset_id", "x"),)
 
 class CommentReaction(Base):
     """
@@ -216,8 +268,168 @@ class Activity(Base):
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
 
     type = Column(String, nullable=False)  # 'asset_uploaded', 'comment_added', 'comment_reacted'
-    message = Column(Text, nullable=False)
+    # Structured details (asset_id, emoji, status, ...); text is rendered on read
+    payload = Column(JSON, nullable=True)
+    # Pre-rendered text of entries written before `payload` existed ("" since)
+    stored_message = Column("message", Text, nullable=False, default="")
     created_at = Column(DateTime, default=datetime.utcnow)
 
     project = relationship("Project", back_populates="activities")
     user = relationship("User")
+
+    __table_args__ = (
+        # Per-project reads: latest N, and "everything after id X" on resume
+        Index("ix_activities_project_id_id", "project_id", "id"),
+        # Newest-first reads with a (created_at, id) cursor, per project and merged
+        Index("ix_activities_project_id_created_at_id", "project_id", "created_at", "id"),
+    )
+
+    @property
+    def message(self) -> str:
+        if self.stored_message:
+            return self.stored_message
+        return render_message(self.type, self.payload, self.user)
+
+
+class AISuggestion(Base):
+    """
+    Cached AI suggestions for one file content, model and prompt version.
+    Identical files (re-uploads, copies across projects) share an entry.
+    """
+
+    __tablename__ = "ai_suggestions"
+
+    id = Column(Integer, primary_key=True, index=True)
+    content_hash = Column(String(64), nullable=False)
+    model = Column(String, nullable=False)
+    prompt_version = Column(String, nullable=False)
+    suggestions = Column(JSON, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        UniqueConstraint(
+            "content_hash", "model", "prompt_version", name="uq_ai_suggestions_key"
+        ),
+    )
+
+
+class AIJob(Base):
+    """
+    Background AI analysis of an asset (see app.ai_jobs).
+    status: queued -> running -> succeeded | failed (queued again on retry)
+    """
+
+    __tablename__ = "ai_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    asset_id = Column(Integer, ForeignKey("assets.id"), nullable=False, index=True)
+    status = Column(String, nullable=False, default="queued")
+    # Skip the suggestion cache and ask the model again
+    refresh = Column(Boolean, nullable=False, default=False)
+    attempts = Column(Integer, nullable=False, default=0)
+    error = Column(Text, nullable=True)
+    result = Column(JSON, nullable=True)
+    # Set when queued by a project batch review (capped per batch, see AI_BATCH_PARALLELISM)
+    batch_id = Column(Integer, ForeignKey("ai_batches.id", ondelete="SET NULL"), nullable=True, index=True)
+    # Whose token budget the model call is charged to
+    requested_by = Column(Integer, ForeignKey("users.id"), nullable=True)
+    # Process that is running it ("host:pid"); None while queued
+    locked_by = Column(String, nullable=True)
+    run_after = Column(DateTime, nullable=False, default=datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    # Refreshed by the running worker; the job is requeued once it goes stale
+    heartbeat_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+    asset = relationship("Asset", back_populates="ai_jobs")
+    batch = relationship("AIBatch", back_populates="jobs")
+
+    __table_args__ = (
+        # Workers poll for the oldest runnable queued job
+        Index("ix_ai_jobs_status_run_after", "status", "run_after"),
+    )
+
+
+class AITokenUsage(Base):
+    """
+    Daily model token usage per project or user (scope = "project" | "user"),
+    written periodically from the in-memory budget counters (app.ai_usage).
+    """
+
+    __tablename__ = "ai_token_usage"
+
+    id = Column(Integer, primary_key=True, index=True)
+    scope = Column(String, nullable=False)
+    scope_id = Column(Integer, nullable=False)
+    day = Column(Date, nullable=False)
+    prompt_tokens = Column(Integer, nullable=False, default=0)
+    completion_tokens = Column(Integer, nullable=False, default=0)
+    requests = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        UniqueConstraint("scope", "scope_id", "day", name="uq_ai_token_usage_key"),
+    )
+
+
+class AIBatch(Base):
+    """
+    "Analyze every asset with this status" for a project (see app.ai_batches).
+    One item per selected asset; progress is read from the items' jobs.
+    """
+
+    __tablename__ = "ai_batches"
+
+    id = Column(Integer, primary_key=True, index=True)
+    project_id = Column(Integer, ForeignKey("projects.id"), nullable=False, index=True)
+    requested_by = Column(Integer, ForeignKey("users.id"), nullable=False)
+    asset_status = Column(String, nullable=False)
+    refresh = Column(Boolean, nullable=False, default=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    items = relationship(
+        "AIBatchItem",
+        back_populates="batch",
+        cascade="all, delete-orphan",
+        order_by="AIBatchItem.id",
+    )
+    # Jobs outlive the batch (batch_id is cleared)
+    jobs = relationship("AIJob", back_populates="batch")
+
+
+class AIBatchItem(Base):
+    """
+    One asset of a batch: either answered from the suggestion cache when
+    the batch was created (`result` set, no job) or tracked through `job`.
+    """
+
+    __tablename__ = "ai_batch_items"
+
+    id = Column(Integer, primary_key=True, index=True)
+    batch_id = Column(Integer, ForeignKey("ai_batches.id"), nullable=False, index=True)
+    asset_id = Column(Integer, ForeignKey("assets.id"), nullable=False)
+    job_id = Column(Integer, ForeignKey("ai_jobs.id", ondelete="SET NULL"), nullable=True)
+    result = Column(JSON, nullable=True)
+    error = Column(Text, nullable=True)
+
+    batch = relationship("AIBatch", back_populates="items")
+    job = relationship("AIJob")
+
+
+class ActivityDailySummary(Base):
+    """
+    Per-project, per-day event counts that raw activity rows are rolled up
+    into once they are older than ACTIVITY_RETENTION_DAYS.
+    """
+
+    __tablename__ = "activity_daily_summaries"
+
+    id = Column(Integer, primary_key=True, index=True)
+    project_id = Column(Integer, ForeignKey("projects.id"), nullable=False)
+    day = Column(Date, nullable=False)
+    type = Column(String, nullable=False)
+    count = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        UniqueConstraint("project_id", "day", "type", name="uq_activity_summary_project_day_type"),
+    )
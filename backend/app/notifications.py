@@ -0,0 +1,156 @@
+"""
+Per-user invite notifications.
+
+Invite events (created / accepted / declined) arrive on every worker via
+the realtime backplane. Each worker keeps:
+
+- an unread (pending) invite count per user, loaded with one COUNT query
+  on first use and then kept current by the events themselves, so the bell
+  badge is served from memory;
+- the open notification streams per user, which get the events pushed.
+"""
+
+import asyncio
+import json
+import threading
+import time
+from typing import Any, AsyncIterator, Callable
+
+from sqlalchemy.orm import Session
+
+from . import models, schemas
+from .realtime import publish_to_users, to_payload
+
+KEEPALIVE_SECONDS = 15
+# Cached counts are re-read after this long, to heal any drift
+COUNT_TTL_SECONDS = 300
+
+INVITE_EVENTS = {"invite_created", "invite_accepted", "invite_declined"}
+
+
+def count_pending_invites(db: Session, user: models.User) -> int:
+    return (
+        db.query(models.ProjectInvite)
+        .filter(
+            models.ProjectInvite.status == "pending",
+            (
+                (models.ProjectInvite.invited_user_id == user.id)
+                | (
+                    (models.ProjectInvite.invited_user_id.is_(None))
+                    & (models.ProjectInvite.invited_email == user.email)
+                )
+            ),
+        )
+        .count()
+    )
+
+
+class InviteNotifications:
+    def __init__(self) -> None:
+        self._counts: dict[int, tuple[int, float]] = {}
+        self._streams: dict[int, set[asyncio.Queue]] = {}
+        self._lock = threading.Lock()
+
+    # ---------- unread count ----------
+
+    def unread_count(self, user_id: int, load: Callable[[], int]) -> int:
+        with self._lock:
+            cached = self._counts.get(user_id)
+        if cached is not None and time.monotonic() - cached[1] < COUNT_TTL_SECONDS:
+            return cached[0]
+
+        count = load()
+        with self._lock:
+            self._counts[user_id] = (count, time.monotonic())
+        return count
+
+    def _adjust(self, user_id: int | None, delta: int) -> int | None:
+        if user_id is None:
+            return None
+        with self._lock:
+            cached = self._counts.get(user_id)
+            if cached is None:
+                return None
+            count = max(0, cached[0] + delta)
+            self._counts[user_id] = (count, cached[1])
+            return count
+
+    # ---------- event feed (hub listener, on the event loop) ----------
+
+    def feed(self, event: dict[str, Any]) -> None:
+        if event.get("type") not in INVITE_EVENTS:
+            return
+
+        invitee_id = event["data"].get("invited_user_id")
+        delta = 1 if event["type"] == "invite_created" else -1
+        count = self._adjust(invitee_id, delta)
+
+        for user_id in event.get("user_ids", ()):
+            frames = [("invite", event)]
+            if user_id == invitee_id and count is not None:
+                frames.append(("unread_count", {"count": count}))
+            for queue in self._streams.get(user_id, ()):
+                for frame in frames:
+                    try:
+                        queue.put_nowait(frame)
+                    except asyncio.QueueFull:
+                        pass
+
+    # ---------- streams ----------
+
+    def subscribe(self, user_id: int) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=100)
+        self._streams.setdefault(user_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, user_id: int, queue: asyncio.Queue) -> None:
+        queues = self._streams.get(user_id)
+        if queues is None:
+            return
+        queues.discard(queue)
+        if not queues:
+            del self._streams[user_id]
+
+
+notifications = InviteNotifications()
+
+
+def _format(event: str, data: dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def event_source(
+    request: Any,
+    user_id: int,
+    queue: asyncio.Queue,
+    initial_count: int,
+) -> AsyncIterator[str]:
+    try:
+        yield "retry: 3000\n\n"
+        yield _format("unread_count", {"count": initial_count})
+        while True:
+            if await request.is_disconnected():
+                break
+            try:
+                event, data = await asyncio.wait_for(queue.get(), timeout=KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+            yield _format(event, data)
+    finally:
+        notifications.unsubscribe(user_id, queue)
+
+
+def publish_invite_event(event_type: str, invite: models.ProjectInvite) -> None:
+    """
+    New invites go to the invitee; answers go to both sides, so the
+    inviter learns the invite was accepted / declined.
+    """
+    data = to_payload(schemas.ProjectInviteWithDetailsOut, invite)
+    data["invited_user_id"] = invite.invited_user_id
+    data["invited_by_id"] = invite.invited_by_id
+
+    user_ids = [invite.invited_user_id]
+    if event_type != "invite_created":
+        user_ids.append(invite.invited_by_id)
+    publish_to_users(event_type, data, user_ids=user_ids)
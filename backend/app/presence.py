@@ -0,0 +1,659 @@
+"""
+Live presence: who is looking at which asset right now.
+
+Each worker tracks the viewers connected to it ("local" viewers), which
+expire unless they heartbeat. An asset socket that is still open counts as
+a heartbeat by itself, so a connected viewer only leaves when the socket
+closes; REST clients heartbeat explicitly.
+
+Expiry uses a timing wheel: one bucket per tick, an entry lives in the bucket
+of the tick it expires on, so a heartbeat is just "move key to another set"
+and expiring is "empty the bucket the clock just reached" - both O(1) per
+viewer, no scans and no DB writes.
+
+With more than one worker, each one also keeps a replica of the others'
+local viewers, fed over the backplane with `presence_sync` events (seen by
+every worker, sent to no socket):
+
+- deltas as local viewers join and leave,
+- every third of the TTL, a digest of the local viewers (count and XOR of
+  key hashes, kept up to date as viewers come and go). A worker whose
+  replica disagrees with the digest twice in a row (a delta got lost), or
+  right away for a worker it has not synced with yet, asks for a full
+  sync; the owner builds and sends it from a thread. Deltas that arrive
+  while it is in flight are applied again on top of it,
+- a worker not heard from for a whole TTL is taken for dead and its
+  viewers are dropped.
+
+So a steady state costs one small event per join or leave plus one per
+worker every TTL/3, however many viewers there are. Snapshots are the
+union of local and replicated viewers, and `presence_joined` /
+`presence_left` go out when a user appears on or disappears from that
+union.
+"""
+
+import asyncio
+import hashlib
+import os
+import socket
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Iterable
+
+from .config import settings
+from .realtime import publish, publish_internal
+
+Key = tuple[int, int]  # (asset_id, user_id)
+
+# Tells this worker's sync events from the others'
+ORIGIN = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+# Viewers per sync event, to stay well under the NOTIFY payload cap
+SYNC_CHUNK = 50
+
+
+def _key_hash(key: Key) -> int:
+    # Same on every worker (unlike hash() of strings), XOR-ed into digests
+    return int.from_bytes(hashlib.blake2b(b"%d:%d" % key, digest_size=8).digest(), "big")
+
+
+@dataclass
+class Viewer:
+    asset_id: int
+    project_id: int
+    user_id: int
+    display_name: str | None
+    picture: str | None
+    joined_at: datetime = field(default_factory=datetime.utcnow)
+    expires_tick: int = 0
+    connections: int = 0
+    # Owning worker's change counter when the viewer last joined, left or
+    # got its first socket (orders deltas against a full sync)
+    seq: int = 0
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "asset_id": self.asset_id,
+            "user_id": self.user_id,
+            "display_name": self.display_name,
+            "picture": self.picture,
+            "joined_at": self.joined_at.isoformat(),
+        }
+
+    def to_wire(self) -> dict[str, Any]:
+        return {
+            **self.to_dict(),
+            "project_id": self.project_id,
+            "connections": self.connections,
+            "seq": self.seq,
+        }
+
+    @classmethod
+    def from_wire(cls, data: dict[str, Any]) -> "Viewer":
+        return cls(
+            asset_id=data["asset_id"],
+            project_id=data["project_id"],
+            user_id=data["user_id"],
+            display_name=data.get("display_name"),
+            picture=data.get("picture"),
+            joined_at=datetime.fromisoformat(data["joined_at"]),
+            connections=data.get("connections", 0),
+            seq=data.get("seq", 0),
+        )
+
+
+@dataclass
+class _Peer:
+    """This worker's replica of another worker's local viewers."""
+
+    seen_at: float
+    keys: set[Key] = field(default_factory=set)
+    digest: int = 0
+    # Whether the replica ever matched the peer's digest or a full sync
+    synced: bool = False
+    mismatches: int = 0
+    # Full sync asked for and not complete yet
+    requested_at: float | None = None
+    # (seq, viewer joined | key left) applied since the request
+    replay: list[tuple[int, Any]] = field(default_factory=list)
+    incoming: dict[Key, Viewer] | None = None
+
+
+class PresenceTracker:
+    def __init__(self, ttl_seconds: float = 30.0, tick_seconds: float = 1.0) -> None:
+        self.ttl_seconds = ttl_seconds
+        self.tick_seconds = tick_seconds
+        self.ttl_ticks = max(1, int(round(ttl_seconds / tick_seconds)))
+        # +1 so a freshly scheduled entry never lands in the bucket being drained
+        self._wheel: list[set[Key]] = [set() for _ in range(self.ttl_ticks + 1)]
+        self._cursor = self._now_tick()
+
+        self._viewers: dict[Key, Viewer] = {}
+        self._by_asset: dict[int, set[int]] = {}
+        self._by_project: dict[int, set[Key]] = {}
+        # Change counter and digest of the local viewers
+        self._seq = 0
+        self._digest = 0
+
+        # Other workers' viewers: key -> origin -> viewer
+        self._remote: dict[Key, dict[str, Viewer]] = {}
+        self._remote_by_asset: dict[int, set[int]] = {}
+        self._remote_by_project: dict[int, set[Key]] = {}
+        self._peers: dict[str, _Peer] = {}
+
+        # REST heartbeats arrive on threadpool threads, sockets on the loop
+        self._lock = threading.Lock()
+
+    def _now_tick(self) -> int:
+        return int(time.monotonic() / self.tick_seconds)
+
+    def _schedule(self, viewer: Viewer) -> None:
+        key = (viewer.asset_id, viewer.user_id)
+        self._wheel[viewer.expires_tick % len(self._wheel)].discard(key)
+        viewer.expires_tick = self._now_tick() + self.ttl_ticks
+        self._wheel[viewer.expires_tick % len(self._wheel)].add(key)
+
+    @staticmethod
+    def _unindex(by_asset: dict[int, set[int]], by_project: dict[int, set[Key]], viewer: Viewer) -> None:
+        key = (viewer.asset_id, viewer.user_id)
+        users = by_asset.get(viewer.asset_id)
+        if users is not None:
+            users.discard(viewer.user_id)
+            if not users:
+                del by_asset[viewer.asset_id]
+
+        keys = by_project.get(viewer.project_id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del by_project[viewer.project_id]
+
+    def _remove(self, key: Key) -> Viewer | None:
+        viewer = self._viewers.pop(key, None)
+        if viewer is None:
+            return None
+        self._wheel[viewer.expires_tick % len(self._wheel)].discard(key)
+        self._unindex(self._by_asset, self._by_project, viewer)
+        self._seq += 1
+        viewer.seq = self._seq
+        self._digest ^= _key_hash(key)
+        return viewer
+
+    def _peer(self, origin: str) -> _Peer:
+        peer = self._peers.get(origin)
+        if peer is None:
+            peer = self._peers[origin] = _Peer(seen_at=time.monotonic())
+        return peer
+
+    def _add_remote(self, origin: str, viewer: Viewer) -> None:
+        key = (viewer.asset_id, viewer.user_id)
+        claims = self._remote.setdefault(key, {})
+        if not claims:
+            self._remote_by_asset.setdefault(viewer.asset_id, set()).add(viewer.user_id)
+            self._remote_by_project.setdefault(viewer.project_id, set()).add(key)
+        if origin not in claims:
+            peer = self._peer(origin)
+            peer.keys.add(key)
+            peer.digest ^= _key_hash(key)
+        claims[origin] = viewer
+
+    def _remove_remote(self, key: Key, origin: str) -> Viewer | None:
+        claims = self._remote.get(key)
+        if not claims or origin not in claims:
+            return None
+        viewer = claims.pop(origin)
+        if not claims:
+            del self._remote[key]
+            self._unindex(self._remote_by_asset, self._remote_by_project, viewer)
+        peer = self._peers.get(origin)
+        if peer is not None:
+            peer.keys.discard(key)
+            peer.digest ^= _key_hash(key)
+        return viewer
+
+    def _present(self, key: Key) -> bool:
+        return key in self._viewers or key in self._remote
+
+    def present(self, asset_id: int, user_id: int) -> bool:
+        """Whether the user is viewing the asset on any worker."""
+        with self._lock:
+            return self._present((asset_id, user_id))
+
+    def elsewhere(self, asset_id: int, user_id: int) -> bool:
+        """Whether another worker has the user viewing the asset."""
+        with self._lock:
+            return (asset_id, user_id) in self._remote
+
+    # ---------- mutations (return the local viewer when it joined/left) ----------
+
+    def heartbeat(
+        self,
+        asset_id: int,
+        project_id: int,
+        user_id: int,
+        display_name: str | None = None,
+        picture: str | None = None,
+        connect: bool = False,
+    ) -> tuple[Viewer, bool]:
+        """Add or refresh a local viewer; returns it and whether it joined."""
+        key = (asset_id, user_id)
+        with self._lock:
+            viewer = self._viewers.get(key)
+            joined = viewer is None
+            if joined:
+                viewer = Viewer(asset_id, project_id, user_id, display_name, picture)
+                self._viewers[key] = viewer
+                self._by_asset.setdefault(asset_id, set()).add(user_id)
+                self._by_project.setdefault(project_id, set()).add(key)
+                self._digest ^= _key_hash(key)
+            if connect:
+                viewer.connections += 1
+            if joined or (connect and viewer.connections == 1):
+                self._seq += 1
+                viewer.seq = self._seq
+            self._schedule(viewer)
+        return viewer, joined
+
+    def touch(self, asset_id: int, user_id: int) -> bool:
+        """
+        Refresh an existing local viewer. False if they are not (or no
+        longer) present on this worker.
+        """
+        key = (asset_id, user_id)
+        with self._lock:
+            viewer = self._viewers.get(key)
+            if viewer is None:
+                return False
+            self._schedule(viewer)
+            return True
+
+    def leave(self, asset_id: int, user_id: int, disconnect: bool = False) -> Viewer | None:
+        key = (asset_id, user_id)
+        with self._lock:
+            viewer = self._viewers.get(key)
+            if viewer is None:
+                return None
+            if disconnect:
+                viewer.connections = max(0, viewer.connections - 1)
+                # Another tab still has a socket open on this asset
+                if viewer.connections:
+                    return None
+            return self._remove(key)
+
+    def drop_socketless(self, asset_id: int, user_id: int) -> list[Viewer]:
+        """
+        Explicit leave: forget the user's local and replicated entries that
+        have no open socket. Returns the entries removed.
+        """
+        key = (asset_id, user_id)
+        removed: list[Viewer] = []
+        with self._lock:
+            for origin, claim in list(self._remote.get(key, {}).items()):
+                if not claim.connections:
+                    removed.append(self._remove_remote(key, origin))
+            viewer = self._viewers.get(key)
+            if viewer is not None and not viewer.connections:
+                removed.append(self._remove(key))
+        return removed
+
+    def expire(self) -> list[Viewer]:
+        """
+        Advance the wheel to "now" and drop everyone whose TTL ran out.
+        Viewers with an open socket are kept: the socket is the heartbeat.
+        """
+        expired: list[Viewer] = []
+        with self._lock:
+            now = self._now_tick()
+            # Never spin more than one full turn, even after a long stall
+            start = max(self._cursor + 1, now - len(self._wheel) + 1)
+            for tick in range(start, now + 1):
+                bucket = self._wheel[tick % len(self._wheel)]
+                for key in list(bucket):
+                    viewer = self._viewers.get(key)
+                    if viewer is None or viewer.expires_tick > tick:
+                        continue
+                    if viewer.connections:
+                        self._schedule(viewer)
+                    else:
+                        self._remove(key)
+                        expired.append(viewer)
+            self._cursor = now
+        return expired
+
+    # ---------- replicas of other workers ----------
+
+    def local_digest(self) -> tuple[int, int]:
+        """(digest, count) of the local viewers, for the periodic sync."""
+        with self._lock:
+            return self._digest, len(self._viewers)
+
+    def snapshot(self) -> tuple[int, list[Viewer]]:
+        """Change counter and local viewers, for a full sync."""
+        with self._lock:
+            return self._seq, list(self._viewers.values())
+
+    def apply_delta(
+        self, origin: str, viewers: Iterable[Viewer], left: Iterable[tuple[Key, int]]
+    ) -> list[Viewer]:
+        """
+        Apply `origin`'s joins (`viewers`) and leaves (`left`: key, seq);
+        returns the viewers of users now gone everywhere.
+        """
+        gone: list[Viewer] = []
+        with self._lock:
+            peer = self._peer(origin)
+            peer.seen_at = time.monotonic()
+            pending = peer.requested_at is not None
+            for viewer in viewers:
+                self._add_remote(origin, viewer)
+                if pending:
+                    peer.replay.append((viewer.seq, viewer))
+            for key, seq in left:
+                viewer = self._remove_remote(key, origin)
+                if viewer is not None and not self._present(key):
+                    gone.append(viewer)
+                if pending:
+                    peer.replay.append((seq, key))
+        return gone
+
+    def check_digest(self, origin: str, digest: int, count: int) -> bool:
+        """
+        Compare the replica of `origin` with its digest. True if a full
+        sync should be requested (it is then recorded as pending).
+        """
+        now = time.monotonic()
+        with self._lock:
+            peer = self._peer(origin)
+            peer.seen_at = now
+            if peer.requested_at is not None and now - peer.requested_at < self.ttl_seconds:
+                return False
+            if peer.digest == digest and len(peer.keys) == count:
+                peer.synced = True
+                peer.mismatches = 0
+                peer.requested_at = None
+                return False
+            peer.mismatches += 1
+            # Once can be a delta published just after the digest was taken
+            if peer.synced and peer.mismatches < 2 and peer.requested_at is None:
+                return False
+            peer.mismatches = 0
+            peer.requested_at = now
+            peer.replay = []
+            peer.incoming = None
+            return True
+
+    def apply_full_sync(
+        self, origin: str, seq: int, viewers: Iterable[Viewer], first: bool, last: bool
+    ) -> list[Viewer]:
+        """
+        One part of `origin`'s full sync (taken at its change counter
+        `seq`). On the last part the replica is replaced and the deltas
+        received since the request are replayed; returns the viewers of
+        users now gone everywhere.
+        """
+        with self._lock:
+            peer = self._peer(origin)
+            peer.seen_at = time.monotonic()
+            if peer.requested_at is None:
+                # Requested by another worker
+                return []
+            if first:
+                peer.incoming = {}
+            if peer.incoming is None:
+                # Came in halfway through; the request is repeated after a TTL
+                return []
+            for viewer in viewers:
+                peer.incoming[(viewer.asset_id, viewer.user_id)] = viewer
+            if not last:
+                return []
+
+            incoming, peer.incoming = peer.incoming, None
+            replay, peer.replay = peer.replay, []
+            peer.requested_at = None
+            peer.synced = True
+            removed = [self._remove_remote(key, origin) for key in peer.keys - incoming.keys()]
+            for viewer in incoming.values():
+                self._add_remote(origin, viewer)
+            for change_seq, change in sorted(replay, key=lambda item: item[0]):
+                if change_seq <= seq:
+                    continue
+                if isinstance(change, Viewer):
+                    self._add_remote(origin, change)
+                else:
+                    self._remove_remote(change, origin)
+            return [
+                viewer
+                for viewer in removed
+                if not self._present((viewer.asset_id, viewer.user_id))
+            ]
+
+    def prune_peers(self, max_age: float) -> list[Viewer]:
+        """
+        Forget workers not heard from within `max_age` seconds; returns the
+        viewers of users now gone everywhere.
+        """
+        cutoff = time.monotonic() - max_age
+        gone: list[Viewer] = []
+        with self._lock:
+            for origin, peer in list(self._peers.items()):
+                if peer.seen_at >= cutoff:
+                    continue
+                for key in list(peer.keys):
+                    viewer = self._remove_remote(key, origin)
+                    if viewer is not None and not self._present(key):
+                        gone.append(viewer)
+                del self._peers[origin]
+        return gone
+
+    # ---------- reads ----------
+
+    def _merged(self, key: Key) -> Viewer:
+        # Local entry if there is one, else the earliest replicated one
+        viewer = self._viewers.get(key)
+        if viewer is not None:
+            return viewer
+        return min(self._remote[key].values(), key=lambda v: v.joined_at)
+
+    def asset_viewers(self, asset_id: int) -> list[dict[str, Any]]:
+        with self._lock:
+            users = self._by_asset.get(asset_id, set()) | self._remote_by_asset.get(asset_id, set())
+            return [self._merged((asset_id, uid)).to_dict() for uid in users]
+
+    def project_viewers(self, project_id: int) -> dict[int, list[dict[str, Any]]]:
+        with self._lock:
+            keys = self._by_project.get(project_id, set()) | self._remote_by_project.get(
+                project_id, set()
+            )
+            grouped: dict[int, list[dict[str, Any]]] = {}
+            for key in keys:
+                viewer = self._merged(key)
+                grouped.setdefault(viewer.asset_id, []).append(viewer.to_dict())
+            return grouped
+
+    def __len__(self) -> int:
+        return len(self._viewers)
+
+
+tracker = PresenceTracker(
+    ttl_seconds=settings.PRESENCE_TTL_SECONDS,
+    tick_seconds=settings.PRESENCE_TICK_SECONDS,
+)
+
+
+# ---------- helpers used by routers / sockets (publish deltas) ----------
+
+
+def _publish_join(viewer: Viewer) -> None:
+    publish("presence_joined", viewer.to_dict(), viewer.project_id, viewer.asset_id)
+
+
+def _publish_leave(viewer: Viewer) -> None:
+    publish("presence_left", viewer.to_dict(), viewer.project_id, viewer.asset_id)
+
+
+def _publish_sync(kind: str, **data: Any) -> None:
+    if settings.REALTIME_BACKPLANE == "memory":
+        # Single worker: nobody to tell
+        return
+    publish_internal("presence_sync", {"origin": ORIGIN, "kind": kind, **data})
+
+
+def _sync(
+    viewers: list[Viewer] = (),
+    left: list[tuple[Key, int]] = (),
+    announced: bool = True,
+    everywhere: bool = False,
+) -> None:
+    """
+    Tell the other workers about local viewers (`viewers`: joined or got a
+    socket, `left`: keys and seq of those gone). `announced` says whether
+    presence_left already went out for `left`; `everywhere` asks them to
+    drop the users' socketless entries too (explicit leave).
+    """
+    for i in range(0, max(len(viewers), len(left)), SYNC_CHUNK):
+        _publish_sync(
+            "delta",
+            viewers=[v.to_wire() for v in viewers[i : i + SYNC_CHUNK]],
+            left=[[*key, seq] for key, seq in left[i : i + SYNC_CHUNK]],
+            announced=announced,
+            everywhere=everywhere,
+        )
+
+
+_full_sync_lock = threading.Lock()
+_full_sync_queued = False
+
+
+def _send_full_sync() -> None:
+    """All local viewers, in parts. Runs in a thread, one at a time."""
+    global _full_sync_queued
+    with _full_sync_lock:
+        # Requests arriving from here on need a newer snapshot
+        _full_sync_queued = False
+        seq, viewers = tracker.snapshot()
+        wire = [viewer.to_wire() for viewer in viewers]
+        for i in range(0, max(len(wire), 1), SYNC_CHUNK):
+            _publish_sync(
+                "full",
+                seq=seq,
+                viewers=wire[i : i + SYNC_CHUNK],
+                first=i == 0,
+                last=i + SYNC_CHUNK >= len(wire),
+            )
+
+
+def _schedule_full_sync() -> None:
+    global _full_sync_queued
+    if _full_sync_queued:
+        # The queued one has not taken its snapshot yet and will do
+        return
+    _full_sync_queued = True
+    asyncio.get_running_loop().run_in_executor(None, _send_full_sync)
+
+
+def join(asset_id: int, project_id: int, user: Any, connect: bool = False) -> None:
+    viewer, joined = tracker.heartbeat(
+        asset_id,
+        project_id,
+        user.id,
+        display_name=user.display_name or user.email,
+        picture=user.picture,
+        connect=connect,
+    )
+    if joined:
+        if not tracker.elsewhere(asset_id, user.id):
+            _publish_join(viewer)
+        _sync([viewer])
+    elif connect and viewer.connections == 1:
+        # Now held by a socket, which an explicit leave elsewhere must not drop
+        _sync([viewer])
+
+
+def leave(asset_id: int, user_id: int, disconnect: bool = False) -> None:
+    key = (asset_id, user_id)
+    if disconnect:
+        viewer = tracker.leave(asset_id, user_id, disconnect=True)
+        if viewer is None:
+            return
+        announced = not tracker.present(asset_id, user_id)
+        if announced:
+            _publish_leave(viewer)
+        _sync(left=[(key, viewer.seq)], announced=announced)
+        return
+
+    # Explicit leave (REST): the user stopped viewing, on every worker,
+    # except where a socket of theirs is still open
+    removed = tracker.drop_socketless(asset_id, user_id)
+    if removed and not tracker.present(asset_id, user_id):
+        _publish_leave(removed[0])
+    # Not ordered (seq 0): should a full sync in flight undo it, the next
+    # digests disagree and ask for another
+    _sync(left=[(key, 0)], everywhere=True)
+
+
+def feed(event: dict[str, Any]) -> None:
+    """
+    Hub listener; applies other workers' presence_sync events.
+    """
+    if event.get("type") != "presence_sync":
+        return
+    data = event["data"]
+    origin = data["origin"]
+    if origin == ORIGIN:
+        return
+    kind = data.get("kind")
+
+    if kind == "digest":
+        if tracker.check_digest(origin, data["digest"], data["count"]):
+            _publish_sync("request", target=origin)
+        return
+    if kind == "request":
+        if data.get("target") == ORIGIN:
+            _schedule_full_sync()
+        return
+    if kind == "full":
+        viewers = [Viewer.from_wire(v) for v in data["viewers"]]
+        for viewer in tracker.apply_full_sync(
+            origin, data["seq"], viewers, data["first"], data["last"]
+        ):
+            _publish_leave(viewer)
+        return
+
+    left = [((asset_id, user_id), seq) for asset_id, user_id, seq in data["left"]]
+    gone = tracker.apply_delta(origin, [Viewer.from_wire(v) for v in data["viewers"]], left)
+    if data.get("everywhere"):
+        # The sender decided about presence_left for these users
+        for (asset_id, user_id), _ in left:
+            tracker.drop_socketless(asset_id, user_id)
+        return
+    if not data.get("announced", True):
+        # The sender saw the user elsewhere, but they are gone here too
+        for viewer in gone:
+            _publish_leave(viewer)
+
+
+async def run_expiry_loop() -> None:
+    digest_every = max(tracker.tick_seconds, tracker.ttl_seconds / 3)
+    next_digest = time.monotonic()
+    while True:
+        await asyncio.sleep(tracker.tick_seconds)
+        announced: list[tuple[Key, int]] = []
+        unannounced: list[tuple[Key, int]] = []
+        for viewer in tracker.expire():
+            key = (viewer.asset_id, viewer.user_id)
+            if tracker.present(*key):
+                unannounced.append((key, viewer.seq))
+            else:
+                _publish_leave(viewer)
+                announced.append((key, viewer.seq))
+        _sync(left=announced)
+        _sync(left=unannounced, announced=False)
+
+        if time.monotonic() >= next_digest:
+            next_digest = time.monotonic() + digest_every
+            digest, count = tracker.local_digest()
+            _publish_sync("digest", digest=digest, count=count)
+            for viewer in tracker.prune_peers(tracker.ttl_seconds):
+                _publish_leave(viewer)
@@ -0,0 +1,318 @@
+"""
+Real-time hub.
+
+WebSocket connections join rooms ("project:<id>", "asset:<id>") and routers
+call `publish(...)` after they commit. The event goes to the backplane once
+(see backplane.py); every worker gets it back via `hub.deliver` and queues
+it on the sockets it holds locally.
+
+A frame sent to a client is either one event or, when several were queued
+within the batch window, {"type": "batch", "events": [...]}.
+"""
+
+import asyncio
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Callable
+
+from fastapi import WebSocket
+
+from . import metrics, schemas
+from .backplane import Backplane, create_backplane
+from .config import settings
+
+
+def project_room(project_id: int) -> str:
+    return f"project:{project_id}"
+
+
+def asset_room(asset_id: int) -> str:
+    return f"asset:{asset_id}"
+
+
+def user_room(user_id: int) -> str:
+    return f"user:{user_id}"
+
+
+# ---------- metrics ----------
+
+EVENTS_QUEUED = metrics.counter(
+    "realtime_events_queued_total", "Events queued for delivery to sockets"
+)
+EVENTS_COALESCED = metrics.counter(
+    "realtime_events_coalesced_total", "Events merged into a newer event for the same key"
+)
+EVENTS_DROPPED = metrics.counter(
+    "realtime_events_dropped_total", "Events dropped because a consumer fell behind"
+)
+FRAMES_SENT = metrics.counter("realtime_frames_sent_total", "WebSocket frames sent")
+SLOW_DISCONNECTS = metrics.counter(
+    "realtime_slow_consumer_disconnects_total", "Sockets closed for falling behind"
+)
+QUEUE_DEPTH = metrics.gauge(
+    "realtime_queue_depth", "Events waiting across all socket send queues"
+)
+QUEUE_DEPTH_MAX = metrics.gauge(
+    "realtime_queue_depth_max", "Deepest single socket send queue seen"
+)
+CONNECTIONS = metrics.gauge("realtime_connections", "Open real-time sockets")
+
+
+def _coalesce_key(event: dict[str, Any]) -> tuple | None:
+    """
+    Events where only the latest state matters share a key; a newer one
+    replaces an older one that has not been sent yet.
+    """
+    event_type = event.get("type")
+    data = event.get("data") or {}
+    if event_type in ("reaction_toggled", "asset_status_changed"):
+        # Payload is the full comment / asset, so the last one is the summary
+        return (event_type, data.get("id"))
+    if event_type in ("presence_joined", "presence_left"):
+        return ("presence", data.get("asset_id"), data.get("user_id"))
+    return None
+
+
+class Connection:
+    """
+    One socket with a bounded send queue drained by its own sender task.
+    Events are micro-batched: everything queued within `batch_seconds`
+    goes out as one frame. A consumer whose queue overflows, or whose send
+    stalls past `send_timeout`, is disconnected (it can reconnect and
+    resync) rather than letting the server buffer without limit.
+    """
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        rooms: list[str],
+        max_queue: int,
+        batch_seconds: float,
+        send_timeout: float,
+    ) -> None:
+        self.websocket = websocket
+        self.rooms = rooms
+        self.max_queue = max_queue
+        self.batch_seconds = batch_seconds
+        self.send_timeout = send_timeout
+        self._pending: OrderedDict[Any, dict[str, Any]] = OrderedDict()
+        self._seq = 0
+        self._wakeup = asyncio.Event()
+        self._closed = False
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def enqueue(self, event: dict[str, Any]) -> None:
+        if self._closed:
+            return
+
+        key = _coalesce_key(event)
+        if key is not None and key in self._pending:
+            # Replace in place of the old one, keeping order with later events
+            del self._pending[key]
+            EVENTS_COALESCED.inc()
+            QUEUE_DEPTH.dec()
+        elif len(self._pending) >= self.max_queue:
+            EVENTS_DROPPED.inc(len(self._pending) + 1)
+            QUEUE_DEPTH.dec(len(self._pending))
+            self._pending.clear()
+            self._disconnect_slow()
+            return
+
+        if key is None:
+            self._seq += 1
+            key = self._seq
+        self._pending[key] = event
+        EVENTS_QUEUED.inc()
+        QUEUE_DEPTH.inc()
+        if len(self._pending) > QUEUE_DEPTH_MAX.value():
+            QUEUE_DEPTH_MAX.set(len(self._pending))
+        self._wakeup.set()
+
+    async def _run(self) -> None:
+        try:
+            while not self._closed:
+                await self._wakeup.wait()
+                # Let more events pile up so they share a frame
+                if self.batch_seconds:
+                    await asyncio.sleep(self.batch_seconds)
+                self._wakeup.clear()
+
+                batch = list(self._pending.values())
+                self._pending.clear()
+                QUEUE_DEPTH.dec(len(batch))
+                if not batch:
+                    continue
+
+                frame = batch[0] if len(batch) == 1 else {"type": "batch", "events": batch}
+                try:
+                    await asyncio.wait_for(
+                        self.websocket.send_json(frame), timeout=self.send_timeout
+                    )
+                except asyncio.TimeoutError:
+                    self._disconnect_slow()
+                    return
+                except Exception:
+                    # Socket already gone; the receive loop will clean up
+                    self._closed = True
+                    return
+                FRAMES_SENT.inc()
+        except asyncio.CancelledError:
+            pass
+
+    def _disconnect_slow(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        SLOW_DISCONNECTS.inc()
+        asyncio.get_running_loop().create_task(self._close(1013))
+
+    async def _close(self, code: int) -> None:
+        try:
+            await self.websocket.close(code=code)
+        except Exception:
+            pass
+
+    def stop(self) -> None:
+        self._closed = True
+        QUEUE_DEPTH.dec(len(self._pending))
+        self._pending.clear()
+        if self._task is not None:
+            self._task.cancel()
+
+
+class Hub:
+    def __init__(self) -> None:
+        self._rooms: dict[str, set[Connection]] = {}
+        # Non-socket consumers (e.g. SSE streams) that see every event
+        self._listeners: list[Callable[[dict[str, Any]], None]] = []
+
+    def add_listener(self, listener: Callable[[dict[str, Any]], None]) -> None:
+        if listener not in self._listeners:
+            self._listeners.append(listener)
+
+    def connect(self, websocket: WebSocket, rooms: list[str]) -> Connection:
+        conn = Connection(
+            websocket,
+            rooms,
+            max_queue=settings.REALTIME_MAX_QUEUE,
+            batch_seconds=settings.REALTIME_BATCH_MS / 1000,
+            send_timeout=settings.REALTIME_SEND_TIMEOUT_SECONDS,
+        )
+        for room in rooms:
+            self._rooms.setdefault(room, set()).add(conn)
+        conn.start()
+        CONNECTIONS.inc()
+        return conn
+
+    def disconnect(self, conn: Connection) -> None:
+        conn.stop()
+        for room in conn.rooms:
+            members = self._rooms.get(room)
+            if not members:
+                continue
+            members.discard(conn)
+            if not members:
+                del self._rooms[room]
+        CONNECTIONS.dec()
+
+    def room_size(self, room: str) -> int:
+        return len(self._rooms.get(room, ()))
+
+    def broadcast(self, rooms: list[str], event: dict[str, Any]) -> None:
+        seen: set[int] = set()
+        for room in rooms:
+            for conn in self._rooms.get(room, ()):
+                # A socket in both the project and asset room gets it once
+                if id(conn) not in seen:
+                    seen.add(id(conn))
+                    conn.enqueue(event)
+
+    def deliver(self, message: dict[str, Any]) -> None:
+        """
+        Backplane callback (runs on the event loop).
+        """
+        for listener in self._listeners:
+            listener(message["event"])
+
+        self.broadcast(message.get("rooms") or [], message["event"])
+
+
+hub = Hub()
+backplane: Backplane = create_backplane()
+
+
+async def start() -> None:
+    await backplane.start(hub.deliver)
+
+
+async def stop() -> None:
+    await backplane.stop()
+
+
+def publish(
+    event_type: str,
+    data: dict[str, Any],
+    project_id: int,
+    asset_id: int | None = None,
+) -> None:
+    """
+    Push an event to everyone watching the project (and the asset, if given).
+    """
+    rooms = [project_room(project_id)]
+    if asset_id is not None:
+        rooms.append(asset_room(asset_id))
+
+    event = {
+        "type": event_type,
+        "project_id": project_id,
+        "asset_id": asset_id,
+        "data": data,
+        "sent_at": datetime.utcnow().isoformat(),
+    }
+    backplane.publish({"rooms": rooms, "event": event})
+
+
+def publish_to_users(
+    event_type: str,
+    data: dict[str, Any],
+    user_ids: list[int],
+) -> None:
+    """
+    Push a personal event (e.g. invites) to the given users on every worker.
+    """
+    user_ids = sorted({uid for uid in user_ids if uid is not None})
+    if not user_ids:
+        return
+    event = {
+        "type": event_type,
+        "user_ids": user_ids,
+        "data": data,
+        "sent_at": datetime.utcnow().isoformat(),
+    }
+    backplane.publish({"rooms": [user_room(uid) for uid in user_ids], "event": event})
+
+
+def publish_internal(event_type: str, data: dict[str, Any]) -> None:
+    """
+    Send an event to the hub listeners of every worker but to no socket
+    (state replication between workers, e.g. presence).
+    """
+    backplane.publish({"rooms": [], "event": {"type": event_type, "data": data}})
+
+
+def to_payload(schema: type, obj: Any) -> dict[str, Any]:
+    """
+    Serialize an ORM object with its response schema (JSON-safe types).
+    """
+    return schema.model_validate(obj, from_attributes=True).model_dump(mode="json")
+
+
+def publish_activity(activity: Any) -> None:
+    publish(
+        "activity_created",
+        to_payload(schemas.ActivityOut, activity),
+        project_id=activity.project_id,
+    )
@@ -1,13 +1,41 @@
+import base64
+import binascii
+from datetime import datetime
+from functools import partial
 from typing import List
 
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import and_, or_, select, true
+from sqlalchemy.orm import Session, selectinload
+from starlette.concurrency import run_in_threadpool
 
 from .. import models, schemas
-from ..deps import get_db, get_current_user_from_header
+from ..activity_stream import event_source, replay_from_db, stream
+from ..database import SessionLocal
+from ..deps import (
+    get_db,
+    get_current_user,
+    get_current_user_from_header,
+    get_token_from_header_or_query,
+)
 
 router = APIRouter(prefix="/projects", tags=["activity"])
 
+# User-wide activity (across every project the user can see)
+user_router = APIRouter(prefix="/activity", tags=["activity"])
+
+
+def _visible_project_ids(user_id: int):
+    """
+    SELECT of every project id the user owns or participates in.
+    """
+    owned = select(models.Project.id.label("id")).where(models.Project.owner_id == user_id)
+    joined = select(models.ProjectParticipant.project_id.label("id")).where(
+        models.ProjectParticipant.user_id == user_id
+    )
+    return owned.union(joined)
+
 
 def _assert_can_access_project(
     db: Session,
@@ -54,9 +82,222 @@ def list_activity(
 
     activities = (
         db.query(models.Activity)
+        .options(selectinload(models.Activity.user))
         .filter(models.Activity.project_id == project_id)
         .order_by(models.Activity.created_at.desc())
         .limit(50)
         .all()
     )
     return activities
+
+
+@router.get(
+    "/{project_id}/activity/summary",
+    response_model=List[schemas.ActivityDailySummaryOut],
+)
+def activity_summary(
+    project_id: int,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user_from_header),
+):
+    """
+    Daily event counts for history older than the raw retention window.
+    """
+    _ = _assert_can_access_project(db, current_user.id, project_id)
+
+    return (
+        db.query(models.ActivityDailySummary)
+        .filter(models.ActivityDailySummary.project_id == project_id)
+        .order_by(
+            models.ActivityDailySummary.day.desc(),
+            models.ActivityDailySummary.type.asc(),
+        )
+        .all()
+    )
+
+
+# ---------- Personal feed (all projects, keyset-paginated) ----------
+
+
+def _encode_cursor(activity: models.Activity) -> str:
+    raw = f"{activity.created_at.isoformat()}|{activity.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def _decode_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        created_at, activity_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(created_at), int(activity_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor",
+        )
+
+
+def _older_than(created_at: datetime, activity_id: int):
+    # (created_at, id) < (:created_at, :id), spelled out for SQLite
+    return or_(
+        models.Activity.created_at < created_at,
+        and_(
+            models.Activity.created_at == created_at,
+            models.Activity.id < activity_id,
+        ),
+    )
+
+
+def _feed_scope(db: Session, user_id: int, cursor_filter, limit: int):
+    """
+    Filter for the activity rows that can make the next page.
+
+    On Postgres this takes the newest `limit` rows of each project with a
+    LATERAL join (one short index scan per project on
+    ix_activities_project_id_created_at_id) so the cost does not depend on
+    how much history the user's projects have. Elsewhere a plain IN over
+    the same index is good enough.
+    """
+    visible = _visible_project_ids(user_id).subquery()
+
+    if db.get_bind().dialect.name != "postgresql":
+        return models.Activity.project_id.in_(select(visible.c.id))
+
+    per_project = select(models.Activity.id).where(models.Activity.project_id == visible.c.id)
+    if cursor_filter is not None:
+        per_project = per_project.where(cursor_filter)
+    per_project = (
+        per_project.order_by(models.Activity.created_at.desc(), models.Activity.id.desc())
+        .limit(limit)
+        .lateral()
+    )
+    return models.Activity.id.in_(
+        select(per_project.c.id).select_from(visible.join(per_project, true()))
+    )
+
+
+@user_router.get("/feed", response_model=schemas.ActivityFeedOut)
+def my_activity_feed(
+    cursor: str | None = Query(None),
+    limit: int = Query(50, ge=1, le=200),
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user_from_header),
+):
+    """
+    Activity from every project the user owns or participates in, newest
+    first. Pages are keyed on (created_at, id): pass `next_cursor` back as
+    `?cursor=` to continue; rows written meanwhile never shift the pages.
+    """
+    cursor_filter = _older_than(*_decode_cursor(cursor)) if cursor else None
+    # One row past the page tells whether there is a next one; the
+    # per-project cap must include it too, or a single project never pages
+    fetch = limit + 1
+
+    query = (
+        db.query(models.Activity)
+        .options(selectinload(models.Activity.user))
+        .filter(_feed_scope(db, current_user.id, cursor_filter, fetch))
+    )
+    if cursor_filter is not None:
+        query = query.filter(cursor_filter)
+    rows = (
+        query.order_by(models.Activity.created_at.desc(), models.Activity.id.desc())
+        .limit(fetch)
+        .all()
+    )
+
+    next_cursor = _encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return {"items": rows[:limit], "next_cursor": next_cursor}
+
+
+# ---------- SSE streams ----------
+
+
+def _parse_last_event_id(last_event_id: str | None) -> int | None:
+    if not last_event_id:
+        return None
+    try:
+        return int(last_event_id)
+    except ValueError:
+        return None
+
+
+def _resolve_stream_projects(token: str, project_id: int | None) -> set[int]:
+    """
+    Auth + project scope for a stream, on a short-lived session so the
+    open stream does not hold a DB connection.
+    """
+    db = SessionLocal()
+    try:
+        user = get_current_user(token=token, db=db)
+        if project_id is not None:
+            _assert_can_access_project(db, user.id, project_id)
+            return {project_id}
+
+        return set(db.scalars(_visible_project_ids(user.id)).all())
+    finally:
+        db.close()
+
+
+def _replay_from_db(project_ids: set[int], last_id: int) -> list[dict]:
+    db = SessionLocal()
+    try:
+        return replay_from_db(db, project_ids, last_id)
+    finally:
+        db.close()
+
+
+async def _open_stream(
+    request: Request,
+    token: str,
+    project_id: int | None,
+    last_event_id: str | None,
+) -> StreamingResponse:
+    project_ids = await run_in_threadpool(_resolve_stream_projects, token, project_id)
+
+    # Subscribe before replaying so nothing written in between is lost
+    sub = stream.subscribe(project_ids)
+    backlog: list[dict] = []
+    next_page = None
+    last_id = _parse_last_event_id(last_event_id)
+    if last_id is not None and project_ids:
+        backlog = stream.replay_from_buffer(project_ids, last_id)
+        if backlog is None:
+            next_page = partial(run_in_threadpool, _replay_from_db, project_ids)
+            backlog = await next_page(last_id)
+
+    return StreamingResponse(
+        event_source(request, sub, backlog, next_page),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            # Stop nginx from buffering the stream
+            "X-Accel-Buffering": "no",
+        },
+    )
+
+
+@router.get("/{project_id}/activity/stream")
+async def stream_project_activity(
+    project_id: int,
+    request: Request,
+    token: str = Depends(get_token_from_header_or_query),
+    last_event_id: str | None = Header(None),
+):
+    """
+    Server-Sent Events: new activity rows of one project as they are written.
+    Reconnects with `Last-Event-ID` get everything they missed first.
+    """
+    return await _open_stream(request, token, project_id, last_event_id)
+
+
+@user_router.get("/stream")
+async def stream_my_activity(
+    request: Request,
+    token: str = Depends(get_token_from_header_or_query),
+    last_event_id: str | None = Header(None),
+):
+    """
+    Server-Sent Events for every project the user owns or participates in
+    (the project list is resolved when the stream opens).
+    """
+    return await _open_stream(request, token, None, last_event_id)
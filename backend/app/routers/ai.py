@@ -1,25 +1,41 @@
 # backend/app/routers/ai.py
 import os
-import base64
 from typing import List
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy import and_, or_
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 
-import openai
-from openai import OpenAI
-
-from .. import models
-from ..deps import get_db, get_current_user_from_header
+from .. import (
+    ai_batches,
+    ai_cache,
+    ai_jobs,
+    ai_suggestions,
+    ai_usage,
+    design_checks,
+    models,
+    schemas,
+)
+from ..activity_messages import STATUS_LABELS
+from ..database import SessionLocal
+from ..deps import (
+    get_db,
+    get_current_user,
+    get_current_user_from_header,
+    get_token_from_header_or_query,
+)
 from ..config import settings
 
 router = APIRouter(prefix="/assets", tags=["ai"])
 
-UPLOAD_DIR = "uploads"
+# Job status / result, addressed by job id
+jobs_router = APIRouter(prefix="/ai-jobs", tags=["ai"])
 
-# OpenAI client
-client = OpenAI(api_key=settings.OPENAI_API_KEY)
+# Batch review of a project's assets: created per project, then addressed by id
+project_router = APIRouter(prefix="/projects", tags=["ai"])
+batches_router = APIRouter(prefix="/ai-batches", tags=["ai"])
 
 
 def _get_asset_for_user_or_404(
@@ -61,123 +77,305 @@ def _get_asset_for_user_or_404(
     return asset
 
 
-@router.get("/{asset_id}/ai-suggestions")
-def get_ai_suggestions(
-    asset_id: int,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user_from_header),
-):
-    """
-    Return AI suggestions for an asset image (owner + collaborators).
-    Uses OpenAI Vision (gpt-4o-mini).
-    """
+def _asset_with_file_or_404(db: Session, user_id: int, asset_id: int) -> models.Asset:
+    asset = _get_asset_for_user_or_404(db, user_id, asset_id)
+
+    image_path = ai_suggestions.asset_path(asset)
+    if not os.path.exists(image_path):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Asset image file not found on server",
+        )
+
+    if asset.content_hash is None:
+        # Uploaded before hashes were recorded
+        asset.content_hash = ai_cache.file_sha256(image_path)
+        db.commit()
+    return asset
+
+
+def _ensure_ai_configured() -> None:
     if not settings.OPENAI_API_KEY:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="AI is not configured on the server (missing API key).",
         )
 
-    asset = _get_asset_for_user_or_404(db, current_user.id, asset_id)
 
-    image_path = os.path.join(UPLOAD_DIR, asset.file_path)
-    if not os.path.exists(image_path):
+def _ensure_budget(project_id: int, user_id: int) -> None:
+    try:
+        ai_usage.budgets.check(ai_usage.CallContext(project_id, user_id))
+    except ai_usage.AIBudgetExceededError as e:
         raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Asset image file not found on server",
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=str(e),
         )
 
-    # Detect mime type from file extension
-    ext = os.path.splitext(asset.file_path.lower())[1]
-    if ext in [".jpg", ".jpeg"]:
-        mime = "image/jpeg"
-    elif ext == ".webp":
-        mime = "image/webp"
-    else:
-        mime = "image/png"
 
-    try:
-        # Read image and encode as base64 data URL
-        with open(image_path, "rb") as f:
-            image_bytes = f.read()
-        b64 = base64.b64encode(image_bytes).decode("utf-8")
-        data_url = f"data:{mime};base64,{b64}"
-
-        prompt = (
-            "You are a design review assistant helping a team give feedback on a document. "
-        "Analyze the attached image and return 3–7 short, concrete suggestions on how to "
-        "improve it for UI/UX, visual clarity, or presentation. "
-        "Be specific (e.g., 'increase padding around buttons', 'align text with grid', "
-        "'brighten background slightly'), and assume a generic web/app context. If the file is not an image and is a word document or pdf or excel sheet,"
-        " provide suggestions for improving the document's layout, formatting, or content clarity."
+def _get_job_for_user_or_404(db: Session, user_id: int, job_id: int) -> models.AIJob:
+    job = db.query(models.AIJob).filter(models.AIJob.id == job_id).first()
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Job not found",
         )
+    # Same visibility as the asset it analyses
+    _get_asset_for_user_or_404(db, user_id, job.asset_id)
+    return job
+
 
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {
-                    "role": "system",
-                    "content": "You provide concise, actionable design feedback.",
-                },
-                {
-                    "role": "user",
-                    "content": [
-                        {"type": "text", "text": prompt},
-                        {
-                            "type": "image_url",
-                            "image_url": {"url": data_url},
-                        },
-                    ],
-                },
-            ],
-            temperature=0.4,
+def _assert_can_access_project(db: Session, user_id: int, project_id: int) -> models.Project:
+    project = db.query(models.Project).filter(models.Project.id == project_id).first()
+    if not project:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Project not found",
         )
 
-        text = response.choices[0].message.content or ""
-        # Turn the model output into a clean list of suggestions
-        lines = [line.strip() for line in text.split("\n") if line.strip()]
-        suggestions: List[str] = []
-        for line in lines:
-            # Strip leading bullets / numbering
-            cleaned = line.lstrip("-•").strip()
-            # Remove leading "1.", "2)" etc.
-            if cleaned[:2].isdigit():
-                cleaned = cleaned[2:].lstrip("). ").strip()
-            suggestions.append(cleaned)
-
-        if not suggestions:
-            # Fallback if parsing fails
-            if text.strip():
-                suggestions = [text.strip()]
-            else:
-                suggestions = [
-                    "Increase brightness and contrast for better visibility.",
-                    "Crop slightly to center the main subject.",
-                    "Reduce background distractions to keep focus on the subject.",
-                ]
-
-    except openai.AuthenticationError:
+    if project.owner_id == user_id:
+        return project
+
+    membership = (
+        db.query(models.ProjectParticipant)
+        .filter(
+            models.ProjectParticipant.project_id == project_id,
+            models.ProjectParticipant.user_id == user_id,
+        )
+        .first()
+    )
+    if not membership:
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="AI authentication failed. Check the server API key.",
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="You do not have access to this project",
         )
-    except openai.RateLimitError:
+    return project
+
+
+def _get_batch_for_user_or_404(db: Session, user_id: int, batch_id: int) -> models.AIBatch:
+    batch = ai_batches.load(db, batch_id)
+    if not batch:
         raise HTTPException(
-            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-            detail="AI rate limit reached. Please try again in a bit.",
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Batch not found",
         )
-    except (openai.APIError, openai.APIConnectionError) as e:
-        # Log to server console for debugging
-        print("OpenAI API error:", repr(e))
+    _assert_can_access_project(db, user_id, batch.project_id)
+    return batch
+
+
+@router.get("/{asset_id}/ai-suggestions")
+def get_ai_suggestions(
+    asset_id: int,
+    response: Response,
+    refresh: bool = Query(False),
+    local_only: bool = Query(False),
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user_from_header),
+):
+    """
+    Return AI suggestions for an asset image (owner + collaborators).
+    Images first get local design checks (contrast heatmap, clutter,
+    whitespace, palette; see app.design_checks), whose findings lead the
+    `suggestions` list and whose full report is under `checks`.
+    Model suggestions (OpenAI Vision, gpt-4o-mini) are computed by
+    background jobs (queued on upload) and cached per file content.
+
+    - 200 {"suggestions": [...], "checks": {...}} when they are ready,
+    - 202 {"status": ..., "job": {...}, "suggestions": [local...]}
+      otherwise; poll GET /ai-jobs/{id}.
+
+    `?local_only=true` returns the local checks without involving the
+    model; so does a server without an OpenAI key.
+    `?refresh=true` queues a new analysis that replaces the cached one.
+    """
+    asset = _asset_with_file_or_404(db, current_user.id, asset_id)
+    checks = design_checks.checks_for(ai_suggestions.asset_path(asset), asset.content_hash)
+    local = checks["suggestions"] if checks else []
+
+    if local_only:
+        return {"suggestions": local, "checks": checks, "source": "local"}
+
+    if refresh:
+        ai_cache.CACHE_REQUESTS.inc(result="refresh")
+    else:
+        cached = ai_cache.lookup(db, ai_suggestions.cache_key_for(asset.content_hash))
+        if cached is not None:
+            return {"suggestions": local + cached, "checks": checks, "cached": True}
+
+    if checks is not None and not settings.OPENAI_API_KEY:
+        return {"suggestions": local, "checks": checks, "source": "local"}
+    _ensure_ai_configured()
+    _ensure_budget(asset.project_id, current_user.id)
+    job = ai_jobs.enqueue(db, asset, refresh=refresh, requested_by=current_user.id)
+    response.status_code = status.HTTP_202_ACCEPTED
+    return {
+        "status": job.status,
+        "job": schemas.AIJobOut.model_validate(job, from_attributes=True),
+        "suggestions": local,
+        "checks": checks,
+    }
+
+
+@router.post(
+    "/{asset_id}/ai-jobs",
+    response_model=schemas.AIJobOut,
+    status_code=status.HTTP_202_ACCEPTED,
+)
+def create_ai_job(
+    asset_id: int,
+    refresh: bool = Query(False),
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user_from_header),
+):
+    """
+    Queue an AI analysis of the asset (returns the active job if one exists).
+    """
+    asset = _asset_with_file_or_404(db, current_user.id, asset_id)
+    _ensure_ai_configured()
+    _ensure_budget(asset.project_id, current_user.id)
+    return ai_jobs.enqueue(db, asset, refresh=refresh, requested_by=current_user.id)
+
+
+@jobs_router.get("/{job_id}", response_model=schemas.AIJobOut)
+def get_ai_job(
+    job_id: int,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user_from_header),
+):
+    return _get_job_for_user_or_404(db, current_user.id, job_id)
+
+
+@jobs_router.get("/{job_id}/result")
+def get_ai_job_result(
+    job_id: int,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user_from_header),
+):
+    """
+    Suggestions of a finished job; 409 while it is still queued/running,
+    502 if it failed.
+    """
+    job = _get_job_for_user_or_404(db, current_user.id, job_id)
+
+    if job.status == ai_jobs.FAILED:
         raise HTTPException(
             status_code=status.HTTP_502_BAD_GATEWAY,
-            detail="Failed to call AI service.",
+            detail="AI analysis failed.",
         )
-    except Exception as e:
-        # Generic unknown error
-        print("Unexpected AI error:", repr(e))
+    if job.status != ai_jobs.SUCCEEDED:
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Unexpected error while generating AI suggestions.",
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Job is still {job.status}.",
+        )
+    return {"suggestions": job.result}
+
+
+# ---------- batch review ----------
+
+
+@project_router.post(
+    "/{project_id}/ai-batches",
+    response_model=schemas.AIBatchOut,
+    status_code=status.HTTP_202_ACCEPTED,
+)
+def create_ai_batch(
+    project_id: int,
+    payload: schemas.AIBatchCreate,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user_from_header),
+):
+    """
+    Analyze every asset of the project with `status` (e.g. needs_feedback).
+    Assets whose suggestions are cached are answered immediately, the rest
+    are queued as AI jobs. Follow progress with GET /ai-batches/{id} and
+    results with GET /ai-batches/{id}/stream (SSE) or /results.
+    """
+    _assert_can_access_project(db, current_user.id, project_id)
+    if payload.status not in STATUS_LABELS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid status value.",
         )
+    _ensure_ai_configured()
+    _ensure_budget(project_id, current_user.id)
 
-    return {"suggestions": suggestions}
+    batch = ai_batches.create(
+        db, project_id, current_user.id, payload.status, refresh=payload.refresh
+    )
+    batch = ai_batches.load(db, batch.id)
+    return ai_batches.progress(batch, [ai_batches.item_out(item) for item in batch.items])
+
+
+@project_router.get("/{project_id}/ai-usage", response_model=schemas.AIUsageOut)
+def get_ai_usage(
+    project_id: int,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user_from_header),
+):
+    """
+    Today's (UTC) model token usage of the project and of the current
+    user, against their daily budgets (limit 0 = unlimited).
+    """
+    _assert_can_access_project(db, current_user.id, project_id)
+    return {
+        "day": ai_usage.today(),
+        "project": {
+            "used": ai_usage.budgets.used("project", project_id),
+            "limit": settings.AI_PROJECT_DAILY_TOKENS,
+        },
+        "user": {
+            "used": ai_usage.budgets.used("user", current_user.id),
+            "limit": settings.AI_USER_DAILY_TOKENS,
+        },
+    }
+
+
+@batches_router.get("/{batch_id}", response_model=schemas.AIBatchOut)
+def get_ai_batch(
+    batch_id: int,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user_from_header),
+):
+    batch = _get_batch_for_user_or_404(db, current_user.id, batch_id)
+    return ai_batches.progress(batch, [ai_batches.item_out(item) for item in batch.items])
+
+
+@batches_router.get("/{batch_id}/results", response_model=List[schemas.AIBatchItemOut])
+def list_ai_batch_results(
+    batch_id: int,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user_from_header),
+):
+    """
+    Every asset of the batch with its current status and, once finished,
+    its suggestions or error.
+    """
+    batch = _get_batch_for_user_or_404(db, current_user.id, batch_id)
+    return [ai_batches.item_out(item) for item in batch.items]
+
+
+def _resolve_stream_batch(token: str, batch_id: int) -> None:
+    # Auth on a short-lived session; the stream itself polls with its own
+    db = SessionLocal()
+    try:
+        user = get_current_user(token=token, db=db)
+        _get_batch_for_user_or_404(db, user.id, batch_id)
+    finally:
+        db.close()
+
+
+@batches_router.get("/{batch_id}/stream")
+async def stream_ai_batch(
+    batch_id: int,
+    request: Request,
+    token: str = Depends(get_token_from_header_or_query),
+):
+    """
+    Server-Sent Events: `result` per finished asset, `progress` when the
+    counts change, `done` at the end. EventSource may pass `?token=`.
+    """
+    await run_in_threadpool(_resolve_stream_batch, token, batch_id)
+    return StreamingResponse(
+        ai_batches.event_source(request, batch_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -1,5 +1,6 @@
 # backend/app/routers/assets.py
 
+import hashlib
 import os
 from typing import List
 from datetime import datetime
@@ -7,9 +8,13 @@ from datetime import datetime
 from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, status
 from sqlalchemy.orm import Session
 from sqlalchemy import and_, or_
+from starlette.concurrency import run_in_threadpool
 
-from .. import models, schemas
+from .. import ai_jobs, image_tiles, models, schemas, similar_assets
+from ..config import settings
 from ..deps import get_db, get_current_user_from_header
+from ..activity_bus import activity_bus
+from ..realtime import publish, to_payload
 
 router = APIRouter(prefix="/projects", tags=["assets"])
 
@@ -88,7 +93,7 @@ def _get_project_for_user_with_access_or_404(
 
 @router.post(
     "/{project_id}/assets",
-    response_model=schemas.AssetOut,
+    response_model=schemas.AssetUploadOut,
     status_code=status.HTTP_201_CREATED,
 )
 async def upload_asset(
@@ -102,6 +107,8 @@ async def upload_asset(
 
     Owner + collaborators can upload.
     Allowed: images (png/jpg/jpeg/webp), PDF, Word, Excel.
+    For images, `similar_assets` lists near-duplicates already in the
+    project (the upload is stored either way).
     """
     project = _get_project_for_user_with_access_or_404(
         db, current_user.id, project_id
@@ -129,6 +136,7 @@ async def upload_asset(
     content = await file.read()
     with open(file_path, "wb") as f:
         f.write(content)
+    phash = await run_in_threadpool(similar_assets.compute, file_path)
 
     # Compute version number
     current_count = (
@@ -142,24 +150,52 @@ async def upload_asset(
         user_id=current_user.id,
         file_path=filename,  # relative filename
         version=current_count + 1,
+        content_hash=hashlib.sha256(content).hexdigest(),
+        phash=phash,
     )
 
     db.add(asset)
     db.commit()
     db.refresh(asset)
 
-    # Activity log: asset uploaded
-    display_name = current_user.display_name or current_user.email
-    activity = models.Activity(
+    similar = []
+    if phash is not None:
+        if settings.SIMILAR_ASSETS_WARN_ON_UPLOAD:
+            hits = await run_in_threadpool(
+                similar_assets.index.similar,
+                project.id,
+                phash,
+                settings.SIMILAR_ASSETS_WARN_DISTANCE,
+                asset.id,
+            )
+            similar = [
+                {**to_payload(schemas.AssetOut, other), "distance": distance}
+                for other, distance in similar_assets.load_hits(db, hits, limit=5)
+            ]
+        similar_assets.index.add(project.id, asset.id, phash)
+        # Large artboards get a tile pyramid so viewers need not load them whole
+        await run_in_threadpool(image_tiles.schedule_if_large, file_path, asset.content_hash)
+
+    # Activity log: asset uploaded (written behind, batched)
+    activity_bus.emit(
         project_id=project.id,
         user_id=current_user.id,
         type="asset_uploaded",
-        message=f"{display_name} uploaded an asset.",
+        payload={"asset_id": asset.id},
+    )
+
+    # Have AI suggestions ready by the time someone opens it
+    if settings.AI_PRECOMPUTE_ON_UPLOAD and settings.OPENAI_API_KEY:
+        ai_jobs.enqueue(db, asset, requested_by=current_user.id)
+
+    publish(
+        "asset_uploaded",
+        to_payload(schemas.AssetOut, asset),
+        project_id=project.id,
+        asset_id=asset.id,
     )
-    db.add(activity)
-    db.commit()
 
-    return asset
+    return {**to_payload(schemas.AssetOut, asset), "similar_assets": similar}
 
 
 @router.get(
@@ -245,4 +281,5 @@ def delete_asset(
 
     db.delete(asset)
     db.commit()
+    similar_assets.index.remove(project.id, asset.id)
     return
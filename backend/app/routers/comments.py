@@ -1,13 +1,21 @@
+import os
 from typing import List
 
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy import func
+from sqlalchemy.orm import Session, selectinload
 
-from .. import models, schemas
+from .. import comment_regions, models, schemas
 from ..deps import get_db, get_current_user_from_header
+from ..activity_bus import activity_bus
+from ..design_checks import IMAGE_EXTENSIONS
+from ..realtime import publish, to_payload
 
 router = APIRouter(prefix="/assets", tags=["comments"])
 
+# Project-scoped comment endpoints (batch reads for a whole project page)
+project_router = APIRouter(prefix="/projects", tags=["comments"])
+
 
 def _get_asset_with_access_or_404(
     db: Session,
@@ -52,6 +60,57 @@ def _get_asset_with_access_or_404(
     return asset, project
 
 
+def _get_project_with_access_or_404(
+    db: Session,
+    user_id: int,
+    project_id: int,
+) -> models.Project:
+    """
+    Ensure the project exists and user is owner or participant.
+    """
+    project = db.query(models.Project).filter(models.Project.id == project_id).first()
+    if not project:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Project not found",
+        )
+
+    if project.owner_id == user_id:
+        return project
+
+    membership = (
+        db.query(models.ProjectParticipant)
+        .filter(
+            models.ProjectParticipant.project_id == project.id,
+            models.ProjectParticipant.user_id == user_id,
+        )
+        .first()
+    )
+    if not membership:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="You don't have access to this project",
+        )
+
+    return project
+
+
+def _parse_id_list(raw: str | None) -> list[int] | None:
+    if raw is None or not raw.strip():
+        return None
+    try:
+        return sorted({int(part) for part in raw.split(",") if part.strip()})
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="asset_ids must be a comma-separated list of integers",
+        )
+
+
+def _thread_path(parent_path: str | None, comment_id: int) -> str:
+    return f"{parent_path or ''}{comment_id}/"
+
+
 @router.get(
     "/{asset_id}/comments",
     response_model=List[schemas.CommentOut],
@@ -67,12 +126,162 @@ def list_comments(
         db.query(models.Comment)
         .join(models.User, models.Comment.user_id == models.User.id)
         .filter(models.Comment.asset_id == asset_id)
+        .options(selectinload(models.Comment.region))
         .order_by(models.Comment.created_at.asc())
         .all()
     )
     return comments
 
 
+@router.get(
+    "/{asset_id}/annotations",
+    response_model=List[schemas.CommentOut],
+)
+def list_annotations_in_view(
+    asset_id: int,
+    x0: float = Query(0.0, ge=0, le=1),
+    y0: float = Query(0.0, ge=0, le=1),
+    x1: float = Query(1.0, ge=0, le=1),
+    y1: float = Query(1.0, ge=0, le=1),
+    limit: int = Query(500, ge=1, le=5000),
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user_from_header),
+):
+    """
+    Pinned comments whose region touches the viewport (x0, y0)-(x1, y1),
+    in normalized image coordinates. Served from the spatial index, so the
+    cost follows the pins in view rather than all pins of the asset.
+    """
+    asset, _project = _get_asset_with_access_or_404(db, current_user.id, asset_id)
+    if x0 > x1 or y0 > y1:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Viewport must have x0 <= x1 and y0 <= y1",
+        )
+
+    query = comment_regions.in_viewport(db.query(models.Comment), asset.id, x0, y0, x1, y1)
+    return (
+        query.options(
+            selectinload(models.Comment.user),
+            selectinload(models.Comment.reactions),
+            selectinload(models.Comment.region),
+        )
+        .order_by(models.Comment.id.asc())
+        .limit(limit)
+        .all()
+    )
+
+
+@project_router.get(
+    "/{project_id}/comments",
+    response_model=List[schemas.AssetCommentsOut],
+)
+def list_project_comments(
+    project_id: int,
+    asset_ids: str | None = Query(
+        None, description="Comma-separated asset ids; defaults to every asset"
+    ),
+    limit: int | None = Query(
+        None, ge=1, le=500, description="Only the latest N comments per asset"
+    ),
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user_from_header),
+):
+    """
+    Comments for many assets of one project in a single call.
+    One access check, one comment query (plus eager loads for authors and
+    reactions), grouped by asset in the response.
+    """
+    project = _get_project_with_access_or_404(db, current_user.id, project_id)
+
+    asset_q = db.query(models.Asset.id).filter(models.Asset.project_id == project.id)
+    wanted = _parse_id_list(asset_ids)
+    if wanted is not None:
+        asset_q = asset_q.filter(models.Asset.id.in_(wanted))
+    project_asset_ids = [row.id for row in asset_q.order_by(models.Asset.id).all()]
+    if not project_asset_ids:
+        return []
+
+    comments_q = db.query(models.Comment).filter(
+        models.Comment.asset_id.in_(project_asset_ids)
+    )
+    if limit is not None:
+        # Latest N per asset via a window function instead of N queries
+        ranked = (
+            db.query(
+                models.Comment.id.label("id"),
+                func.row_number()
+                .over(
+                    partition_by=models.Comment.asset_id,
+                    order_by=(models.Comment.created_at.desc(), models.Comment.id.desc()),
+                )
+                .label("rn"),
+            )
+            .filter(models.Comment.asset_id.in_(project_asset_ids))
+            .subquery()
+        )
+        comments_q = comments_q.join(ranked, ranked.c.id == models.Comment.id).filter(
+            ranked.c.rn <= limit
+        )
+
+    comments = (
+        comments_q.options(
+            selectinload(models.Comment.user),
+            selectinload(models.Comment.reactions),
+            selectinload(models.Comment.region),
+        )
+        .order_by(models.Comment.created_at.asc(), models.Comment.id.asc())
+        .all()
+    )
+
+    grouped: dict[int, list[models.Comment]] = {aid: [] for aid in project_asset_ids}
+    for comment in comments:
+        grouped[comment.asset_id].append(comment)
+
+    return [
+        {"asset_id": aid, "comments": items} for aid, items in grouped.items()
+    ]
+
+
+@router.get(
+    "/{asset_id}/comments/{comment_id}/thread",
+    response_model=List[schemas.CommentOut],
+)
+def get_comment_thread(
+    asset_id: int,
+    comment_id: int,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user_from_header),
+):
+    """
+    A comment plus every reply below it, in one prefix query on `path`.
+    """
+    asset, _project = _get_asset_with_access_or_404(db, current_user.id, asset_id)
+
+    root = (
+        db.query(models.Comment)
+        .filter(
+            models.Comment.id == comment_id,
+            models.Comment.asset_id == asset.id,
+        )
+        .first()
+    )
+    if not root:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Comment not found",
+        )
+
+    thread = (
+        db.query(models.Comment)
+        .filter(models.Comment.path.startswith(root.path, autoescape=True))
+        .options(selectinload(models.Comment.region))
+        .order_by(models.Comment.created_at.asc())
+        .all()
+    )
+    return thread
+
+
 @router.post(
     "/{asset_id}/comments",
     response_model=schemas.CommentOut,
@@ -111,26 +320,53 @@ def add_comment(
                 detail="Parent comment not found for this asset",
             )
 
+    region = payload.region
+    if region is not None:
+        if parent_id is not None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Only top-level comments can be pinned to a region",
+            )
+        if os.path.splitext(_asset.file_path.lower())[1] not in IMAGE_EXTENSIONS:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Regions can only be pinned on image assets",
+            )
+
     comment = models.Comment(
         asset_id=asset_id,
         user_id=current_user.id,
         content=content,
         parent_id=parent_id,   # NEW
     )
+    if region is not None:
+        comment.region = models.CommentRegion(
+            asset_id=asset_id,
+            x=region.x,
+            y=region.y,
+            width=region.width,
+            height=region.height,
+        )
     db.add(comment)
+    db.flush()  # need the id to build the thread path
+    comment.path = _thread_path(parent.path if parent_id is not None else None, comment.id)
     db.commit()
     db.refresh(comment)
 
-    # Activity log (keep your existing code)
-    display_name = current_user.display_name or current_user.email
-    activity = models.Activity(
+    # Activity log (written behind, batched)
+    activity_bus.emit(
         project_id=_asset.project_id,
         user_id=current_user.id,
         type="comment_added",
-        message=f"{display_name} commented on an asset.",
+        payload={"asset_id": asset_id, "comment_id": comment.id},
+    )
+
+    publish(
+        "comment_added",
+        to_payload(schemas.CommentOut, comment),
+        project_id=_asset.project_id,
+        asset_id=asset_id,
     )
-    db.add(activity)
-    db.commit()
 
     return comment
 
@@ -169,8 +405,32 @@ def delete_comment(
             detail="You are not allowed to delete this comment",
         )
 
-    db.delete(comment)
+    # Remove the whole thread under this comment (replies of replies included)
+    # with set-based deletes instead of walking `children` row by row.
+    thread_path = comment.path
+    subtree_ids = (
+        db.query(models.Comment.id)
+        .filter(models.Comment.path.startswith(thread_path, autoescape=True))
+        .scalar_subquery()
+    )
+    db.query(models.CommentReaction).filter(
+        models.CommentReaction.comment_id.in_(subtree_ids)
+    ).delete(synchronize_session=False)
+    db.query(models.CommentRegion).filter(
+        models.CommentRegion.comment_id.in_(subtree_ids)
+    ).delete(synchronize_session=False)
+    db.query(models.Comment).filter(
+        models.Comment.path.startswith(thread_path, autoescape=True)
+    ).delete(synchronize_session=False)
     db.commit()
+
+    # Clients drop every comment whose path starts with `path`
+    publish(
+        "comment_deleted",
+        {"id": comment_id, "path": thread_path},
+        project_id=project.id,
+        asset_id=asset.id,
+    )
     return
 
 
@@ -240,15 +500,12 @@ def toggle_comment_reaction(
         db.commit()
 
         # activity log only when adding
-        display_name = current_user.display_name or current_user.email
-        activity = models.Activity(
+        activity_bus.emit(
             project_id=project.id,
             user_id=current_user.id,
             type="comment_reacted",
-            message=f"{display_name} reacted {emoji} to a comment.",
+            payload={"comment_id": comment.id, "emoji": emoji},
         )
-        db.add(activity)
-        db.commit()
 
     # reload comment with updated reactions
     updated_comment = (
@@ -256,6 +513,12 @@ def toggle_comment_reaction(
         .filter(models.Comment.id == comment.id)
         .first()
     )
+    publish(
+        "reaction_toggled",
+        to_payload(schemas.CommentOut, updated_comment),
+        project_id=project.id,
+        asset_id=asset.id,
+    )
     return updated_comment
 
 @router.patch("/{asset_id}/status", response_model=schemas.AssetOut)
@@ -301,28 +564,24 @@ def update_asset_status(
             detail="Invalid status value.",
         )
 
-    if asset.status != new_status:
+    changed = asset.status != new_status
+    if changed:
         asset.status = new_status
 
-        # Optional: activity log entry
-        project = asset.project
-        display_name = current_user.display_name or current_user.email
-        label_map = {
-            "needs_feedback": "Needs feedback",
-            "in_progress": "In progress",
-            "changes_requested": "Changes requested",
-            "final": "Final",
-        }
-        pretty = label_map.get(new_status, new_status)
-
-        activity = models.Activity(
-            project_id=project.id,
+    db.commit()
+    db.refresh(asset)
+
+    if changed:
+        activity_bus.emit(
+            project_id=asset.project_id,
             user_id=current_user.id,
             type="asset_status_changed",
-            message=f"{display_name} set an asset status to '{pretty}'.",
+            payload={"asset_id": asset.id, "status": new_status},
+        )
+        publish(
+            "asset_status_changed",
+            to_payload(schemas.AssetOut, asset),
+            project_id=asset.project_id,
+            asset_id=asset.id,
         )
-        db.add(activity)
-
-    db.commit()
-    db.refresh(asset)
     return asset
@@ -0,0 +1,116 @@
+import os
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import FileResponse
+from sqlalchemy.orm import Session
+
+from .. import ai_cache, ai_suggestions, models, schemas, visual_diff
+from ..deps import get_db, get_asset_for_user_or_404, get_current_user, get_current_user_from_header, get_token_from_header_or_query
+
+router = APIRouter(prefix="/assets", tags=["diffs"])
+
+
+def _base_asset_or_404(db: Session, asset: models.Asset, against: int | None) -> models.Asset:
+    """
+    The version to compare `asset` with: `against` (same project), or by
+    default the latest earlier version of the project.
+    """
+    query = db.query(models.Asset).filter(models.Asset.project_id == asset.project_id)
+    if against is not None:
+        base = query.filter(models.Asset.id == against).first()
+    else:
+        base = (
+            query.filter(models.Asset.version < asset.version)
+            .order_by(models.Asset.version.desc())
+            .first()
+        )
+    if not base:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="No version to compare with" if against is None else "Asset to compare with not found",
+        )
+    return base
+
+
+def _file_path_or_404(db: Session, asset: models.Asset) -> str:
+    path = ai_suggestions.asset_path(asset)
+    if not os.path.exists(path):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Asset file not found on server",
+        )
+    if asset.content_hash is None:
+        # Uploaded before hashes were recorded
+        asset.content_hash = ai_cache.file_sha256(path)
+        db.commit()
+    return path
+
+
+def _diff_or_error(db: Session, base: models.Asset, asset: models.Asset) -> dict:
+    base_path = _file_path_or_404(db, base)
+    path = _file_path_or_404(db, asset)
+    try:
+        report = visual_diff.diff_for(base_path, base.content_hash, path, asset.content_hash)
+    except (FutureTimeoutError, BrokenProcessPool):
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Could not compute the diff right now, try again later.",
+        )
+    except visual_diff.DiffError:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="These images could not be compared (unreadable or too large).",
+        )
+    if report is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Visual diff is only available between two images.",
+        )
+    return report
+
+
+@router.get("/{asset_id}/diff", response_model=schemas.VisualDiffOut)
+def get_visual_diff(
+    asset_id: int,
+    against: int | None = Query(None, description="Asset id to compare with; default: previous version"),
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user_from_header),
+):
+    """
+    Visual diff of this asset against an earlier version: changed regions,
+    similarity and a diff image (see `image_url`). Computed once per pair
+    of file contents, then served from cache.
+    """
+    asset = get_asset_for_user_or_404(db, current_user.id, asset_id)
+    base = _base_asset_or_404(db, asset, against)
+    report = _diff_or_error(db, base, asset)
+    return {
+        **report,
+        "base_asset_id": base.id,
+        "asset_id": asset.id,
+        "image_url": f"/assets/{asset.id}/diff/image?against={base.id}",
+    }
+
+
+@router.get("/{asset_id}/diff/image")
+def get_visual_diff_image(
+    asset_id: int,
+    against: int = Query(...),
+    token: str = Depends(get_token_from_header_or_query),
+    db: Session = Depends(get_db),
+):
+    """
+    The diff image (WebP). <img> tags cannot send headers, so `?token=` is
+    accepted. Assets never change, so the response is cacheable forever.
+    """
+    current_user = get_current_user(token=token, db=db)
+    asset = get_asset_for_user_or_404(db, current_user.id, asset_id)
+    base = _base_asset_or_404(db, asset, against)
+    _diff_or_error(db, base, asset)
+    return FileResponse(
+        visual_diff.image_path(base.content_hash, asset.content_hash),
+        media_type="image/webp",
+        headers={"Cache-Control": "private, max-age=31536000, immutable"},
+    )
@@ -1,4 +1,7 @@
 from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from .. import metrics
 
 router = APIRouter(prefix="/health", tags=["health"])
 
@@ -6,3 +9,11 @@ router = APIRouter(prefix="/health", tags=["health"])
 @router.get("")
 def health_check():
     return {"status": "ok"}
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    """
+    Prometheus text format; values are for this worker only.
+    """
+    return metrics.render()
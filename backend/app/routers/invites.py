@@ -1,11 +1,26 @@
 from typing import List
 from datetime import datetime
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 
 from .. import models, schemas
-from ..deps import get_db, get_current_user_from_header
+from ..database import SessionLocal
+from ..deps import (
+    get_db,
+    get_current_user,
+    get_current_user_from_header,
+    get_current_user_id_from_header,
+    get_token_from_header_or_query,
+)
+from ..notifications import (
+    count_pending_invites,
+    event_source,
+    notifications,
+    publish_invite_event,
+)
 
 router = APIRouter(prefix="/invites", tags=["invites"])
 
@@ -42,6 +57,60 @@ def list_pending_invites(
     return invites
 
 
+@router.get("/unread-count")
+def get_unread_invite_count(
+    db: Session = Depends(get_db),
+    user_id: int = Depends(get_current_user_id_from_header),
+):
+    """
+    Pending invite count for the bell badge.
+    Served from the in-memory per-user counter; the DB is only hit on a
+    cold cache (the session never opens a connection otherwise).
+    """
+
+    def load() -> int:
+        user = db.query(models.User).filter(models.User.id == user_id).first()
+        if not user:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Could not validate credentials",
+            )
+        return count_pending_invites(db, user)
+
+    return {"count": notifications.unread_count(user_id, load)}
+
+
+def _resolve_stream_user(token: str) -> tuple[int, int]:
+    db = SessionLocal()
+    try:
+        user = get_current_user(token=token, db=db)
+        count = notifications.unread_count(
+            user.id, lambda: count_pending_invites(db, user)
+        )
+        return user.id, count
+    finally:
+        db.close()
+
+
+@router.get("/stream")
+async def stream_invite_notifications(
+    request: Request,
+    token: str = Depends(get_token_from_header_or_query),
+):
+    """
+    Server-Sent Events for the current user: `unread_count` right away,
+    then `invite` events (invite_created / invite_accepted /
+    invite_declined) as they happen, replacing bell polling.
+    """
+    user_id, count = await run_in_threadpool(_resolve_stream_user, token)
+    queue = notifications.subscribe(user_id)
+    return StreamingResponse(
+        event_source(request, user_id, queue, count),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 def _ensure_can_act_on_invite(
     invite: models.ProjectInvite,
     user: models.User,
@@ -112,6 +181,7 @@ def accept_invite(
 
     db.commit()
     db.refresh(invite)
+    publish_invite_event("invite_accepted", invite)
     return invite
 
 
@@ -148,4 +218,5 @@ def decline_invite(
 
     db.commit()
     db.refresh(invite)
+    publish_invite_event("invite_declined", invite)
     return invite
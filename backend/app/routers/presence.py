@@ -0,0 +1,101 @@
+from typing import Any
+
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session
+
+from .. import models, presence
+from ..deps import get_db, get_asset_for_user_or_404, get_current_user_from_header
+
+router = APIRouter(prefix="/assets", tags=["presence"])
+
+project_router = APIRouter(prefix="/projects", tags=["presence"])
+
+
+def _get_project_for_user_or_404(
+    db: Session,
+    user_id: int,
+    project_id: int,
+) -> models.Project:
+    project = (
+        db.query(models.Project)
+        .outerjoin(
+            models.ProjectParticipant,
+            and_(
+                models.ProjectParticipant.project_id == models.Project.id,
+                models.ProjectParticipant.user_id == user_id,
+            ),
+        )
+        .filter(
+            models.Project.id == project_id,
+            or_(
+                models.Project.owner_id == user_id,
+                models.ProjectParticipant.id.isnot(None),
+            ),
+        )
+        .first()
+    )
+
+    if not project:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Project not found or access denied",
+        )
+
+    return project
+
+
+@router.get("/{asset_id}/presence")
+def get_asset_presence(
+    asset_id: int,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user_from_header),
+) -> dict[str, Any]:
+    """
+    Snapshot of who is viewing this asset. Later changes arrive as
+    `presence_joined` / `presence_left` events on the asset socket.
+    """
+    get_asset_for_user_or_404(db, current_user.id, asset_id)
+    return {"asset_id": asset_id, "viewers": presence.tracker.asset_viewers(asset_id)}
+
+
+@router.post("/{asset_id}/presence/heartbeat", status_code=status.HTTP_204_NO_CONTENT)
+def presence_heartbeat(
+    asset_id: int,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user_from_header),
+):
+    """
+    Keep-alive for clients that are not on the asset WebSocket
+    (an open socket keeps its viewer present by itself).
+    """
+    # Access was checked when this viewer joined; a refresh needs no query
+    if presence.tracker.touch(asset_id, current_user.id):
+        return
+
+    asset = get_asset_for_user_or_404(db, current_user.id, asset_id)
+    presence.join(asset.id, asset.project_id, current_user)
+
+
+@router.delete("/{asset_id}/presence", status_code=status.HTTP_204_NO_CONTENT)
+def leave_asset_presence(
+    asset_id: int,
+    current_user: models.User = Depends(get_current_user_from_header),
+):
+    presence.leave(asset_id, current_user.id)
+
+
+@project_router.get("/{project_id}/presence")
+def get_project_presence(
+    project_id: int,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user_from_header),
+) -> dict[str, Any]:
+    """
+    Viewers for every asset of the project, grouped by asset id.
+    """
+    _get_project_for_user_or_404(db, current_user.id, project_id)
+    return {
+        "project_id": project_id,
+        "assets": presence.tracker.project_viewers(project_id),
+    }
@@ -0,0 +1,56 @@
+import os
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy.orm import Session
+
+from .. import ai_cache, ai_suggestions, models, schemas, xlsx_preview
+from ..config import settings
+from ..deps import get_db, get_asset_for_user_or_404, get_current_user_from_header
+
+router = APIRouter(prefix="/assets", tags=["previews"])
+
+
+@router.get("/{asset_id}/xlsx-preview", response_model=schemas.SpreadsheetPreviewOut)
+def get_xlsx_preview(
+    asset_id: int,
+    sheet: int = Query(0, ge=0, description="Sheet number, in workbook order"),
+    start_row: int = Query(1, ge=1, description="First row (1-based)"),
+    rows: int = Query(settings.XLSX_PREVIEW_ROWS, ge=1, le=settings.XLSX_PREVIEW_MAX_ROWS),
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user_from_header),
+):
+    """
+    Sheet names of an XLSX asset and a window of rows of one sheet,
+    without downloading the workbook. Page with `start_row` while
+    `has_more` is set.
+    """
+    asset = get_asset_for_user_or_404(db, current_user.id, asset_id)
+    path = ai_suggestions.asset_path(asset)
+    if not xlsx_preview.is_spreadsheet(path):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Preview is only available for Excel (.xlsx) files.",
+        )
+    if not os.path.exists(path):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Asset file not found on server",
+        )
+    if asset.content_hash is None:
+        # Uploaded before hashes were recorded
+        asset.content_hash = ai_cache.file_sha256(path)
+        db.commit()
+
+    try:
+        result = xlsx_preview.preview(path, asset.content_hash, sheet, start_row, rows)
+    except xlsx_preview.SheetNotFoundError:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Sheet not found",
+        )
+    if result is None:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Could not read the workbook.",
+        )
+    return result
@@ -4,8 +4,9 @@ from datetime import datetime
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 
-from .. import models, schemas
+from .. import models, schemas, similar_assets
 from ..deps import get_db, get_current_user_from_header
+from ..notifications import publish_invite_event
 
 router = APIRouter(prefix="/projects", tags=["projects"])
 
@@ -237,6 +238,7 @@ def delete_project(
     # Delete participants and invites via cascades (if configured on relationships)
     db.delete(project)
     db.commit()
+    similar_assets.index.drop_project(project.id)
     return
 
 
@@ -361,6 +363,7 @@ def create_invite(
     db.add(invite)
     db.commit()
     db.refresh(invite)
+    publish_invite_event("invite_created", invite)
     return invite
 
 def _get_project_for_user_or_404(
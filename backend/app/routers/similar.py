@@ -0,0 +1,49 @@
+import os
+from typing import List
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy.orm import Session
+
+from .. import ai_suggestions, models, schemas, similar_assets
+from ..config import settings
+from ..deps import get_db, get_asset_for_user_or_404, get_current_user_from_header
+from ..realtime import to_payload
+
+router = APIRouter(prefix="/assets", tags=["similar"])
+
+
+@router.get("/{asset_id}/similar", response_model=List[schemas.SimilarAssetOut])
+def list_similar_assets(
+    asset_id: int,
+    max_distance: int = Query(
+        settings.SIMILAR_ASSETS_WARN_DISTANCE,
+        ge=0,
+        le=settings.SIMILAR_ASSETS_MAX_DISTANCE,
+        description="Largest perceptual hash distance, in bits",
+    ),
+    limit: int = Query(20, ge=1, le=100),
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user_from_header),
+):
+    """
+    Images of the same project that look like this one (re-exports,
+    resized or recompressed copies), closest first.
+    """
+    asset = get_asset_for_user_or_404(db, current_user.id, asset_id)
+    if asset.phash is None:
+        path = ai_suggestions.asset_path(asset)
+        if os.path.exists(path):
+            # Uploaded before hashes were recorded
+            asset.phash = similar_assets.compute(path)
+            db.commit()
+    if asset.phash is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Similarity search is only available for images.",
+        )
+
+    hits = similar_assets.index.similar(asset.project_id, asset.phash, max_distance, asset.id)
+    return [
+        {**to_payload(schemas.AssetOut, other), "distance": distance}
+        for other, distance in similar_assets.load_hits(db, hits, limit)
+    ]
@@ -0,0 +1,108 @@
+import os
+import re
+
+from fastapi import APIRouter, Depends, HTTPException, Response, status
+from fastapi.responses import FileResponse
+from sqlalchemy.orm import Session
+
+from .. import ai_cache, ai_suggestions, image_tiles, models, schemas
+from ..config import settings
+from ..deps import get_db, get_asset_for_user_or_404, get_current_user_from_header
+
+router = APIRouter(prefix="/assets", tags=["tiles"])
+
+# Pyramid files, addressed by content hash: they never change, so they are
+# served without a DB lookup and cached forever. Like /uploads they need no
+# auth; the hash is only handed out to users who can see the asset.
+tiles_router = APIRouter(prefix="/tiles", tags=["tiles"])
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+_KEY = re.compile(r"^[0-9a-f]{64}-v[0-9]+$")
+_TILE = re.compile(r"^[0-9]+_[0-9]+\.webp$")
+
+
+@router.get("/{asset_id}/tiles", response_model=schemas.TilePyramidOut)
+def get_tile_pyramid(
+    asset_id: int,
+    response: Response,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user_from_header),
+):
+    """
+    Deep-zoom pyramid of an image asset:
+    - 200 {"status": "ready", size, levels, dzi_url, tile_url}
+    - 202 {"status": "building"}: poll again shortly; the build was started
+      if it was not already running
+    - 422 if the image could not be tiled (the failure is remembered, so
+      polling does not rebuild it)
+    """
+    asset = get_asset_for_user_or_404(db, current_user.id, asset_id)
+    path = ai_suggestions.asset_path(asset)
+    if not image_tiles.is_image(path):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Tiles are only available for images.",
+        )
+    if not os.path.exists(path):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Asset file not found on server",
+        )
+    if asset.content_hash is None:
+        # Uploaded before hashes were recorded
+        asset.content_hash = ai_cache.file_sha256(path)
+        db.commit()
+
+    pyramid = image_tiles.info(asset.content_hash)
+    if pyramid is None:
+        if image_tiles.schedule(path, asset.content_hash):
+            response.status_code = status.HTTP_202_ACCEPTED
+            return {"status": "building"}
+        pyramid = image_tiles.info(asset.content_hash)
+    if pyramid is None:
+        reason = image_tiles.failure(asset.content_hash) or "build failed"
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"Could not build tiles for this image ({reason}).",
+        )
+
+    base = f"/tiles/{image_tiles.pyramid_key(asset.content_hash)}"
+    return {
+        **pyramid,
+        "status": "ready",
+        "dzi_url": f"{base}/image.dzi",
+        "tile_url": f"{base}/image_files/{{level}}/{{col}}_{{row}}.webp",
+    }
+
+
+def _pyramid_file_or_404(*parts: str) -> str:
+    path = os.path.join(settings.TILES_CACHE_DIR, *parts)
+    if not os.path.isfile(path):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Tile not found",
+        )
+    return path
+
+
+@tiles_router.get("/{key}/image.dzi")
+def get_dzi(key: str):
+    if not _KEY.match(key):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Tile not found")
+    return FileResponse(
+        _pyramid_file_or_404(key, "image.dzi"),
+        media_type="application/xml",
+        headers={"Cache-Control": IMMUTABLE},
+    )
+
+
+@tiles_router.get("/{key}/image_files/{level}/{tile}")
+def get_tile(key: str, level: int, tile: str):
+    if not _KEY.match(key) or not _TILE.match(tile) or level < 0:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Tile not found")
+    return FileResponse(
+        _pyramid_file_or_404(key, "image_files", str(level), tile),
+        media_type="image/webp",
+        headers={"Cache-Control": IMMUTABLE},
+    )
@@ -0,0 +1,129 @@
+from fastapi import APIRouter, HTTPException, Query, WebSocket, WebSocketDisconnect, status
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from .. import models, presence
+from ..database import SessionLocal
+from ..deps import get_current_user
+from ..realtime import asset_room, hub, project_room
+
+router = APIRouter(prefix="/ws", tags=["realtime"])
+
+
+def _user_can_access_project(db: Session, user_id: int, project_id: int) -> bool:
+    project = (
+        db.query(models.Project.id)
+        .outerjoin(
+            models.ProjectParticipant,
+            and_(
+                models.ProjectParticipant.project_id == models.Project.id,
+                models.ProjectParticipant.user_id == user_id,
+            ),
+        )
+        .filter(
+            models.Project.id == project_id,
+            or_(
+                models.Project.owner_id == user_id,
+                models.ProjectParticipant.id.isnot(None),
+            ),
+        )
+        .first()
+    )
+    return project is not None
+
+
+def _authorize(
+    token: str,
+    project_id: int | None,
+    asset_id: int | None,
+) -> tuple[models.User, int] | None:
+    """
+    Validate the JWT and room access with a short-lived session, so the
+    socket does not pin a DB connection for its whole lifetime.
+    Returns (user, project_id), or None when the connection must be refused.
+    """
+    db = SessionLocal()
+    try:
+        try:
+            user = get_current_user(token=token, db=db)
+        except HTTPException:
+            return None
+
+        if asset_id is not None:
+            asset = db.query(models.Asset).filter(models.Asset.id == asset_id).first()
+            if not asset:
+                return None
+            project_id = asset.project_id
+
+        if project_id is None or not _user_can_access_project(db, user.id, project_id):
+            return None
+
+        db.expunge(user)
+        return user, project_id
+    finally:
+        db.close()
+
+
+async def _serve(websocket: WebSocket, room: str, on_message=None) -> None:
+    await websocket.accept()
+    conn = hub.connect(websocket, [room])
+    try:
+        while True:
+            message = await websocket.receive_text()
+            if on_message is not None:
+                on_message(message)
+            # Simple keep-alive for proxies that drop idle connections
+            if message == "ping":
+                await websocket.send_text("pong")
+    except WebSocketDisconnect:
+        pass
+    finally:
+        hub.disconnect(conn)
+
+
+@router.websocket("/projects/{project_id}")
+async def project_socket(
+    websocket: WebSocket,
+    project_id: int,
+    token: str = Query(...),
+):
+    """
+    Live events for a whole project: comments, reactions, uploads,
+    status changes and activity entries.
+    Browsers cannot set headers on WebSockets, so the JWT goes in `?token=`.
+    """
+    auth = await run_in_threadpool(_authorize, token, project_id, None)
+    if auth is None:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    await _serve(websocket, project_room(project_id))
+
+
+@router.websocket("/assets/{asset_id}")
+async def asset_socket(
+    websocket: WebSocket,
+    asset_id: int,
+    token: str = Query(...),
+):
+    """
+    Live events for a single asset (comments, reactions, status, presence).
+    Being connected counts as viewing the asset, for as long as the socket
+    stays open; no heartbeat is needed.
+    """
+    auth = await run_in_threadpool(_authorize, token, None, asset_id)
+    if auth is None:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    user, project_id = auth
+
+    presence.join(asset_id, project_id, user, connect=True)
+    try:
+        await _serve(
+            websocket,
+            asset_room(asset_id),
+            on_message=lambda _msg: presence.join(asset_id, project_id, user),
+        )
+    finally:
+        presence.leave(asset_id, user.id, disconnect=True)
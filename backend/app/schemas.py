@@ -1,6 +1,6 @@
-from datetime import datetime
+from datetime import date, datetime
 
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, Field, model_validator
 
 
 # ---------- USERS ----------
@@ -70,14 +70,56 @@ class AssetOut(BaseModel):
     class Config:
         orm_mode = True
 
+
+class SimilarAssetOut(AssetOut):
+    # Perceptual hash distance in bits (0 = same image, <= 6 near-duplicate)
+    distance: int
+
+
+class AssetUploadOut(AssetOut):
+    # Near-duplicates of the upload already in the project, closest first
+    similar_assets: list[SimilarAssetOut] = []
+
+
 class AssetStatusUpdate(BaseModel):
     status: str
 # ---------- COMMENTS ----------
 
 
+class CommentRegionIn(BaseModel):
+    """
+    Point (width = height = 0) or rectangle on the image, normalized to
+    0..1 of its width and height, origin top left.
+    """
+
+    x: float = Field(ge=0, le=1)
+    y: float = Field(ge=0, le=1)
+    width: float = Field(0.0, ge=0, le=1)
+    height: float = Field(0.0, ge=0, le=1)
+
+    @model_validator(mode="after")
+    def _inside_image(self):
+        # Small slack for float sums such as 0.1 + 0.9
+        if self.x + self.width > 1 + 1e-9 or self.y + self.height > 1 + 1e-9:
+            raise ValueError("Region must lie inside the image")
+        return self
+
+
+class CommentRegionOut(BaseModel):
+    x: float
+    y: float
+    width: float
+    height: float
+
+    class Config:
+        from_attributes = True
+
+
 class CommentCreate(BaseModel):
     content: str
     parent_id: int | None = None
+    # Pin a top-level comment to part of an image asset
+    region: CommentRegionIn | None = None
 
 class CommentReactionCreate(BaseModel):
     emoji: str
@@ -100,14 +142,25 @@ class CommentOut(BaseModel):
     user_id: int
     content: str
     parent_id: int | None = None
+    path: str | None = None
     created_at: datetime
     user: UserOut  # so frontend can show author name/email
     reactions: list[CommentReactionOut] = []  # NEW
+    region: CommentRegionOut | None = None
 
     class Config:
         from_attributes = True
 
 
+class AssetCommentsOut(BaseModel):
+    """
+    Comments for one asset inside a project-wide batch fetch.
+    """
+
+    asset_id: int
+    comments: list[CommentOut] = []
+
+
 # ---------- INVITES / NOTIFICATIONS ----------
 
 
@@ -155,3 +208,132 @@ class ActivityOut(BaseModel):
         from_attributes = True
 
 
+class ActivityDailySummaryOut(BaseModel):
+    day: date
+    type: str
+    count: int
+
+    class Config:
+        from_attributes = True
+
+
+class ActivityFeedOut(BaseModel):
+    items: list[ActivityOut]
+    # Pass back as ?cursor= for the next (older) page; None on the last page
+    next_cursor: str | None = None
+
+
+class AIJobOut(BaseModel):
+    id: int
+    asset_id: int
+    status: str
+    refresh: bool
+    attempts: int
+    error: str | None = None
+    result: list[str] | None = None
+    created_at: datetime
+    started_at: datetime | None = None
+    finished_at: datetime | None = None
+
+    class Config:
+        from_attributes = True
+
+
+class AIBudgetOut(BaseModel):
+    used: int
+    limit: int
+
+
+class AIUsageOut(BaseModel):
+    day: date
+    project: AIBudgetOut
+    user: AIBudgetOut
+
+
+class AIBatchCreate(BaseModel):
+    # Asset status to select, e.g. "needs_feedback"
+    status: str = "needs_feedback"
+    refresh: bool = False
+
+
+class AIBatchItemOut(BaseModel):
+    asset_id: int
+    # cached | queued | running | succeeded | failed
+    status: str
+    suggestions: list[str] | None = None
+    error: str | None = None
+
+
+class AIBatchOut(BaseModel):
+    id: int
+    project_id: int
+    asset_status: str
+    refresh: bool
+    created_at: datetime
+    total: int
+    counts: dict[str, int]
+    done: bool
+
+
+# ---------- VISUAL DIFF ----------
+
+
+class DiffRegionOut(BaseModel):
+    # Pixels of the diff image (see VisualDiffOut.size)
+    x: int
+    y: int
+    width: int
+    height: int
+    changed_share: float
+
+
+class SpreadsheetSheetOut(BaseModel):
+    index: int
+    name: str
+    # Declared range, e.g. "A1:D20001" (not every writer records it)
+    dimension: str | None = None
+
+
+class SpreadsheetRowOut(BaseModel):
+    # 1-based, as in Excel; empty rows are left out
+    row: int
+    cells: list[str]
+
+
+class SpreadsheetPreviewOut(BaseModel):
+    sheets: list[SpreadsheetSheetOut]
+    sheet: int
+    start_row: int
+    rows: list[SpreadsheetRowOut]
+    columns: int
+    has_more: bool
+
+
+class TilePyramidOut(BaseModel):
+    # ready | building
+    status: str
+    width: int | None = None
+    height: int | None = None
+    tile_size: int | None = None
+    overlap: int | None = None
+    format: str | None = None
+    max_level: int | None = None
+    # DZI descriptor, for viewers such as OpenSeadragon
+    dzi_url: str | None = None
+    # With {level}, {col} and {row} to fill in
+    tile_url: str | None = None
+
+
+class VisualDiffOut(BaseModel):
+    base_asset_id: int
+    asset_id: int
+    # Comparison size [width, height]; both versions are scaled to it
+    size: list[int]
+    # How far the newer version was moved [dx, dy] to line up with the base
+    offset: list[int]
+    similarity: float
+    changed_share: float
+    mean_difference: float
+    regions: list[DiffRegionOut]
+    more_regions: int
+    image_url: str
@@ -0,0 +1,202 @@
+"""
+Near-duplicate detection for image assets.
+
+Every image upload gets a 64-bit perceptual hash (pHash: sign of the
+low-frequency DCT coefficients of a 32x32 greyscale copy), stored as hex
+in `assets.phash`. Re-exports of the same design (other format, size or
+compression) land within a few bits of each other.
+
+`index` keeps the hashes of each project in memory as a NumPy uint64 array
+and answers "what is within N bits of this hash" with one vectorized
+XOR + popcount over it, tens of microseconds for tens of thousands of
+assets. A project is loaded on first use (hashing older assets that have
+none yet) and kept current by this process's uploads/deletes plus the
+`asset_uploaded` events of other processes (a hub listener marks the
+project stale; the next lookup reads only the newer rows). Hits may include
+assets another process deleted; callers load the hits from the DB anyway.
+"""
+
+import os
+import threading
+from typing import Any
+
+import numpy as np
+from PIL import Image
+from sqlalchemy.orm import Session
+
+from . import ai_suggestions, models
+from .database import SessionLocal
+from .design_checks import IMAGE_EXTENSIONS, load_rgb
+
+HASH_SIZE = 8  # 8x8 low frequencies -> 64 bits
+DCT_SIZE = 32
+
+_n = np.arange(DCT_SIZE)
+# DCT-II basis; coefficients = D @ pixels @ D.T
+_DCT = np.cos(np.pi * (2 * _n[None, :] + 1) * _n[:, None] / (2 * DCT_SIZE)).astype(np.float32)
+_BIT_WEIGHTS = np.uint64(1) << np.arange(63, -1, -1, dtype=np.uint64)
+
+
+def is_image(path: str) -> bool:
+    return os.path.splitext(path.lower())[1] in IMAGE_EXTENSIONS
+
+
+def compute(path: str) -> str | None:
+    """pHash of the image at `path` as 16 hex digits, or None if not an image."""
+    if not is_image(path):
+        return None
+    img = load_rgb(path, 256)
+    if img is None:
+        return None
+    small = img.convert("L").resize((DCT_SIZE, DCT_SIZE), Image.Resampling.LANCZOS)
+    pixels = np.asarray(small, dtype=np.float32)
+    low = (_DCT @ pixels @ _DCT.T)[:HASH_SIZE, :HASH_SIZE].ravel()
+    bits = low > np.median(low)
+    return f"{int((bits * _BIT_WEIGHTS).sum()):016x}"
+
+
+class _ProjectIndex:
+    def __init__(self) -> None:
+        self.ids = np.empty(64, dtype=np.int64)
+        self.hashes = np.empty(64, dtype=np.uint64)
+        self.size = 0
+        self.positions: dict[int, int] = {}
+        # Highest asset id read from the DB; newer rows are read on refresh
+        self.max_id = 0
+        self.stale = False
+
+    def add(self, asset_id: int, phash: str) -> None:
+        position = self.positions.get(asset_id)
+        if position is None:
+            if self.size == len(self.ids):
+                self.ids = np.resize(self.ids, 2 * self.size)
+                self.hashes = np.resize(self.hashes, 2 * self.size)
+            position = self.size
+            self.size += 1
+            self.positions[asset_id] = position
+        self.ids[position] = asset_id
+        self.hashes[position] = int(phash, 16)
+
+    def remove(self, asset_id: int) -> None:
+        position = self.positions.pop(asset_id, None)
+        if position is None:
+            return
+        # Move the last entry into the gap
+        last = self.size - 1
+        if position != last:
+            self.ids[position] = self.ids[last]
+            self.hashes[position] = self.hashes[last]
+            self.positions[int(self.ids[position])] = position
+        self.size = last
+
+    def search(self, phash: str, max_distance: int) -> list[tuple[int, int]]:
+        distances = np.bitwise_count(self.hashes[: self.size] ^ np.uint64(int(phash, 16)))
+        hits = np.nonzero(distances <= max_distance)[0]
+        # Closest first, newest first among equals
+        hits = hits[np.lexsort((-self.ids[hits], distances[hits]))]
+        return [(int(self.ids[i]), int(distances[i])) for i in hits]
+
+
+class SimilarityIndex:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._projects: dict[int, _ProjectIndex] = {}
+
+    def feed(self, event: dict[str, Any]) -> None:
+        """
+        Hub listener; runs on the event loop for every delivered event.
+        """
+        if event.get("type") != "asset_uploaded":
+            return
+        with self._lock:
+            project = self._projects.get(event["data"]["project_id"])
+            if project is not None:
+                project.stale = True
+
+    def _read(self, project_id: int, after_id: int) -> list[tuple[int, str]]:
+        # Hashes of the project's assets with id > after_id; hashes the
+        # images that have none yet (uploaded before hashes were recorded)
+        db = SessionLocal()
+        try:
+            assets = (
+                db.query(models.Asset)
+                .filter(models.Asset.project_id == project_id, models.Asset.id > after_id)
+                .all()
+            )
+            changed = False
+            for asset in assets:
+                if asset.phash is None and is_image(asset.file_path):
+                    path = ai_suggestions.asset_path(asset)
+                    if os.path.exists(path):
+                        asset.phash = compute(path)
+                        changed = True
+            if changed:
+                db.commit()
+            return [(asset.id, asset.phash) for asset in assets if asset.phash is not None]
+        finally:
+            db.close()
+
+    def _project(self, project_id: int) -> _ProjectIndex:
+        with self._lock:
+            project = self._projects.get(project_id)
+            if project is not None and not project.stale:
+                return project
+            after_id = project.max_id if project is not None else 0
+            if project is not None:
+                project.stale = False
+
+        rows = self._read(project_id, after_id)
+        with self._lock:
+            if project is None:
+                # Another thread may have loaded it meanwhile; either copy is complete
+                project = self._projects.setdefault(project_id, _ProjectIndex())
+            for asset_id, phash in rows:
+                project.add(asset_id, phash)
+                project.max_id = max(project.max_id, asset_id)
+            return project
+
+    def add(self, project_id: int, asset_id: int, phash: str) -> None:
+        with self._lock:
+            project = self._projects.get(project_id)
+            if project is not None:
+                project.add(asset_id, phash)
+
+    def remove(self, project_id: int, asset_id: int) -> None:
+        with self._lock:
+            project = self._projects.get(project_id)
+            if project is not None:
+                project.remove(asset_id)
+
+    def drop_project(self, project_id: int) -> None:
+        with self._lock:
+            self._projects.pop(project_id, None)
+
+    def similar(
+        self,
+        project_id: int,
+        phash: str,
+        max_distance: int,
+        exclude_id: int | None = None,
+    ) -> list[tuple[int, int]]:
+        """
+        (asset_id, distance) of the project's images within `max_distance`
+        bits of `phash`, closest first. Blocking the first time a project
+        is used (DB read); call from a thread.
+        """
+        project = self._project(project_id)
+        with self._lock:
+            hits = project.search(phash, max_distance)
+        return [(asset_id, distance) for asset_id, distance in hits if asset_id != exclude_id]
+
+
+index = SimilarityIndex()
+
+
+def load_hits(db: Session, hits: list[tuple[int, int]], limit: int) -> list[tuple[models.Asset, int]]:
+    """(asset, distance) for the first `limit` hits that still exist."""
+    hits = hits[: limit * 2]  # some may have been deleted by another process
+    assets = {
+        asset.id: asset
+        for asset in db.query(models.Asset).filter(models.Asset.id.in_([i for i, _ in hits]))
+    }
+    return [(assets[i], distance) for i, distance in hits if i in assets][:limit]
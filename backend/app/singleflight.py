@@ -0,0 +1,173 @@
+"""
+Request coalescing.
+
+`SingleFlight.do(key, fn)` runs `fn` once per key at a time within a
+process: callers that arrive while it is in flight await the same result.
+`cross_process_lock(name)` extends that across worker processes: a
+Postgres advisory lock when the DB is Postgres, otherwise an flock on a
+file under LOCK_DIR (same host). The lock only prevents duplicate work,
+so waiting for it gives up after `timeout` and proceeds anyway.
+
+Advisory locks belong to a connection, which the holder keeps for as long
+as the locked work runs. They come from a small autocommit pool of their
+own (LOCK_POOL_SIZE) so slow model calls cannot starve request handlers of
+connections; waiters only borrow one for each attempt.
+"""
+
+import asyncio
+import fcntl
+import hashlib
+import os
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Hashable
+
+from sqlalchemy import create_engine, exc, text
+from sqlalchemy.engine import Connection, Engine
+
+from . import metrics
+from .config import settings
+from .database import engine
+
+LOCK_DIR = os.path.join("cache", "locks")
+LOCK_POLL_SECONDS = 0.1
+
+COALESCED = metrics.counter(
+    "singleflight_requests_total",
+    "Coalesced work by name and role (leader, coalesced = joined an in-flight call).",
+)
+
+
+class SingleFlight:
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self._inflight: dict[Hashable, asyncio.Future] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        future = self._inflight.get(key)
+        if future is not None:
+            COALESCED.inc(name=self.name, role="coalesced")
+            # shield: a cancelled follower must not cancel the shared call
+            return await asyncio.shield(future)
+
+        COALESCED.inc(name=self.name, role="leader")
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # Mark retrieved so nobody-was-waiting does not log a warning
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self._inflight[key]
+
+
+def _lock_id(name: str) -> int:
+    # Signed 64-bit key for pg_advisory_lock
+    return int.from_bytes(hashlib.sha256(name.encode()).digest()[:8], "big", signed=True)
+
+
+_lock_engine: Engine | None = None
+
+
+def _get_lock_engine() -> Engine:
+    global _lock_engine
+    if _lock_engine is None:
+        _lock_engine = create_engine(
+            settings.DATABASE_URL,
+            # No transaction left open while the lock is held
+            isolation_level="AUTOCOMMIT",
+            pool_size=settings.LOCK_POOL_SIZE,
+            max_overflow=0,
+            # A full pool counts as a failed attempt, not a blocked thread
+            pool_timeout=LOCK_POLL_SECONDS,
+            pool_pre_ping=True,
+        )
+    return _lock_engine
+
+
+def _try_pg_lock(lock_id: int) -> Connection | None:
+    """A connection holding the lock, or None (lock taken or pool exhausted)."""
+    try:
+        conn = _get_lock_engine().connect()
+    except exc.TimeoutError:
+        return None
+    try:
+        if conn.execute(text("SELECT pg_try_advisory_lock(:id)"), {"id": lock_id}).scalar():
+            return conn
+    except Exception:
+        conn.close()
+        raise
+    conn.close()
+    return None
+
+
+def _pg_unlock(conn: Connection, lock_id: int) -> None:
+    try:
+        conn.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": lock_id})
+    finally:
+        conn.close()
+
+
+@asynccontextmanager
+async def _pg_lock(name: str, timeout: float) -> AsyncIterator[bool]:
+    lock_id = _lock_id(name)
+    conn = None
+    waited = False
+    deadline = asyncio.get_running_loop().time() + timeout
+    while True:
+        conn = await asyncio.to_thread(_try_pg_lock, lock_id)
+        if conn is not None or asyncio.get_running_loop().time() >= deadline:
+            break
+        waited = True
+        await asyncio.sleep(LOCK_POLL_SECONDS)
+    try:
+        yield waited
+    finally:
+        if conn is not None:
+            await asyncio.to_thread(_pg_unlock, conn, lock_id)
+
+
+@asynccontextmanager
+async def _file_lock(name: str, timeout: float) -> AsyncIterator[bool]:
+    os.makedirs(LOCK_DIR, exist_ok=True)
+    path = os.path.join(LOCK_DIR, hashlib.sha256(name.encode()).hexdigest() + ".lock")
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        acquired = False
+        waited = False
+        deadline = asyncio.get_running_loop().time() + timeout
+        while True:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                acquired = True
+                break
+            except BlockingIOError:
+                if asyncio.get_running_loop().time() >= deadline:
+                    break
+                waited = True
+                await asyncio.sleep(LOCK_POLL_SECONDS)
+        try:
+            yield waited
+        finally:
+            if acquired:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+    finally:
+        os.close(fd)
+
+
+def cross_process_lock(name: str, timeout: float):
+    """
+    Async context manager; yields True if another process held the lock
+    and we had to wait (the caller should re-check for its result).
+    """
+    if engine.dialect.name == "postgresql":
+        return _pg_lock(name, timeout)
+    return _file_lock(name, timeout)
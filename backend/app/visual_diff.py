@@ -0,0 +1,314 @@
+"""
+Visual diff between two versions of an image asset.
+
+Both images are fitted to a common width (at most VISUAL_DIFF_MAX_SIZE),
+aligned by the global shift phase correlation finds between them (so a
+layout that moved down as a whole is not reported as changed everywhere),
+then compared per pixel with NumPy:
+
+- mask: pixels whose largest channel difference exceeds PIXEL_THRESHOLD,
+- regions: bounding boxes of the connected changed areas (on a CELL grid,
+  so nearby changes merge into one box),
+- similarity: share of pixels that did not change,
+- image: the newer version greyed out with changes tinted and boxed.
+
+The diff runs in app.image_pool; image and stats are cached on disk keyed
+by the (base, compared) pair of content hashes and DIFF_VERSION, so a
+repeat view only reads a small JSON file.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+from . import image_pool, metrics
+from .config import settings
+from .design_checks import IMAGE_EXTENSIONS, load_rgb
+
+logger = logging.getLogger(__name__)
+
+# Bump when the comparison or its output changes so cached diffs are redone
+DIFF_VERSION = "1"
+
+PIXEL_THRESHOLD = 24  # of 255, on the channel that changed most
+CELL = 16  # px; changed cells closer than one cell merge into one region
+CELL_MIN_PIXELS = 4  # fewer changed pixels in a cell is treated as noise
+MAX_REGIONS = 50
+ALIGN_SIZE = 256  # width the shift is estimated at
+ALIGN_MIN_PEAK = 0.15  # phase correlation peak below this = no clear shift
+ALIGN_MAX_SHIFT = 0.25  # of the image size
+CHANGE_COLOR = np.array([230, 30, 60], dtype=np.float32)
+
+
+class DiffError(Exception):
+    """The images could not be compared (corrupt, too large to decode, ...)."""
+
+
+DIFF_SECONDS = metrics.histogram(
+    "visual_diff_seconds",
+    "Time to produce a visual diff between two asset versions (cache=hit|miss).",
+    [0.005, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5],
+)
+
+
+def _fit_width(img: Image.Image, width: int) -> Image.Image:
+    if img.width == width:
+        return img
+    height = max(1, round(img.height * width / img.width))
+    return img.resize((width, height), Image.Resampling.BILINEAR, reducing_gap=2.0)
+
+
+def _estimate_shift(a: np.ndarray, b: np.ndarray) -> tuple[int, int]:
+    """
+    (dx, dy) to move `b` by so it lines up with `a`, by phase correlation
+    of downscaled luma over their common area; (0, 0) if there is no
+    clear peak.
+    """
+    height = min(a.shape[0], b.shape[0])
+    width = a.shape[1]
+    factor = min(1.0, ALIGN_SIZE / width)
+    small_size = (max(8, round(width * factor)), max(8, round(height * factor)))
+
+    def luma(pixels: np.ndarray) -> np.ndarray:
+        img = Image.fromarray(pixels[:height]).convert("L").resize(small_size, Image.Resampling.BILINEAR)
+        values = np.asarray(img, dtype=np.float32)
+        return values - values.mean()
+
+    fa = np.fft.rfft2(luma(a))
+    fb = np.fft.rfft2(luma(b))
+    cross = fa * np.conj(fb)
+    cross /= np.abs(cross) + 1e-6
+    corr = np.fft.irfft2(cross, s=(small_size[1], small_size[0]))
+    peak = np.unravel_index(np.argmax(corr), corr.shape)
+    if corr[peak] < ALIGN_MIN_PEAK:
+        return 0, 0
+
+    # Peaks past the middle are negative shifts (the correlation wraps around)
+    dy, dx = (int(p) - n if p > n // 2 else int(p) for p, n in zip(peak, corr.shape))
+    if abs(dx) > ALIGN_MAX_SHIFT * small_size[0] or abs(dy) > ALIGN_MAX_SHIFT * small_size[1]:
+        return 0, 0
+    return _refine_shift(a, b, round(dx / factor), round(dy / factor), round(1 / factor))
+
+
+def _refine_shift(a: np.ndarray, b: np.ndarray, dx: int, dy: int, radius: int) -> tuple[int, int]:
+    # The coarse shift is only accurate to one downscaled pixel; search the
+    # neighbourhood at full size, one axis at a time, for the closest match
+    if radius <= 1:
+        return dx, dy
+    la = np.asarray(Image.fromarray(a).convert("L"), dtype=np.float32)[::2, ::2]
+    lb = np.asarray(Image.fromarray(b).convert("L"), dtype=np.float32)[::2, ::2]
+
+    def cost(sx: int, sy: int) -> float:
+        # Mean difference where b moved by (sx, sy) overlaps a, at half size
+        sx, sy = sx // 2, sy // 2
+        h = min(la.shape[0], lb.shape[0] + sy) - max(0, sy)
+        w = min(la.shape[1], lb.shape[1] + sx) - max(0, sx)
+        if h <= 0 or w <= 0:
+            return float("inf")
+        pa = la[max(0, sy) : max(0, sy) + h, max(0, sx) : max(0, sx) + w]
+        pb = lb[max(0, -sy) : max(0, -sy) + h, max(0, -sx) : max(0, -sx) + w]
+        return float(np.abs(pa - pb).mean())
+
+    dy = min(range(dy - radius, dy + radius + 1, 2), key=lambda sy: cost(dx, sy))
+    dx = min(range(dx - radius, dx + radius + 1, 2), key=lambda sx: cost(sx, dy))
+    return dx, dy
+
+
+def _canvas(pixels: np.ndarray, size: tuple[int, int], offset: tuple[int, int]) -> np.ndarray:
+    # White (width, height) canvas with `pixels` pasted at `offset`, cropped to fit
+    width, height = size
+    dx, dy = offset
+    out = np.full((height, width, 3), 255, dtype=np.uint8)
+    src_y, src_x = max(0, -dy), max(0, -dx)
+    dst_y, dst_x = max(0, dy), max(0, dx)
+    h = min(pixels.shape[0] - src_y, height - dst_y)
+    w = min(pixels.shape[1] - src_x, width - dst_x)
+    if h > 0 and w > 0:
+        out[dst_y : dst_y + h, dst_x : dst_x + w] = pixels[src_y : src_y + h, src_x : src_x + w]
+    return out
+
+
+def _regions(cells: np.ndarray) -> list[tuple[int, int, int, int]]:
+    """(top, left, bottom, right) cell bounds of the 8-connected components."""
+    rows, cols = cells.shape
+    grid = cells.tolist()
+    regions = []
+    for r0, c0 in zip(*np.nonzero(cells)):
+        r0, c0 = int(r0), int(c0)
+        if not grid[r0][c0]:
+            continue
+        grid[r0][c0] = False
+        stack = [(r0, c0)]
+        top, left, bottom, right = r0, c0, r0, c0
+        while stack:
+            r, c = stack.pop()
+            top, bottom = min(top, r), max(bottom, r)
+            left, right = min(left, c), max(right, c)
+            for nr in (r - 1, r, r + 1):
+                if 0 <= nr < rows:
+                    row = grid[nr]
+                    for nc in (c - 1, c, c + 1):
+                        if 0 <= nc < cols and row[nc]:
+                            row[nc] = False
+                            stack.append((nr, nc))
+        regions.append((top, left, bottom, right))
+    return regions
+
+
+def compute(path_a: str, path_b: str, image_path: str) -> dict[str, Any] | None:
+    """
+    Diff of the image at `path_b` against the one at `path_a`; writes the
+    diff image to `image_path`. None if either is not an image. CPU-bound;
+    meant to run in the image pool.
+    """
+    started = time.perf_counter()
+    img_a = load_rgb(path_a, settings.VISUAL_DIFF_MAX_SIZE)
+    img_b = load_rgb(path_b, settings.VISUAL_DIFF_MAX_SIZE)
+    if img_a is None or img_b is None:
+        return None
+
+    width = min(img_a.width, img_b.width)
+    a = np.asarray(_fit_width(img_a, width))
+    b = np.asarray(_fit_width(img_b, width))
+    height = max(a.shape[0], b.shape[0])
+    offset = _estimate_shift(a, b)
+    a = _canvas(a, (width, height), (0, 0))
+    b = _canvas(b, (width, height), offset)
+
+    delta = np.abs(a.astype(np.int16) - b.astype(np.int16)).max(axis=2)
+    mask = delta > PIXEL_THRESHOLD
+
+    # Regions only from changes at least 2x2 px, so the 1 px seams resampling
+    # leaves along edges do not become boxes
+    solid = np.zeros_like(mask)
+    solid[:-1, :-1] = mask[:-1, :-1] & mask[1:, :-1] & mask[:-1, 1:] & mask[1:, 1:]
+    pad = ((0, -height % CELL), (0, -width % CELL))
+    padded = np.pad(solid, pad)
+    rows, cols = padded.shape[0] // CELL, padded.shape[1] // CELL
+    counts = padded.reshape(rows, CELL, cols, CELL).sum(axis=(1, 3))
+    changed_cells = counts >= CELL_MIN_PIXELS
+    # Grow by one cell so changes a few pixels apart end up in one region
+    grown = np.pad(changed_cells, 1)
+    grown = np.logical_or.reduce(
+        [grown[1 + dy : 1 + dy + rows, 1 + dx : 1 + dx + cols] for dy in (-1, 0, 1) for dx in (-1, 0, 1)]
+    )
+    # Boxes from the grown cells, trimmed back to the cells that changed
+    boxes = []
+    for top, left, bottom, right in _regions(grown):
+        inner = changed_cells[top : bottom + 1, left : right + 1]
+        if not inner.any():
+            continue
+        ys, xs = np.nonzero(inner)
+        y0, y1 = (top + ys.min()) * CELL, min(height, (top + ys.max() + 1) * CELL)
+        x0, x1 = (left + xs.min()) * CELL, min(width, (left + xs.max() + 1) * CELL)
+        boxes.append((x0, y0, x1, y1))
+    boxes.sort(key=lambda box: (box[2] - box[0]) * (box[3] - box[1]), reverse=True)
+
+    regions = [
+        {
+            "x": int(x0),
+            "y": int(y0),
+            "width": int(x1 - x0),
+            "height": int(y1 - y0),
+            "changed_share": round(float(mask[y0:y1, x0:x1].mean()), 3),
+        }
+        for x0, y0, x1, y1 in boxes[:MAX_REGIONS]
+    ]
+
+    # Newer version faded to grey, changed pixels tinted, regions boxed
+    grey = np.asarray(Image.fromarray(b).convert("L"), dtype=np.float32)[..., None]
+    out = np.repeat(grey * 0.35 + 165, 3, axis=2)
+    out[mask] = b[mask] * 0.35 + CHANGE_COLOR * 0.65
+    diff_img = Image.fromarray(out.astype(np.uint8))
+    draw = ImageDraw.Draw(diff_img)
+    for region in regions:
+        draw.rectangle(
+            (region["x"], region["y"], region["x"] + region["width"] - 1, region["y"] + region["height"] - 1),
+            outline=tuple(int(v) for v in CHANGE_COLOR),
+            width=2,
+        )
+    tmp_path = f"{image_path}.{os.getpid()}.tmp"
+    diff_img.save(tmp_path, "WEBP", quality=80, method=0)
+    os.replace(tmp_path, image_path)
+
+    changed_share = float(mask.mean())
+    return {
+        "version": DIFF_VERSION,
+        "size": [width, height],
+        "offset": list(offset),
+        "similarity": round(1 - changed_share, 4),
+        "changed_share": round(changed_share, 4),
+        "mean_difference": round(float(delta.mean()) / 255, 4),
+        "regions": regions,
+        "more_regions": max(0, len(boxes) - MAX_REGIONS),
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+    }
+
+
+# ---------- cache (API process) ----------
+
+
+def _cache_base(hash_a: str, hash_b: str) -> str:
+    return os.path.join(settings.VISUAL_DIFF_CACHE_DIR, f"{hash_a}-{hash_b}-v{DIFF_VERSION}")
+
+
+def image_path(hash_a: str, hash_b: str) -> str:
+    """Where the diff image of a cached diff is stored."""
+    return f"{_cache_base(hash_a, hash_b)}.webp"
+
+
+def is_image(path: str) -> bool:
+    return os.path.splitext(path.lower())[1] in IMAGE_EXTENSIONS
+
+
+def diff_for(path_a: str, hash_a: str, path_b: str, hash_b: str) -> dict[str, Any] | None:
+    """
+    Cached diff of file b against file a, or None if either is not an
+    image. Blocking; call from a thread. Pool errors (timeout, a broken
+    pool) propagate; anything the comparison itself raises (e.g. Pillow's
+    DecompressionBombError) becomes DiffError.
+    """
+    if not (is_image(path_a) and is_image(path_b)):
+        return None
+    started = time.perf_counter()
+    stats_path = f"{_cache_base(hash_a, hash_b)}.json"
+    try:
+        with open(stats_path, encoding="utf-8") as f:
+            report = json.load(f)
+        if os.path.exists(image_path(hash_a, hash_b)):
+            DIFF_SECONDS.observe(time.perf_counter() - started, cache="hit")
+            return report
+    except FileNotFoundError:
+        pass
+
+    os.makedirs(settings.VISUAL_DIFF_CACHE_DIR, exist_ok=True)
+    try:
+        report = image_pool.run(
+            compute,
+            path_a,
+            path_b,
+            image_path(hash_a, hash_b),
+            timeout=settings.VISUAL_DIFF_TIMEOUT_SECONDS,
+        )
+    except (FutureTimeoutError, BrokenProcessPool):
+        raise
+    except Exception as e:
+        logger.warning("Visual diff of %s against %s failed: %r", path_b, path_a, e)
+        raise DiffError(str(e)) from e
+    if report is None:
+        return None
+
+    tmp_path = f"{stats_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(report, f)
+    os.replace(tmp_path, stats_path)
+    DIFF_SECONDS.observe(time.perf_counter() - started, cache="miss")
+    return report
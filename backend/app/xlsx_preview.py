@@ -0,0 +1,278 @@
+"""
+Streaming preview of XLSX workbooks.
+
+A preview is the list of sheets (name + declared range) and a window of
+rows of one sheet. Everything is streamed out of the zip with iterparse:
+
+- sheet ranges come from the <dimension> element at the top of each
+  sheet, so parsing stops there,
+- rows before the window are skipped without XML parsing: the
+  decompressed bytes are scanned for <row r="..."> tags and the parser
+  only starts at the first row of the window (skipping is a regex over
+  the stream, far cheaper than building elements),
+- the window is parsed row by row and parsing stops after its last row,
+- shared strings are resolved afterwards in one pass over
+  sharedStrings.xml that keeps only the strings the window uses and stops
+  after the last one.
+
+A 40 MB workbook therefore costs about as much as the rows asked for (plus
+decompressing the rows before them). Windows are cached on disk per
+content hash.
+"""
+
+import json
+import os
+import re
+import threading
+import time
+import zipfile
+from typing import IO, Any, Iterator
+from xml.etree.ElementTree import ParseError, XMLPullParser, iterparse
+
+from . import metrics
+from .ai_documents import column_index, xlsx_sheets
+from .config import settings
+
+# Bump when the preview format changes so cached windows are redone
+PREVIEW_VERSION = "1"
+MAX_COLUMNS = 100
+MAX_CELL_CHARS = 1000
+CHUNK_BYTES = 1 << 16
+
+_S = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+# Tags as bytes, with or without a namespace prefix
+_SHEET_DATA_TAG = re.compile(rb"<(?:[\w.-]+:)?sheetData\b[^>]*>")
+_ROW_TAG = re.compile(rb"<(?:[\w.-]+:)?row\b([^>]*)>")
+_ROW_NUMBER = re.compile(rb'\br="(\d+)"')
+
+PREVIEW_SECONDS = metrics.histogram(
+    "xlsx_preview_seconds",
+    "Time to produce a spreadsheet preview window (cache=hit|miss).",
+    [0.005, 0.025, 0.1, 0.25, 0.5, 1, 2.5, 5, 10],
+)
+
+
+class SheetNotFoundError(Exception):
+    pass
+
+
+def is_spreadsheet(path: str) -> bool:
+    return os.path.splitext(path.lower())[1] == ".xlsx"
+
+
+def _dimension(zf: zipfile.ZipFile, member: str) -> str | None:
+    with zf.open(member) as f:
+        for _, elem in iterparse(f, events=("start",)):
+            if elem.tag == f"{_S}dimension":
+                return elem.get("ref")
+            if elem.tag == f"{_S}sheetData":
+                return None
+    return None
+
+
+def _cell_value(c: Any) -> tuple[str, int | None]:
+    # (text, shared string index to resolve later)
+    kind = c.get("t")
+    if kind == "inlineStr":
+        return "".join(t.text or "" for t in c.iter(f"{_S}t")), None
+    v = c.find(f"{_S}v")
+    value = v.text if v is not None and v.text else ""
+    if kind == "s" and value.isdigit():
+        return "", int(value)
+    if kind == "b":
+        return ("TRUE" if value == "1" else "FALSE"), None
+    return value, None
+
+
+def _skip_to_row(f: IO[bytes], start_row: int) -> tuple[bytes, bytes, int]:
+    """
+    (head, rest, next_number): the sheet XML up to and including
+    <sheetData>, the bytes read so far from the first row numbered
+    start_row or later, and the number a row without an r attribute there
+    would have.
+    """
+    buffer = b""
+    while True:
+        chunk = f.read(CHUNK_BYTES)
+        buffer += chunk
+        match = _SHEET_DATA_TAG.search(buffer)
+        if match:
+            break
+        if not chunk:
+            return buffer, b"", 1
+    head, buffer = buffer[: match.end()], buffer[match.end() :]
+    if head.endswith(b"/>") or start_row <= 1:
+        return head, buffer, 1
+
+    next_number = 1
+    while True:
+        scanned = 0
+        for match in _ROW_TAG.finditer(buffer):
+            number = _ROW_NUMBER.search(match.group(1))
+            if number is None or int(number.group(1)) >= start_row:
+                return head, buffer[match.start() :], next_number
+            next_number = int(number.group(1)) + 1
+            scanned = match.end()
+        # Keep a tag cut off by the chunk boundary for the next round
+        cut = buffer.rfind(b"<", scanned)
+        buffer = buffer[cut:] if cut >= 0 else b""
+        chunk = f.read(CHUNK_BYTES)
+        if not chunk:
+            return head, b"", next_number
+        buffer += chunk
+
+
+def _events(f: IO[bytes], head: bytes, rest: bytes) -> Iterator[tuple[str, Any]]:
+    parser = XMLPullParser(events=("start", "end"))
+    parser.feed(head)
+    parser.feed(rest)
+    while True:
+        yield from parser.read_events()
+        chunk = f.read(CHUNK_BYTES)
+        if not chunk:
+            return
+        parser.feed(chunk)
+
+
+def _window(
+    zf: zipfile.ZipFile,
+    member: str,
+    start_row: int,
+    count: int,
+) -> tuple[list[dict[str, Any]], bool, list[tuple[list[str], int, int]]]:
+    """
+    (rows, has_more, pending): non-empty rows numbered start_row ..
+    start_row + count - 1, whether the sheet goes on, and the cells that
+    still need a shared string as (cells, column, string index).
+    """
+    rows: list[dict[str, Any]] = []
+    pending: list[tuple[list[str], int, int]] = []
+    has_more = False
+    sheet_data = None
+    end = start_row + count
+    with zf.open(member) as f:
+        head, rest, next_number = _skip_to_row(f, start_row)
+        for event, elem in _events(f, head, rest):
+            if event == "start":
+                if elem.tag == f"{_S}sheetData":
+                    sheet_data = elem
+                continue
+            if elem.tag != f"{_S}row":
+                continue
+            r = elem.get("r")
+            number = int(r) if r and r.isdigit() else next_number
+            next_number = number + 1
+            if number >= end:
+                has_more = True
+                break
+            if number >= start_row:
+                cells: list[str] = []
+                for position, c in enumerate(elem.iter(f"{_S}c")):
+                    ref = c.get("r")
+                    column = column_index(ref) if ref else position
+                    if column >= MAX_COLUMNS:
+                        continue
+                    value, shared = _cell_value(c)
+                    if column >= len(cells):
+                        cells.extend([""] * (column - len(cells) + 1))
+                    cells[column] = value[:MAX_CELL_CHARS]
+                    if shared is not None:
+                        pending.append((cells, column, shared))
+                if cells:
+                    rows.append({"row": number, "cells": cells})
+            # Drop the rows read so far; only the window is kept
+            if sheet_data is not None:
+                sheet_data.clear()
+    return rows, has_more, pending
+
+
+def _shared_strings(zf: zipfile.ZipFile, needed: set[int]) -> dict[int, str]:
+    strings: dict[int, str] = {}
+    if not needed:
+        return strings
+    last = max(needed)
+    try:
+        f = zf.open("xl/sharedStrings.xml")
+    except KeyError:
+        return strings
+    with f:
+        index = 0
+        parts: list[str] = []
+        root = None
+        for event, elem in iterparse(f, events=("start", "end")):
+            if event == "start":
+                if root is None:
+                    root = elem
+                continue
+            if elem.tag == f"{_S}t" and elem.text:
+                parts.append(elem.text)
+            elif elem.tag == f"{_S}si":
+                if index in needed:
+                    strings[index] = "".join(parts)[:MAX_CELL_CHARS]
+                parts = []
+                index += 1
+                root.clear()
+                if index > last:
+                    break
+    return strings
+
+
+def _build(path: str, sheet: int, start_row: int, count: int) -> dict[str, Any]:
+    with zipfile.ZipFile(path) as zf:
+        sheets = xlsx_sheets(zf)
+        if not 0 <= sheet < len(sheets):
+            raise SheetNotFoundError()
+        rows, has_more, pending = _window(zf, sheets[sheet][1], start_row, count)
+        strings = _shared_strings(zf, {index for _, _, index in pending})
+        for cells, column, index in pending:
+            cells[column] = strings.get(index, "")
+        return {
+            "sheets": [
+                {"index": i, "name": name, "dimension": _dimension(zf, member)}
+                for i, (name, member) in enumerate(sheets)
+            ],
+            "sheet": sheet,
+            "start_row": start_row,
+            "rows": rows,
+            "columns": max((len(row["cells"]) for row in rows), default=0),
+            "has_more": has_more,
+        }
+
+
+def _cache_path(content_hash: str, sheet: int, start_row: int, count: int) -> str:
+    name = f"{content_hash}-s{sheet}-r{start_row}-n{count}-v{PREVIEW_VERSION}.json"
+    return os.path.join(settings.XLSX_PREVIEW_CACHE_DIR, name)
+
+
+def preview(path: str, content_hash: str, sheet: int, start_row: int, count: int) -> dict[str, Any] | None:
+    """
+    Sheets of the workbook and rows start_row .. start_row + count - 1
+    (1-based, as in Excel) of sheet number `sheet`, or None if the file is
+    not a readable XLSX. Raises SheetNotFoundError for a sheet number out
+    of range. Blocking; call from a thread.
+    """
+    if not is_spreadsheet(path):
+        return None
+    started = time.perf_counter()
+    cache_path = _cache_path(content_hash, sheet, start_row, count)
+    try:
+        with open(cache_path, encoding="utf-8") as f:
+            result = json.load(f)
+        PREVIEW_SECONDS.observe(time.perf_counter() - started, cache="hit")
+        return result
+    except FileNotFoundError:
+        pass
+
+    try:
+        result = _build(path, sheet, start_row, count)
+    except (zipfile.BadZipFile, KeyError, ParseError):
+        # Corrupt file, or not what its extension says
+        return None
+
+    os.makedirs(settings.XLSX_PREVIEW_CACHE_DIR, exist_ok=True)
+    tmp_path = f"{cache_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False)
+    os.replace(tmp_path, cache_path)
+    PREVIEW_SECONDS.observe(time.perf_counter() - started, cache="miss")
+    return result
@@ -0,0 +1,228 @@
+"""
+Request size and latency of document text extraction before AI submission.
+
+Generates a DOCX (text, tables, an embedded photo), an XLSX (a large
+sheet) and a PDF (text pages with a scanned-looking image each), runs them
+through app.ai_documents (cold, then cached), and times a full chat
+completion against benchmarks.fake_openai with the raw data URL the old
+code sent vs. the extracted text.
+
+    cd backend
+    python -m benchmarks.ai_doc_extract --pages 40 --rows 20000
+"""
+
+import argparse
+import asyncio
+import base64
+import io
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import zipfile
+import zlib
+from xml.sax.saxutils import escape
+
+import httpx
+from PIL import Image
+
+_LOREM = (
+    "The onboarding flow asks for too much up front and users drop off before "
+    "they see the dashboard, so we propose deferring billing details until later. "
+)
+
+_CONTENT_TYPES = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">
+<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>
+<Default Extension="xml" ContentType="application/xml"/>
+<Default Extension="png" ContentType="image/png"/>
+</Types>"""
+
+
+def _noise_png(width: int, height: int) -> bytes:
+    out = io.BytesIO()
+    Image.effect_noise((width, height), 60).convert("RGB").save(out, "PNG")
+    return out.getvalue()
+
+
+def _make_docx(path: str, pages: int) -> None:
+    w = 'xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"'
+    body = []
+    for page in range(pages):
+        body.append(f'<w:p><w:pPr><w:pStyle w:val="Heading1"/></w:pPr><w:r><w:t>Section {page + 1}</w:t></w:r></w:p>')
+        for _ in range(6):
+            body.append(f"<w:p><w:r><w:t>{escape(_LOREM * 2)}</w:t></w:r></w:p>")
+        body.append("<w:tbl>")
+        for row in range(5):
+            cells = "".join(
+                f"<w:tc><w:p><w:r><w:t>r{row}c{col}</w:t></w:r></w:p></w:tc>" for col in range(4)
+            )
+            body.append(f"<w:tr>{cells}</w:tr>")
+        body.append("</w:tbl>")
+    document = f'<?xml version="1.0"?><w:document {w}><w:body>{"".join(body)}</w:body></w:document>'
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("[Content_Types].xml", _CONTENT_TYPES)
+        zf.writestr("word/document.xml", document)
+        zf.writestr("word/media/image1.png", _noise_png(1600, 1200))
+
+
+def _make_xlsx(path: str, rows: int) -> None:
+    s = 'xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"'
+    r = 'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships"'
+    shared = ["Region", "Product", "Units", "Revenue", "North", "South", "Widget", "Gadget"]
+    sheet_rows = ['<row r="1">' + "".join(
+        f'<c r="{col}1" t="s"><v>{i}</v></c>' for i, col in enumerate("ABCD")
+    ) + "</row>"]
+    for n in range(2, rows + 2):
+        sheet_rows.append(
+            f'<row r="{n}"><c r="A{n}" t="s"><v>{4 + n % 2}</v></c>'
+            f'<c r="B{n}" t="s"><v>{6 + n % 2}</v></c>'
+            f'<c r="C{n}"><v>{n * 7 % 100}</v></c><c r="D{n}"><f>C{n}*9.5</f><v>{n * 7 % 100 * 9.5}</v></c></row>'
+        )
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("[Content_Types].xml", _CONTENT_TYPES)
+        zf.writestr(
+            "xl/workbook.xml",
+            f'<workbook {s} {r}><sheets><sheet name="Sales" sheetId="1" r:id="rId1"/></sheets></workbook>',
+        )
+        zf.writestr(
+            "xl/_rels/workbook.xml.rels",
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            '<Relationship Id="rId1" Target="worksheets/sheet1.xml"/></Relationships>',
+        )
+        zf.writestr(
+            "xl/sharedStrings.xml",
+            f"<sst {s}>" + "".join(f"<si><t>{v}</t></si>" for v in shared) + "</sst>",
+        )
+        zf.writestr(
+            "xl/worksheets/sheet1.xml",
+            f'<worksheet {s}><dimension ref="A1:D{rows + 1}"/><sheetData>{"".join(sheet_rows)}</sheetData></worksheet>',
+        )
+
+
+def _make_pdf(path: str, pages: int) -> None:
+    # Hand-written PDF: per page a text content stream plus a noisy image XObject
+    image = Image.effect_noise((400, 300), 60).convert("RGB")
+    image_stream = zlib.compress(image.tobytes())
+    objects: list[bytes] = [b"", b""]  # 1: catalog, 2: pages (filled in below)
+    objects.append(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")  # 3
+    kids = []
+    for page in range(pages):
+        lines = [f"Section {page + 1}"] + [_LOREM[:90]] * 30
+        text = "BT /F1 10 Tf 50 780 Td 12 TL " + " ".join(
+            f"({line}) Tj T*" for line in lines
+        ) + " ET q 400 0 0 300 100 50 cm /Im1 Do Q"
+        content = zlib.compress(text.encode("latin-1"))
+        objects.append(b"<< /Length %d /Filter /FlateDecode >>\nstream\n" % len(content) + content + b"\nendstream")
+        content_id = len(objects)
+        objects.append(
+            b"<< /Type /XObject /Subtype /Image /Width 400 /Height 300 /ColorSpace /DeviceRGB "
+            b"/BitsPerComponent 8 /Filter /FlateDecode /Length %d >>\nstream\n" % len(image_stream)
+            + image_stream + b"\nendstream"
+        )
+        image_id = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Contents %d 0 R "
+            b"/Resources << /Font << /F1 3 0 R >> /XObject << /Im1 %d 0 R >> >> >>" % (content_id, image_id)
+        )
+        kids.append(len(objects))
+    objects[0] = b"<< /Type /Catalog /Pages 2 0 R >>"
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+        b" ".join(b"%d 0 R" % k for k in kids), len(kids)
+    )
+
+    out = io.BytesIO()
+    out.write(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(out.tell())
+        out.write(b"%d 0 obj\n" % number + body + b"\nendobj\n")
+    xref = out.tell()
+    out.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+    for offset in offsets:
+        out.write(b"%010d 00000 n \n" % offset)
+    out.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref))
+    with open(path, "wb") as f:
+        f.write(out.getvalue())
+
+
+async def _timed_chat(content: list[dict]) -> float:
+    from app import ai_client
+
+    started = time.perf_counter()
+    await ai_client.chat(model="gpt-4o-mini", messages=[{"role": "user", "content": content}])
+    return time.perf_counter() - started
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pages", type=int, default=40, help="DOCX sections / PDF pages")
+    parser.add_argument("--rows", type=int, default=20000, help="XLSX rows")
+    parser.add_argument("--fake-port", type=int, default=8099)
+    parser.add_argument("--latency", type=float, default=0.0, help="fake model latency")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    os.environ.update(
+        OPENAI_API_KEY="sk-fake",
+        OPENAI_BASE_URL=f"http://127.0.0.1:{args.fake_port}/v1",
+        AI_DOC_CACHE_DIR=os.path.join(workdir, "extracted"),
+    )
+    from app import ai_documents
+
+    files = {
+        "docx": os.path.join(workdir, "report.docx"),
+        "xlsx": os.path.join(workdir, "sales.xlsx"),
+        "pdf": os.path.join(workdir, "brochure.pdf"),
+    }
+    _make_docx(files["docx"], args.pages)
+    _make_xlsx(files["xlsx"], args.rows)
+    _make_pdf(files["pdf"], args.pages)
+
+    fake = subprocess.Popen(
+        [
+            sys.executable, "-m", "benchmarks.fake_openai",
+            "--port", str(args.fake_port), "--latency", str(args.latency),
+        ],
+    )
+    try:
+        for _ in range(50):
+            try:
+                httpx.get(f"http://127.0.0.1:{args.fake_port}/stats", timeout=1)
+                break
+            except httpx.HTTPError:
+                time.sleep(0.2)
+
+        # One event loop for all calls: the OpenAI client is bound to it
+        async def run() -> None:
+            for kind, path in files.items():
+                started = time.perf_counter()
+                doc = ai_documents.extract_document(path, kind)
+                cold = time.perf_counter() - started
+                started = time.perf_counter()
+                ai_documents.extract_document(path, kind)
+                cached = time.perf_counter() - started
+
+                with open(path, "rb") as f:
+                    raw_url = f"data:image/png;base64,{base64.b64encode(f.read()).decode('ascii')}"
+                extracted = doc.as_prompt().encode("utf-8")
+                raw_e2e = await _timed_chat([{"type": "image_url", "image_url": {"url": raw_url}}])
+                text_e2e = await _timed_chat([{"type": "text", "text": doc.as_prompt()}])
+
+                print(f"{kind}: {os.path.getsize(path) / 1e6:.2f} MB file, hints: {doc.hints}")
+                print(
+                    f"  request payload: {len(raw_url) / 1e6:.2f} MB -> {len(extracted) / 1e3:.1f} KB "
+                    f"({len(raw_url) / len(extracted):.0f}x smaller)"
+                )
+                print(f"  extract: cold {cold * 1000:.0f} ms, cached {cached * 1000:.1f} ms")
+                print(f"  end-to-end call: raw {raw_e2e * 1000:.0f} ms, extracted {text_e2e * 1000:.0f} ms")
+
+        asyncio.run(run())
+    finally:
+        fake.terminate()
+        fake.wait()
+
+
+if __name__ == "__main__":
+    main()
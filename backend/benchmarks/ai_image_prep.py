@@ -0,0 +1,115 @@
+"""
+Bytes saved and latency of image preprocessing before AI submission.
+
+Generates a large photo-like PNG, runs it through app.ai_images (cold,
+then cached), and times a full chat completion against
+benchmarks.fake_openai with the raw data URL vs. the preprocessed one.
+
+    cd backend
+    python -m benchmarks.ai_image_prep --width 4000 --height 3000
+"""
+
+import argparse
+import asyncio
+import base64
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+from PIL import Image
+
+
+def _make_image(path: str, width: int, height: int) -> None:
+    # Gradient + noise compresses about as badly as a real photo in PNG
+    gradient = Image.linear_gradient("L").resize((width, height)).convert("RGB")
+    noise = Image.effect_noise((width, height), 40).convert("RGB")
+    Image.blend(gradient, noise, 0.5).save(path, "PNG")
+
+
+async def _timed_chat(data_url: str) -> float:
+    from app import ai_client
+
+    started = time.perf_counter()
+    await ai_client.chat(
+        model="gpt-4o-mini",
+        messages=[
+            {
+                "role": "user",
+                "content": [
+                    {"type": "text", "text": "Review this design."},
+                    {"type": "image_url", "image_url": {"url": data_url}},
+                ],
+            }
+        ],
+    )
+    return time.perf_counter() - started
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--width", type=int, default=4000)
+    parser.add_argument("--height", type=int, default=3000)
+    parser.add_argument("--fake-port", type=int, default=8099)
+    parser.add_argument("--latency", type=float, default=0.0, help="fake model latency")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    os.environ.update(
+        OPENAI_API_KEY="sk-fake",
+        OPENAI_BASE_URL=f"http://127.0.0.1:{args.fake_port}/v1",
+        AI_IMAGE_CACHE_DIR=os.path.join(workdir, "prepared"),
+    )
+    from app import ai_images
+
+    path = os.path.join(workdir, "big.png")
+    _make_image(path, args.width, args.height)
+    original = os.path.getsize(path)
+
+    started = time.perf_counter()
+    prepared = ai_images.prepare_image(path, "bench")
+    cold = time.perf_counter() - started
+    started = time.perf_counter()
+    ai_images.prepare_image(path, "bench")
+    cached = time.perf_counter() - started
+
+    with open(path, "rb") as f:
+        raw_url = f"data:image/png;base64,{base64.b64encode(f.read()).decode('ascii')}"
+
+    fake = subprocess.Popen(
+        [
+            sys.executable, "-m", "benchmarks.fake_openai",
+            "--port", str(args.fake_port), "--latency", str(args.latency),
+        ],
+    )
+    try:
+        for _ in range(50):
+            try:
+                httpx.get(f"http://127.0.0.1:{args.fake_port}/stats", timeout=1)
+                break
+            except httpx.HTTPError:
+                time.sleep(0.2)
+
+        async def run() -> tuple[float, float]:
+            return await _timed_chat(raw_url), await _timed_chat(prepared.data_url)
+
+        raw_e2e, prepared_e2e = asyncio.run(run())
+    finally:
+        fake.terminate()
+        fake.wait()
+
+    saved = original - len(prepared.data)
+    print(f"image {args.width}x{args.height} PNG: {original / 1e6:.1f} MB")
+    print(
+        f"sent: {len(prepared.data) / 1e3:.0f} KB {prepared.mime} "
+        f"(saved {saved / 1e6:.1f} MB, {100 * saved / original:.1f}%)"
+    )
+    print(f"request body: {len(raw_url) / 1e6:.1f} MB -> {len(prepared.data_url) / 1e6:.2f} MB")
+    print(f"prep: cold {cold * 1000:.0f} ms, cached {cached * 1000:.1f} ms")
+    print(f"end-to-end call: raw {raw_e2e * 1000:.0f} ms, prepared {prepared_e2e * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+"""
+Load test: many concurrent AI suggestion requests against a slow (fake)
+model, while a probe keeps hitting a cheap endpoint. With the async,
+semaphore-bounded client the probe latency should stay near its idle
+baseline instead of queueing behind the AI calls.
+
+Starts benchmarks.fake_openai and the API (uvicorn) on a throwaway SQLite
+database, uploads `--requests` distinct images (with precompute on upload
+turned off), then requests suggestions for all of them at once and polls
+the resulting background jobs.
+
+    cd backend
+    python -m benchmarks.ai_load --requests 40 --latency 2 --rate-limit 0.1
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _percentile(values: list[float], pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def _summary(values: list[float]) -> str:
+    if not values:
+        return "n/a"
+    return (
+        f"p50={statistics.median(values):.1f} "
+        f"p99={_percentile(values, 99):.1f} "
+        f"max={max(values):.1f}"
+    )
+
+
+def _wait_for(url: str, timeout: float = 20) -> None:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            httpx.get(url, timeout=1)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up")
+
+
+def _make_token(workdir: str) -> str:
+    # Same DB as the server; create a user directly and mint a JWT for it
+    sys.path.insert(0, BACKEND_DIR)
+    os.chdir(workdir)
+    from app.database import SessionLocal
+    from app import models
+    from app.deps import create_access_token
+
+    db = SessionLocal()
+    try:
+        user = models.User(email="load@example.com", display_name="load")
+        db.add(user)
+        db.commit()
+        return create_access_token({"sub": str(user.id)})
+    finally:
+        db.close()
+
+
+async def _probe(client: httpx.AsyncClient, headers: dict, stop: asyncio.Event, interval: float) -> list[float]:
+    samples: list[float] = []
+    while not stop.is_set():
+        started = time.perf_counter()
+        await client.get("/projects/", headers=headers)
+        samples.append((time.perf_counter() - started) * 1000)
+        await asyncio.sleep(interval)
+    return samples
+
+
+async def _run(base_url: str, token: str, requests: int, interval: float) -> None:
+    headers = {"Authorization": f"Bearer {token}"}
+    async with httpx.AsyncClient(base_url=base_url, timeout=300) as client:
+        project = (await client.post("/projects/", json={"name": "load"}, headers=headers)).json()
+        asset_ids = []
+        for i in range(requests):
+            # Distinct bytes so the suggestion cache cannot answer
+            res = await client.post(
+                f"/projects/{project['id']}/assets",
+                files={"file": (f"{i}.png", f"image-{i}".encode(), "image/png")},
+                headers=headers,
+            )
+            asset_ids.append(res.json()["id"])
+
+        idle_stop = asyncio.Event()
+        idle_task = asyncio.create_task(_probe(client, headers, idle_stop, interval))
+        await asyncio.sleep(1)
+        idle_stop.set()
+        idle = await idle_task
+
+        async def ai_call(asset_id: int) -> tuple[int, float]:
+            started = time.perf_counter()
+            res = await client.get(f"/assets/{asset_id}/ai-suggestions", headers=headers)
+            if res.status_code == 202:
+                # Queued as a background job: poll until it finishes
+                job = res.json()["job"]
+                while job["status"] in ("queued", "running"):
+                    await asyncio.sleep(0.2)
+                    job = (await client.get(f"/ai-jobs/{job['id']}", headers=headers)).json()
+                return (200 if job["status"] == "succeeded" else 502), time.perf_counter() - started
+            return res.status_code, time.perf_counter() - started
+
+        load_stop = asyncio.Event()
+        probe_task = asyncio.create_task(_probe(client, headers, load_stop, interval))
+        started = time.perf_counter()
+        results = await asyncio.gather(*(ai_call(aid) for aid in asset_ids))
+        elapsed = time.perf_counter() - started
+        load_stop.set()
+        loaded = await probe_task
+
+    codes: dict[int, int] = {}
+    for code, _ in results:
+        codes[code] = codes.get(code, 0) + 1
+    print(f"{requests} AI requests in {elapsed:.1f}s, status codes {codes}")
+    print(f"AI request s:         {_summary([d for _, d in results])}")
+    print(f"probe ms, idle:       {_summary(idle)} ({len(idle)} samples)")
+    print(f"probe ms, under load: {_summary(loaded)} ({len(loaded)} samples)")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=40)
+    parser.add_argument("--latency", type=float, default=2.0)
+    parser.add_argument("--rate-limit", type=float, default=0.0)
+    parser.add_argument("--job-workers", type=int, default=8)
+    parser.add_argument("--probe-interval", type=float, default=0.05)
+    parser.add_argument("--api-port", type=int, default=8765)
+    parser.add_argument("--fake-port", type=int, default=8099)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    os.makedirs(os.path.join(workdir, "uploads"), exist_ok=True)
+    env = dict(
+        os.environ,
+        PYTHONPATH=BACKEND_DIR,
+        DATABASE_URL=f"sqlite:///{workdir}/load.db",
+        OPENAI_API_KEY="sk-fake",
+        OPENAI_BASE_URL=f"http://127.0.0.1:{args.fake_port}/v1",
+        AI_PRECOMPUTE_ON_UPLOAD="0",
+        AI_JOB_WORKERS=str(args.job_workers),
+        AI_JOB_POLL_SECONDS="0.2",
+    )
+    os.environ.update(env)
+
+    fake = subprocess.Popen(
+        [
+            sys.executable, "-m", "benchmarks.fake_openai",
+            "--port", str(args.fake_port),
+            "--latency", str(args.latency),
+            "--rate-limit", str(args.rate_limit),
+        ],
+        cwd=BACKEND_DIR,
+        env=env,
+    )
+    api = subprocess.Popen(
+        [
+            sys.executable, "-m", "uvicorn", "app.main:app",
+            "--port", str(args.api_port), "--log-level", "warning",
+        ],
+        cwd=workdir,
+        env=env,
+    )
+    try:
+        base_url = f"http://127.0.0.1:{args.api_port}"
+        _wait_for(f"http://127.0.0.1:{args.fake_port}/stats")
+        _wait_for(f"{base_url}/health/metrics")
+        token = _make_token(workdir)
+        asyncio.run(_run(base_url, token, args.requests, args.probe_interval))
+        stats = httpx.get(f"http://127.0.0.1:{args.fake_port}/stats").json()
+        print(f"fake OpenAI saw {stats['requests']} calls (incl. retries)")
+    finally:
+        api.terminate()
+        fake.terminate()
+        api.wait()
+        fake.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+Cross-process delivery latency of the real-time backplane.
+
+Spawns N subscriber processes (stand-ins for uvicorn workers) and one
+publisher. The publisher sends timestamped events through the backplane and
+every subscriber records how long each event took to arrive.
+
+    cd backend
+    python -m benchmarks.backplane_latency --workers 4 --events 2000
+    python -m benchmarks.backplane_latency --backend postgres   # uses DATABASE_URL
+"""
+
+import argparse
+import asyncio
+import multiprocessing as mp
+import os
+import statistics
+import tempfile
+import time
+
+from app.backplane import create_backplane, run_broker, UnixSocketBackplane
+
+
+def _make_backplane(kind: str, socket_path: str):
+    if kind == "unix":
+        return UnixSocketBackplane(socket_path)
+    return create_backplane(kind)
+
+
+def _broker_main(socket_path: str) -> None:
+    asyncio.run(run_broker(socket_path))
+
+
+def _subscriber_main(kind: str, socket_path: str, expected: int, ready, results) -> None:
+    async def run() -> None:
+        latencies: list[float] = []
+        done = asyncio.Event()
+
+        def deliver(message: dict) -> None:
+            latencies.append(time.time() - message["sent"])
+            if len(latencies) >= expected:
+                done.set()
+
+        backplane = _make_backplane(kind, socket_path)
+        await backplane.start(deliver)
+        ready.release()
+        try:
+            await asyncio.wait_for(done.wait(), timeout=60)
+        except asyncio.TimeoutError:
+            pass
+        await backplane.stop()
+        results.put(latencies)
+
+    asyncio.run(run())
+
+
+def _publisher_main(kind: str, socket_path: str, events: int, rate: float) -> None:
+    async def run() -> None:
+        backplane = _make_backplane(kind, socket_path)
+        await backplane.start(lambda message: None)
+        interval = 1.0 / rate if rate else 0
+        for i in range(events):
+            backplane.publish({"rooms": ["project:1"], "seq": i, "sent": time.time()})
+            await asyncio.sleep(interval)
+        await asyncio.sleep(0.5)
+        await backplane.stop()
+
+    asyncio.run(run())
+
+
+def _percentile(values: list[float], pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--backend", choices=["unix", "postgres"], default="unix")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--events", type=int, default=2000)
+    parser.add_argument("--rate", type=float, default=1000, help="events/second, 0 = flat out")
+    args = parser.parse_args()
+
+    socket_path = os.path.join(tempfile.mkdtemp(), "bench.sock")
+    broker = None
+    if args.backend == "unix":
+        broker = mp.Process(target=_broker_main, args=(socket_path,), daemon=True)
+        broker.start()
+        time.sleep(0.3)
+
+    ready = mp.Semaphore(0)
+    results: mp.Queue = mp.Queue()
+    subscribers = [
+        mp.Process(
+            target=_subscriber_main,
+            args=(args.backend, socket_path, args.events, ready, results),
+        )
+        for _ in range(args.workers)
+    ]
+    for proc in subscribers:
+        proc.start()
+    for _ in subscribers:
+        ready.acquire()
+
+    started = time.perf_counter()
+    publisher = mp.Process(
+        target=_publisher_main,
+        args=(args.backend, socket_path, args.events, args.rate),
+    )
+    publisher.start()
+
+    per_worker = [results.get() for _ in subscribers]
+    elapsed = time.perf_counter() - started
+    publisher.join()
+    for proc in subscribers:
+        proc.join()
+    if broker is not None:
+        broker.terminate()
+
+    all_ms = [lat * 1000 for worker in per_worker for lat in worker]
+    delivered = len(all_ms)
+    expected = args.events * args.workers
+    print(f"backend={args.backend} workers={args.workers} events={args.events}")
+    print(f"delivered {delivered}/{expected} in {elapsed:.2f}s")
+    if all_ms:
+        print(
+            "latency ms: "
+            f"p50={statistics.median(all_ms):.3f} "
+            f"p95={_percentile(all_ms, 95):.3f} "
+            f"p99={_percentile(all_ms, 99):.3f} "
+            f"max={max(all_ms):.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
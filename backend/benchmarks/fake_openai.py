@@ -0,0 +1,100 @@
+"""
+Local stand-in for the OpenAI chat completions API.
+
+Answers POST /v1/chat/completions after a configurable delay with a fixed
+list of suggestions, and can throttle (429 + Retry-After) or fail (500) a
+fraction of requests. Point the app at it with
+
+    OPENAI_BASE_URL=http://127.0.0.1:8099/v1 OPENAI_API_KEY=sk-fake
+
+and run it with
+
+    cd backend
+    python -m benchmarks.fake_openai --port 8099 --latency 2 --rate-limit 0.1
+"""
+
+import argparse
+import asyncio
+import random
+import time
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+REPLY = "\n".join(
+    [
+        "- Increase contrast between the headline and the background.",
+        "- Align the body text to a consistent left edge.",
+        "- Add more whitespace around the primary call to action.",
+        "- Reduce the number of accent colours to two.",
+    ]
+)
+
+
+def create_app(latency: float, rate_limit: float, error_rate: float) -> FastAPI:
+    app = FastAPI()
+    app.state.requests = 0
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        app.state.requests += 1
+
+        roll = random.random()
+        if roll < rate_limit:
+            return JSONResponse(
+                {"error": {"message": "Rate limit reached", "type": "rate_limit_error"}},
+                status_code=429,
+                headers={"retry-after": "0.2"},
+            )
+        if roll < rate_limit + error_rate:
+            return JSONResponse(
+                {"error": {"message": "Internal error", "type": "server_error"}},
+                status_code=500,
+            )
+
+        await asyncio.sleep(latency)
+        prompt_tokens = len(str(body.get("messages", ""))) // 4
+        completion_tokens = len(REPLY) // 4
+        return {
+            "id": f"chatcmpl-fake-{app.state.requests}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "fake"),
+            "choices": [
+                {
+                    "index": 0,
+                    "message": {"role": "assistant", "content": REPLY},
+                    "finish_reason": "stop",
+                }
+            ],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        }
+
+    @app.get("/stats")
+    async def stats():
+        return {"requests": app.state.requests}
+
+    return app
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--latency", type=float, default=2.0, help="seconds per completion")
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="fraction answered with 429")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction answered with 500")
+    args = parser.parse_args()
+
+    app = create_app(args.latency, args.rate_limit, args.error_rate)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Roll-up over a partitioned `activities` table. Needs a Postgres database
+that may be wiped: set TEST_POSTGRES_URL and run `python -m pytest` from
+backend/.
+"""
+
+import os
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine, func, select, text
+
+from app import models
+from app.activity_retention import (
+    MONTHS_AHEAD,
+    _monthly_partitions,
+    _next_month,
+    is_partitioned,
+    maintain_partitions,
+    partition_activities,
+    rollup,
+)
+from app.database import Base
+
+pytestmark = pytest.mark.skipif(
+    not os.getenv("TEST_POSTGRES_URL"), reason="TEST_POSTGRES_URL is not set"
+)
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine(os.environ["TEST_POSTGRES_URL"])
+    with engine.begin() as conn:
+        conn.execute(text("DROP SCHEMA public CASCADE"))
+        conn.execute(text("CREATE SCHEMA public"))
+    Base.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+def _insert_activities(engine, dates):
+    with engine.begin() as conn:
+        user_id = conn.execute(select(models.User.id)).scalar()
+        if user_id is None:
+            user_id = conn.execute(
+                models.User.__table__.insert().values(email="a@example.com").returning(models.User.id)
+            ).scalar()
+            conn.execute(models.Project.__table__.insert().values(name="p", owner_id=user_id))
+        project_id = conn.execute(select(models.Project.id)).scalar()
+        conn.execute(
+            models.Activity.__table__.insert(),
+            [
+                {
+                    "project_id": project_id,
+                    "user_id": user_id,
+                    "type": "comment_added",
+                    "message": "",
+                    "created_at": created_at,
+                }
+                for created_at in dates
+            ],
+        )
+
+
+def test_rollup_drops_expired_partitions(engine):
+    now = datetime.utcnow()
+    _insert_activities(engine, [now - timedelta(days=age) for age in [200, 200, 120, 91, 1]])
+    assert partition_activities(engine)
+
+    result = rollup(engine, retention_days=90, now=now)
+
+    cutoff = datetime.combine((now - timedelta(days=90)).date(), datetime.min.time())
+    with engine.begin() as conn:
+        assert is_partitioned(conn)
+        months = _monthly_partitions(conn)
+        assert all(datetime.combine(_next_month(m), datetime.min.time()) > cutoff for m in months)
+        remaining = conn.execute(select(func.count()).select_from(models.Activity.__table__)).scalar()
+        summarised = conn.execute(
+            select(func.sum(models.ActivityDailySummary.__table__.c.count))
+        ).scalar()
+
+    assert result.partitions_dropped >= 2
+    assert result.rows_removed == 4
+    assert remaining == 1
+    assert summarised == 4
+
+    # Nothing left to do on a second run
+    again = rollup(engine, retention_days=90, now=now)
+    assert (again.rows_removed, again.partitions_dropped) == (0, 0)
+
+
+def test_new_partition_takes_rows_from_default(engine):
+    now = datetime.utcnow()
+    _insert_activities(engine, [now])
+    assert partition_activities(engine)
+    # Past the months created ahead: lands in the default partition
+    later = now.date().replace(day=1)
+    for _ in range(MONTHS_AHEAD + 1):
+        later = _next_month(later)
+    _insert_activities(engine, [datetime.combine(later, datetime.min.time()) + timedelta(days=3)])
+
+    maintain_partitions(engine, now=datetime.combine(later, datetime.min.time()))
+
+    with engine.begin() as conn:
+        assert later in _monthly_partitions(conn)
+        in_default = conn.execute(text("SELECT count(*) FROM activities_default")).scalar()
+        total = conn.execute(select(func.count()).select_from(models.Activity.__table__)).scalar()
+    assert in_default == 0
+    assert total == 2
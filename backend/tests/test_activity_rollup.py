@@ -0,0 +1,204 @@
+"""
+Roll-up of expired activity and the summary / read-time message endpoints,
+on SQLite (the default database).
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.orm import sessionmaker
+
+from app import models
+from app.activity_retention import rollup
+from app.database import Base
+from app.deps import create_access_token, get_db
+from app.routers import activity
+
+NOW = datetime(2026, 6, 15, 12, 0)
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'test.db'}", connect_args={"check_same_thread": False}
+    )
+    Base.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def owner(engine):
+    with engine.begin() as conn:
+        user_id = conn.execute(
+            models.User.__table__.insert()
+            .values(email="alice@example.com", display_name="Alice")
+            .returning(models.User.id)
+        ).scalar()
+        project_id = conn.execute(
+            models.Project.__table__.insert()
+            .values(name="p", owner_id=user_id)
+            .returning(models.Project.id)
+        ).scalar()
+    return user_id, project_id
+
+
+def _add(engine, owner, rows):
+    user_id, project_id = owner
+    with engine.begin() as conn:
+        conn.execute(
+            models.Activity.__table__.insert(),
+            [
+                {
+                    "project_id": project_id,
+                    "user_id": user_id,
+                    "type": type_,
+                    "payload": payload,
+                    "message": "",
+                    "created_at": created_at,
+                }
+                for type_, payload, created_at in rows
+            ],
+        )
+
+
+@pytest.fixture
+def client(engine, owner):
+    app = FastAPI()
+    app.include_router(activity.router)
+    session = sessionmaker(bind=engine)
+
+    def get_test_db():
+        db = session()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_db] = get_test_db
+    token = create_access_token({"sub": str(owner[0])})
+    with TestClient(app, headers={"Authorization": f"Bearer {token}"}) as client:
+        yield client
+
+
+def test_rollup_summarises_and_deletes_expired_rows(engine, owner):
+    old = NOW - timedelta(days=120)
+    _add(
+        engine,
+        owner,
+        [
+            ("comment_added", None, old),
+            ("comment_added", None, old + timedelta(hours=1)),
+            ("asset_uploaded", None, old),
+            ("comment_added", None, NOW - timedelta(days=100)),
+            ("comment_added", None, NOW - timedelta(days=89)),
+            ("comment_added", None, NOW - timedelta(days=1)),
+        ],
+    )
+
+    result = rollup(engine, retention_days=90, now=NOW)
+
+    assert result.rows_removed == 4
+    assert result.days_rolled_up == 2
+    assert result.partitions_dropped == 0
+    with engine.begin() as conn:
+        remaining = conn.execute(
+            select(func.count()).select_from(models.Activity.__table__)
+        ).scalar()
+        summaries = conn.execute(
+            select(
+                models.ActivityDailySummary.day,
+                models.ActivityDailySummary.type,
+                models.ActivityDailySummary.count,
+            ).order_by(models.ActivityDailySummary.day, models.ActivityDailySummary.type)
+        ).all()
+    assert remaining == 2
+    assert summaries == [
+        (old.date(), "asset_uploaded", 1),
+        (old.date(), "comment_added", 2),
+        ((NOW - timedelta(days=100)).date(), "comment_added", 1),
+    ]
+
+    again = rollup(engine, retention_days=90, now=NOW)
+    assert (again.rows_removed, again.days_rolled_up) == (0, 0)
+
+
+def test_rollup_adds_to_existing_summaries(engine, owner):
+    day = NOW - timedelta(days=120)
+    _add(engine, owner, [("comment_added", None, day)])
+    rollup(engine, retention_days=90, now=NOW)
+    # Written late (e.g. a backfill) for a day that was already rolled up
+    _add(engine, owner, [("comment_added", None, day + timedelta(hours=2))])
+    rollup(engine, retention_days=90, now=NOW)
+
+    with engine.begin() as conn:
+        counts = conn.execute(select(models.ActivityDailySummary.count)).scalars().all()
+    assert counts == [2]
+
+
+def test_rollup_disabled_keeps_everything(engine, owner):
+    _add(engine, owner, [("comment_added", None, NOW - timedelta(days=400))])
+
+    result = rollup(engine, retention_days=0, now=NOW)
+
+    assert result.rows_removed == 0
+    with engine.begin() as conn:
+        assert conn.execute(select(func.count()).select_from(models.Activity.__table__)).scalar() == 1
+
+
+def test_summary_endpoint(engine, owner, client):
+    _, project_id = owner
+    old = NOW - timedelta(days=120)
+    _add(engine, owner, [("comment_added", None, old), ("asset_uploaded", None, old)])
+    rollup(engine, retention_days=90, now=NOW)
+
+    response = client.get(f"/projects/{project_id}/activity/summary")
+
+    assert response.status_code == 200
+    assert response.json() == [
+        {"day": old.date().isoformat(), "type": "asset_uploaded", "count": 1},
+        {"day": old.date().isoformat(), "type": "comment_added", "count": 1},
+    ]
+
+
+def test_summary_endpoint_requires_access(engine, client):
+    with engine.begin() as conn:
+        stranger = conn.execute(
+            models.User.__table__.insert().values(email="bob@example.com").returning(models.User.id)
+        ).scalar()
+        project_id = conn.execute(
+            models.Project.__table__.insert()
+            .values(name="private", owner_id=stranger)
+            .returning(models.Project.id)
+        ).scalar()
+
+    response = client.get(f"/projects/{project_id}/activity/summary")
+
+    assert response.status_code == 403
+
+
+def test_messages_are_rendered_when_read(engine, owner, client):
+    _, project_id = owner
+    now = datetime.utcnow()
+    _add(
+        engine,
+        owner,
+        [
+            ("comment_reacted", {"emoji": "+1"}, now - timedelta(minutes=2)),
+            ("asset_status_changed", {"status": "changes_requested"}, now - timedelta(minutes=1)),
+            ("something_new", None, now),
+        ],
+    )
+
+    response = client.get(f"/projects/{project_id}/activity")
+
+    assert response.status_code == 200
+    assert [item["message"] for item in response.json()] == [
+        "Alice did something new.",
+        "Alice set an asset status to 'Changes requested'.",
+        "Alice reacted +1 to a comment.",
+    ]
+
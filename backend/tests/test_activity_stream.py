@@ -0,0 +1,42 @@
+"""
+Replay of the activity SSE stream for clients that reconnect far behind.
+"""
+
+import asyncio
+
+from app.activity_stream import REPLAY_LIMIT, event_source, format_sse, stream
+
+
+class _Request:
+    async def is_disconnected(self) -> bool:
+        return False
+
+
+def _item(id_: int) -> dict:
+    return {"id": id_, "project_id": 1}
+
+
+def test_db_replay_pages_until_caught_up_before_going_live():
+    missed = [_item(i) for i in range(1, 2 * REPLAY_LIMIT + 11)]
+    asked = []
+
+    async def next_page(after_id: int) -> list[dict]:
+        asked.append(after_id)
+        return [item for item in missed if item["id"] > after_id][:REPLAY_LIMIT]
+
+    async def run() -> list[str]:
+        sub = stream.subscribe({1})
+        # Written while the replay ran: already covered by it, then a new one
+        sub.offer(missed[-1])
+        sub.offer(_item(5000))
+        chunks = []
+        async for chunk in event_source(_Request(), sub, missed[:REPLAY_LIMIT], next_page):
+            chunks.append(chunk)
+            if chunk == format_sse(_item(5000)):
+                break
+        return chunks
+
+    chunks = asyncio.run(run())
+
+    assert asked == [REPLAY_LIMIT, 2 * REPLAY_LIMIT]
+    assert chunks[1:] == [format_sse(item) for item in missed] + [format_sse(_item(5000))]
@@ -4,4 +4,10 @@ const api = axios.create({
     baseURL: import.meta.env.VITE_API_URL || "http://localhost:8000",
 });
 
+// Open a real-time socket on the API host (http -> ws, https -> wss)
+export function openSocket(path, token) {
+    const base = api.defaults.baseURL.replace(/^http/, "ws");
+    return new WebSocket(`${base}${path}?token=${encodeURIComponent(token)}`);
+}
+
 export default api;
@@ -5,6 +5,7 @@ import { useAuth } from "../context/AuthContext";
 function InvitesBell({ onChanged }) {
     const { token } = useAuth();
     const [invites, setInvites] = useState([]);
+    const [count, setCount] = useState(0);
     const [open, setOpen] = useState(false);
     const [loading, setLoading] = useState(false);
 
@@ -23,17 +24,45 @@ function InvitesBell({ onChanged }) {
         }
     };
 
+    // Badge count + invite changes are pushed by the server
     useEffect(() => {
-        fetchInvites();
-        // eslint-disable-next-line react-hooks/exhaustive-deps
+        if (!token) return;
+
+        const source = new EventSource(
+            `${api.defaults.baseURL}/invites/stream?token=${encodeURIComponent(token)}`
+        );
+        source.addEventListener("unread_count", (e) => {
+            setCount(JSON.parse(e.data).count);
+        });
+        source.addEventListener("invite", (e) => {
+            const event = JSON.parse(e.data);
+            const invite = event.data;
+            if (event.type === "invite_created") {
+                setInvites((prev) =>
+                    prev.some((i) => i.id === invite.id)
+                        ? prev
+                        : [invite, ...prev]
+                );
+            } else {
+                setInvites((prev) => prev.filter((i) => i.id !== invite.id));
+            }
+        });
+
+        return () => source.close();
     }, [token]);
 
+    // Only load the full list when the dropdown is opened
+    useEffect(() => {
+        if (open) fetchInvites();
+        // eslint-disable-next-line react-hooks/exhaustive-deps
+    }, [open, token]);
+
     const handleAccept = async (inviteId) => {
         try {
             await api.post(`/invites/${inviteId}/accept`, null, {
                 headers: { Authorization: `Bearer ${token}` },
             });
-            await fetchInvites();
+            setInvites((prev) => prev.filter((i) => i.id !== inviteId));
             if (onChanged) onChanged();
         } catch (err) {
             console.error("Failed to accept invite", err);
@@ -46,7 +75,7 @@ function InvitesBell({ onChanged }) {
             await api.post(`/invites/${inviteId}/decline`, null, {
                 headers: { Authorization: `Bearer ${token}` },
             });
-            await fetchInvites();
+            setInvites((prev) => prev.filter((i) => i.id !== inviteId));
             if (onChanged) onChanged();
         } catch (err) {
             console.error("Failed to decline invite", err);
@@ -54,8 +83,6 @@ function InvitesBell({ onChanged }) {
         }
     };
 
-    const count = invites.length;
-
     return (
         <div className="fs-invites-wrapper">
             {/* bell button */}
@@ -1,7 +1,7 @@
 // frontend/src/components/ProjectsSection.jsx
 
 import { useEffect, useState } from "react";
-import api from "../api/client";
+import api, { openSocket } from "../api/client";
 import { useAuth } from "../context/AuthContext";
 import ProjectActionsMenu from "./ProjectsActionMenu";
 
@@ -210,6 +210,56 @@ function ProjectsSection({ refreshKey = 0 }) {
         // eslint-disable-next-line react-hooks/exhaustive-deps
     }, [token, ownedProjects, sharedProjects, archivedProjects]);
 
+    // Live comment / reaction / status updates for the open asset
+    useEffect(() => {
+        if (!token || !activeAsset) return;
+
+        const socket = openSocket(`/ws/assets/${activeAsset.id}`, token);
+        const applyEvent = (event) => {
+            if (event.type === "comment_added") {
+                setComments((prev) =>
+                    prev.some((c) => c.id === event.data.id)
+                        ? prev
+                        : [...prev, event.data]
+                );
+            } else if (event.type === "comment_deleted") {
+                const path = event.data.path;
+                setComments((prev) =>
+                    prev.filter(
+                        (c) =>
+                            c.id !== event.data.id &&
+                            !(path && c.path && c.path.startsWith(path))
+                    )
+                );
+            } else if (event.type === "reaction_toggled") {
+                setComments((prev) =>
+                    prev.map((c) => (c.id === event.data.id ? event.data : c))
+                );
+            } else if (event.type === "asset_status_changed") {
+                setActiveAsset((prev) =>
+                    prev && prev.id === event.data.id
+                        ? { ...prev, status: event.data.status }
+                        : prev
+                );
+            }
+        };
+
+        socket.onmessage = (msg) => {
+            let frame;
+            try {
+                frame = JSON.parse(msg.data);
+            } catch {
+                return; // "pong" keep-alives
+            }
+            // Server micro-batches bursts into one frame
+            const events = frame.type === "batch" ? frame.events : [frame];
+            events.forEach(applyEvent);
+        };
+
+        return () => socket.close();
+        // eslint-disable-next-line react-hooks/exhaustive-deps
+    }, [token, activeAsset?.id]);
+
     const loadAssets = async (projectId) => {
         try {
             const res = await api.get(`/projects/${projectId}/assets`, {
@@ -411,6 +461,14 @@ function ProjectsSection({ refreshKey = 0 }) {
                     [projectId]: [res.data, ...existing],
                 };
             });
+
+            const similar = res.data.similar_assets || [];
+            if (similar.length > 0) {
+                const versions = similar.map((a) => `v${a.version}`).join(", ");
+                alert(
+                    `Uploaded. This looks like a near-duplicate of ${versions} already in the project.`
+                );
+            }
         } catch (err) {
             console.error("Failed to upload asset", err);
             alert("Failed to upload asset.");
@@ -581,13 +639,28 @@ function ProjectsSection({ refreshKey = 0 }) {
         setLoadingAi(true);
         setAiSuggestions(null);
 
+        const headers = { Authorization: `Bearer ${token}` };
         try {
-            const res = await api.get(
+            let res = await api.get(
                 `/assets/${activeAsset.id}/ai-suggestions`,
-                {
-                    headers: { Authorization: `Bearer ${token}` },
-                }
+                { headers }
             );
+            // 202: analysis is queued/running in the background, poll the job
+            if (res.status === 202) {
+                // Local design checks are ready right away
+                const { suggestions: local = [], checks = null } = res.data;
+                let job = res.data.job;
+                while (job.status === "queued" || job.status === "running") {
+                    await new Promise((resolve) => setTimeout(resolve, 1500));
+                    res = await api.get(`/ai-jobs/${job.id}`, { headers });
+                    job = res.data;
+                }
+                if (job.status !== "succeeded") {
+                    throw new Error(job.error || "AI analysis failed");
+                }
+                setAiSuggestions({ suggestions: [...local, ...job.result], checks });
+                return;
+            }
             setAiSuggestions(res.data);
         } catch (err) {
             console.error("Failed to load AI suggestions", err);